@@ -20,23 +20,29 @@ class Battery:
     
     """ An instance of this class represents a single battery """
 
+    __slots__ = ("btype", "capacity", "level", "start_charging")
+
     def __init__(self, btype, level=None):
         """
         
         :param btype: The type of battery.
         :param level: The current level of charge in kWh.
 
+        :attr capacity: The maximum charge in kWh (the one of the type).
         :attr start_charging: The simulation time when the battery started charging.
         
         """
         self.btype = btype 
+        self.capacity = btype.capacity 
         self.level = level or btype.capacity
         self.start_charging = 0 
 
-    @property 
-    def capacity (self):
-        return self.btype.capacity 
-
     @property 
     def charged (self):
-        return self.level == self.capacity
\ No newline at end of file
+        return self.level == self.capacity
+
+
+    def reset (self, level=None):
+        """ Method to recycle the battery as if it was a new one """
+        self.level = level or self.capacity
+        self.start_charging = 0
@@ -2,7 +2,7 @@ import dataclasses
 import functools 
 import random 
 
-from typing import Tuple, Callable
+from typing import Tuple, Callable, Optional
 
 from simulation.utils.selection import biased_randomised_selection 
 from simulation.vehicles import VehicleType 
@@ -27,9 +27,37 @@ class Config:
     SHARING : bool = True                               # If True batteries are shared otherwise not
     WAIT_CHARGE : bool = True                           # If False vehicles can retrieve partially charged batteries too,
                                                         # otherwise only fully charged batteries can be retrieved.
+    LAZY_CHARGING : bool = False                        # If True the levels of batteries are computed on demand and no event
+                                                        # is scheduled for the end of charges (only when a vehicle waits for it)
     
     # --------------------------------------------------------------------------------------------------------
 
+
+    # ROUTING
+    # --------------------------------------------------------------------------------------------------------
+    ROUTER : str = "astar"                              # Backend of shortest paths: "astar" or "ch" (contraction hierarchy)
+    PATH_CACHE_SIZE : int = 50_000                      # Maximum number of shortest paths kept in memory (0 to disable)
+    ROUTE_STORE : Optional[str] = None                  # SQLite file where routes are persisted across runs (None to disable)
+    PLANNER : str = "baseline"                          # Engine planning the legs of trips: "baseline" (A* path followed until the
+                                                        # battery runs out, then search of a station), "constrained" (single 
+                                                        # energy-constrained search to the target or to a reachable station), or
+                                                        # "overlay" (whole trip planned on the overlay graph of stations)
+    OD_FILTER : Optional[str] = None                    # Filter on origin-destination pairs: None, "largest_scc" (origins and 
+                                                        # destinations sampled in the largest strongly connected component), or
+                                                        # "reachable" (pairs whose destination cannot be reached are rejected
+                                                        # before any search and counted among the nx_failed_trips)
+    GRAPH_CACHE : Optional[str] = None                  # Directory of the binary (memory-mapped) caches of graphs, rebuilt when
+                                                        # the GraphML file changes (None to disable)
+    RESULT_CACHE : Optional[str] = None                 # Directory where the results of seeded runs are memoized under the fingerprint 
+                                                        # of configuration, graph file, and seed (None to disable)
+    ELEVATION_CACHE : Optional[str] = None              # JSON file where the elevations returned by the providers are kept, keyed by
+                                                        # rounded coordinates, so they are never requested twice (None to disable)
+    PERSIST_STATION_MATRIX : bool = False               # If True the distances between stations are saved next to the graph file
+                                                        # and reused by the following runs
+    LANDMARKS : int = 8                                 # Number of landmarks of the ALT heuristic used by A* 
+                                                        # (0 to use the euclidean distance)
+    # --------------------------------------------------------------------------------------------------------
+
     
     
     # STATIONS
@@ -0,0 +1,262 @@
+import numpy as np
+
+import functools
+import hashlib
+
+from simulation.utils.technical import edges_consumption
+from simulation.utils.algorithms import csr_strongly_connected_components
+
+
+
+
+class CSRGraph:
+
+    """
+    An instance of this class is a compact and read-only view of a Graph
+    in Compressed Sparse Row (CSR) format.
+
+    Nodes are renumbered with contiguous integer ids (i.e., 0, 1, ..., N-1), and
+    the edges leaving the node u are the ones going from offsets[u] to offsets[u + 1]
+    in the edges arrays.
+
+    NOTE: For each couple of nodes (u, v) only the edge with key 0 is kept,
+    coherently with the G[u][v][0] access made by the dict-based utilities.
+    """
+
+    # The columns of the view (i.e., the arrays that can be accessed by name)
+    NODE_COLUMNS = ("nodes", "x", "y", "is_station", "startp", "endp")
+    EDGE_COLUMNS = ("sources", "targets", "length", "grade", "grade_abs")
+
+
+    def __init__(self, nodes, offsets, targets, length, grade, grade_abs, x, y, is_station, startp, endp):
+        """
+        :param nodes: The original ids of the nodes (the position in the array is the integer id).
+        :param offsets: The offsets of the edges leaving each node (size N + 1).
+        :param targets: The integer ids of the nodes reached by each edge (size E).
+        :param length: The length of edges in meters.
+        :param grade: The grade of edges (i.e., rise over run).
+        :param grade_abs: The absolute grade of edges.
+        :param x: The longitude of nodes.
+        :param y: The latitude of nodes.
+        :param is_station: True for nodes with a charging station.
+        :param startp: The weight of nodes as origin of the trips.
+        :param endp: The weight of nodes as destination of the trips.
+
+        :attr index: A hashmap to go from the original id of a node to the integer one.
+        :attr sources: The integer ids of the nodes each edge starts from (size E).
+        """
+        self.nodes = nodes
+        self.offsets = offsets
+        self.targets = targets
+        self.length = length
+        self.grade = grade
+        self.grade_abs = grade_abs
+        self.x = x
+        self.y = y
+        self.is_station = is_station
+        self.startp = startp
+        self.endp = endp
+        self.sources = np.repeat(np.arange(len(nodes), dtype=offsets.dtype), np.diff(offsets))
+
+        for name in ("offsets",) + self.NODE_COLUMNS + self.EDGE_COLUMNS:
+            getattr(self, name).flags.writeable = False
+
+        self.index = {node: i for i, node in enumerate(nodes.tolist())}
+        self.__columns = {}
+        self.__energy_costs = {}
+
+
+    @classmethod
+    def from_graph (cls, G):
+        """
+        Method to build the view of a graph.
+
+        :param G: The graph (i.e., a networkx.MultiDiGraph with osmnx attributes).
+        :return: A CSRGraph instance.
+        """
+        nodes = tuple(G.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        targets, length, grade, grade_abs = [], [], [], []
+
+        for i, node in enumerate(nodes):
+            for succ, edges in G[node].items():
+                edge = edges[0] if 0 in edges else next(iter(edges.values()))
+                targets.append(index[succ])
+                length.append(edge["length"])
+                grade.append(edge.get("grade", 0.0))
+                grade_abs.append(edge.get("grade_abs", 0.0))
+            offsets[i + 1] = len(targets)
+
+        node_data = G.nodes
+        return cls(
+            nodes=np.asarray(nodes),
+            offsets=offsets,
+            targets=np.asarray(targets, dtype=np.int64),
+            length=np.asarray(length, dtype=np.float64),
+            grade=np.asarray(grade, dtype=np.float64),
+            grade_abs=np.asarray(grade_abs, dtype=np.float64),
+            x=np.fromiter((node_data[i]["x"] for i in nodes), dtype=np.float64, count=len(nodes)),
+            y=np.fromiter((node_data[i]["y"] for i in nodes), dtype=np.float64, count=len(nodes)),
+            is_station=np.fromiter((bool(node_data[i].get("is_station")) for i in nodes), dtype=bool, count=len(nodes)),
+            startp=np.fromiter((node_data[i].get("startp", 0.0) for i in nodes), dtype=np.float64, count=len(nodes)),
+            endp=np.fromiter((node_data[i].get("endp", 0.0) for i in nodes), dtype=np.float64, count=len(nodes)),
+        )
+
+
+    @property
+    def n_nodes (self):
+        """ The number of nodes """
+        return len(self.nodes)
+
+    @property
+    def n_edges (self):
+        """ The number of edges """
+        return len(self.targets)
+
+    @property
+    def nbytes (self):
+        """ The memory used by the arrays of the view in bytes """
+        return sum(getattr(self, name).nbytes for name in ("offsets",) + self.NODE_COLUMNS + self.EDGE_COLUMNS)
+
+
+    @functools.cached_property
+    def fingerprint (self):
+        """ 
+        A hash of the topology and of the lengths of the network. 
+        Two views with the same fingerprint have the same integer ids and the same shortest paths.
+        """
+        sha = hashlib.sha1()
+        for name in ("nodes", "offsets", "targets", "length"):
+            sha.update(np.ascontiguousarray(getattr(self, name)).tobytes())
+        return sha.hexdigest()
+
+
+    def column (self, name):
+        """
+        A column of the view as a python list.
+
+        NOTE: Accessing a single element of a numpy array from python is slower
+        than accessing a list, hence pure python loops (e.g., searches) should use
+        this method. The list is built once and then cached.
+        """
+        if (col := self.__columns.get(name)) is None:
+            col = self.__columns[name] = getattr(self, name).tolist()
+        return col
+
+
+    def energy_costs (self, vtype, aslist=False):
+        """
+        The table of the energy consumed by a vehicle type to run each edge.
+        The table is computed once for each vehicle type and then cached.
+
+        :param vtype: The vehicle type.
+        :param aslist: If True the table is returned as a python list (see column).
+        :return: The consumption in kWh indexed by edge id.
+        """
+        if (costs := self.__energy_costs.get(vtype)) is None:
+            table = edges_consumption(self, vtype)
+            table.flags.writeable = False
+            costs = self.__energy_costs[vtype] = (table, table.tolist())
+        return costs[1] if aslist else costs[0]
+
+
+    @functools.cached_property
+    def adjacency (self):
+        """ For each node, a tuple of (successor, edge id) used by pure python searches """
+        targets, offsets = self.column("targets"), self.column("offsets")
+        return tuple(
+            tuple(zip(targets[offsets[i]:offsets[i + 1]], range(offsets[i], offsets[i + 1])))
+            for i in range(self.n_nodes)
+        )
+
+
+    @functools.cached_property
+    def reverse_adjacency (self):
+        """ For each node, a tuple of (predecessor, edge id) used by pure python backward searches """
+        predecessors = [[] for _ in range(self.n_nodes)]
+        for e, (u, v) in enumerate(zip(self.column("sources"), self.column("targets"))):
+            predecessors[v].append((u, e))
+        return tuple(tuple(i) for i in predecessors)
+
+
+    @functools.cached_property
+    def components (self):
+        """ 
+        The label of the strongly connected component of each node.
+        Two nodes in the same component can reach each other.
+        """
+        components = np.asarray(csr_strongly_connected_components(self), dtype=np.int64)
+        components.flags.writeable = False
+        return components
+
+
+    @functools.cached_property
+    def largest_component (self):
+        """ The label of the strongly connected component with most nodes """
+        return int(np.argmax(np.bincount(self.components))) if self.n_nodes > 0 else -1
+
+
+    @functools.cached_property
+    def __descendants (self):
+        """ 
+        For each component, the bitset (as python int) of the components it can reach.
+
+        NOTE: Since components are labelled in reverse topological order, the components 
+        reached by an edge leaving c are always computed before c.
+        """
+        components = self.column("components")
+        successors = [set() for _ in range(int(self.components.max()) + 1 if self.n_nodes > 0 else 0)]
+        for u, v in zip(self.column("sources"), self.column("targets")):
+            if components[u] != components[v]:
+                successors[components[u]].add(components[v])
+
+        descendants = []
+        for c, succ in enumerate(successors):
+            bits = 1 << c
+            for i in succ:
+                bits |= descendants[i]
+            descendants.append(bits)
+        return descendants
+
+
+    def reachable (self, u, v):
+        """ True if the integer node v can be reached from the integer node u """
+        components = self.column("components")
+        cu, cv = components[u], components[v]
+        return cu == cv or (self.__descendants[cu] >> cv) & 1 == 1
+
+
+    def node_id (self, i):
+        """ The original id of the node with integer id i """
+        return self.column("nodes")[i]
+
+
+    def edge (self, u, v):
+        """
+        The id of the edge going from u to v.
+        Raises a KeyError if the edge does not exist.
+        """
+        for succ, e in self.adjacency[u]:
+            if succ == v:
+                return e
+        raise KeyError((u, v))
+
+
+    def path_edges (self, path):
+        """ The ids of the edges covered by a path of integer nodes """
+        edge = self.edge
+        return np.fromiter((edge(u, v) for u, v in zip(path[:-1], path[1:])), dtype=np.int64, count=max(0, len(path) - 1))
+
+
+    def from_nodes (self, path):
+        """ Convert a path of original node ids into a path of integer ids """
+        index = self.index
+        return tuple(index[i] for i in path)
+
+
+    def to_nodes (self, path):
+        """ Convert a path of integer ids into a path of original node ids """
+        nodes = self.column("nodes")
+        return tuple(nodes[i] for i in path)
@@ -0,0 +1,172 @@
+import copy
+import random
+import itertools
+
+import numpy as np
+
+from simulation.utils.selection import selection_probabilities
+
+
+
+
+class AliasTable:
+
+    """
+    An instance of this class is the alias table (Vose method) of a discrete 
+    distribution, which allows to draw samples in O(1) whatever the number
+    of outcomes is.
+
+    Each outcome i is drawn with a uniform integer i and kept with probability
+    prob[i], otherwise it is replaced by its alias[i].
+    """
+
+    def __init__(self, weights):
+        """
+        :param weights: The (non-negative) weight of each outcome.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or len(weights) == 0 or (weights < 0).any() or weights.sum() <= 0:
+            raise Exception("An alias table requires non-negative weights with positive sum.")
+
+        n = len(weights)
+        scaled = (weights * (n / weights.sum())).tolist()
+        prob, alias = [1.0] * n, list(range(n))
+
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # NOTE: The remaining outcomes are 1.0 up to rounding errors
+
+        self.prob = np.asarray(prob, dtype=np.float64)
+        self.alias = np.asarray(alias, dtype=np.int64)
+
+
+    def __len__(self):
+        return len(self.prob)
+
+
+    def sample (self, rng, size):
+        """
+        Method to draw a block of outcomes.
+
+        :param rng: The numpy Generator used.
+        :param size: The number of outcomes.
+        :return: An array of outcomes (i.e., indexes of the weights).
+        """
+        idx = rng.integers(len(self.prob), size=size)
+        return np.where(rng.random(size) < self.prob[idx], idx, self.alias[idx])
+
+
+
+
+class DemandSampler:
+
+    """
+    An instance of this class generates the trips of the simulation --i.e., 
+    origin, destination, and vehicle type.
+
+    Origins and destinations are drawn from the "startp" and "endp" weights of nodes
+    through alias tables built once, and vehicle types according to the probabilities 
+    of the VEHICLE_SELECTOR. Trips are generated in numpy blocks and then handed
+    out one at a time.
+
+    NOTE: If the probabilities of the selector cannot be known (i.e., it is a custom
+    function), the selector itself is called for each trip.
+
+    NOTE: With a mask, trips are drawn from all the nodes and the ones with origin or
+    destination out of the mask are rejected (and counted), so the sampled trips are 
+    the same as drawing from the masked nodes, and the pairs filtered can be reported.
+    """
+
+    def __init__(self, csr, vehicle_types, selector, seed=None, block_size=1024, mask=None, rng=None):
+        """
+        :param csr: The CSR view of the graph.
+        :param vehicle_types: The vehicle types.
+        :param selector: The function used to select a vehicle type (see Config.VEHICLE_SELECTOR).
+        :param seed: The seed of the generator. If not passed it is drawn from the 
+                    random module, so that a random.seed also fixes the demand.
+        :param block_size: The number of trips generated at once.
+        :param mask: If passed only the nodes where mask is True can be origin or destination.
+        :param rng: The numpy Generator used (if passed the seed is ignored).
+
+        :attr rejected: The number of trips rejected because of the mask.
+        """
+        self.nodes = csr.column("nodes")
+        self.vehicle_types = tuple(vehicle_types)
+        self.selector = selector
+        self.block_size = block_size
+        if rng is None:
+            seed = seed if seed is not None else random.getrandbits(64)
+            rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.rng = rng
+
+        self.mask = None if mask is None else np.asarray(mask, dtype=bool)
+        self.rejected = 0
+        self.origins = AliasTable(csr.startp)
+        self.destinations = AliasTable(csr.endp)
+        if self.mask is not None and not (np.any(csr.startp[self.mask] > 0) and np.any(csr.endp[self.mask] > 0)):
+            raise Exception("No trip can be drawn within the mask.")
+
+        probs = selection_probabilities(selector, len(self.vehicle_types))
+        self.vtypes = AliasTable(probs) if probs is not None else None
+
+        self.__block = iter(())
+
+
+    def __refill (self):
+        """ Method to generate a new block of trips """
+        rng, size, nodes, vehicle_types = self.rng, self.block_size, self.nodes, self.vehicle_types
+        origins = self.origins.sample(rng, size)
+        destinations = self.destinations.sample(rng, size)
+        if self.vtypes is not None:
+            vtypes = [vehicle_types[i] for i in self.vtypes.sample(rng, size).tolist()]
+        else:
+            vtypes = [self.selector(vehicle_types) for _ in range(size)]
+        if self.mask is not None:
+            accepted = (self.mask[origins] & self.mask[destinations]).tolist()
+        else:
+            accepted = itertools.repeat(True, size)
+        self.__block = zip([nodes[i] for i in origins.tolist()], [nodes[i] for i in destinations.tolist()], vtypes, accepted)
+
+
+    def fork (self, rng, block_size=None):
+        """
+        A sampler sharing the alias tables of this one, but drawing trips from
+        another generator (e.g., one for each vehicle of the fleet).
+
+        :param rng: The numpy Generator used.
+        :param block_size: The number of trips generated at once (the same by default).
+        :return: A DemandSampler instance.
+        """
+        sampler = copy.copy(self)
+        sampler.rng = rng
+        sampler.block_size = block_size or self.block_size
+        sampler.rejected = 0
+        sampler.__block = iter(())
+        return sampler
+
+
+    def draw (self):
+        """
+        Method to generate a trip.
+
+        :return: The origin node, the destination node, and the vehicle type.
+        """
+        while True:
+            if (trip := next(self.__block, None)) is None:
+                self.__refill()
+                continue
+            origin, destination, vtype, accepted = trip
+            if accepted:
+                return origin, destination, vtype
+            self.rejected += 1
+
+
+    def draw_many (self, k):
+        """ Method to generate k trips """
+        return [self.draw() for _ in range(k)]
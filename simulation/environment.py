@@ -0,0 +1,28 @@
+import simpy
+
+from simpy.core import NORMAL
+
+
+
+
+class CountingEnvironment (simpy.Environment):
+
+    """ 
+    An instance of this class is a simpy Environment that counts the events 
+    scheduled, used to compare the cost of different modelling choices.
+    """
+
+    def __init__(self, initial_time=0):
+        """
+        :param initial_time: The starting time of the simulation.
+
+        :attr n_events: The number of events scheduled so far.
+        """
+        super().__init__(initial_time)
+        self.n_events = 0
+
+
+    def schedule (self, event, priority=NORMAL, delay=0):
+        """ Schedule an event (see simpy.Environment.schedule) """
+        self.n_events += 1
+        super().schedule(event, priority, delay)
@@ -1,10 +1,17 @@
 import networkx as nx 
+import numpy as np
 import osmnx as ox 
 import random 
 import json 
 
-from simulation.stations import Station
-from utils.open_elevation import get_elevation
+from simulation.csr import CSRGraph
+from simulation.routing.landmarks import Landmarks
+from simulation.routing.contraction import ContractionHierarchy
+from simulation.routing.matrix import StationMatrix
+from simulation.routing.overlay import StationOverlay
+from simulation.utils.open_elevation import get_elevations, provider_key
+from simulation.utils.cache import cache_path, save_cache, load_cache
+from simulation.utils.shared import SharedArrays
 
 
 
@@ -15,36 +22,81 @@ def _str_to_bool(string):
 
 
 
+def _describe (function):
+    """ A description of a function (or partial) that does not change across processes """
+    func = getattr(function, "func", function)
+    return f"{func.__module__}.{func.__qualname__}{getattr(function, 'args', ())}{getattr(function, 'keywords', {})}"
+
+
+
+def _prefixed (arrays, prefix):
+    """ The arrays whose name starts with prefix (without the prefix) """
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+
+
 
 class Graph(nx.MultiDiGraph):
 
     """ 
     An instance of this class represents the Graph needed by the simulation 
     as an extension of a networkx.MultiDiGraph.
+
+    NOTE: The network (and its preprocessings) is static and can be used by many
+    simulations one after the other, or at the same time: the stations, which are 
+    bound to the environment of a single simulation, are kept by the registry of
+    each run (see StationRegistry), and never stored in the nodes.
     """
 
 
     def __new__(cls, *args, **kwargs):
         self = super().__new__(cls, *args, **kwargs)
+        self.__station_matrix, self.__station_matrix_file = None, None
+        # The block of shared memory the graph is attached to (see from_shared)
+        self.shared = None
         return self
         
     
 
     @classmethod 
-    def from_file (cls, env, config, stations=False, elevation=False, elevation_provider="open_elevation", timeout=20):
+    def from_file (cls, env, config, stations=False, elevation=False, elevation_provider="open_elevation", timeout=20, seed=None):
         """
         Method to generate the Graph object needed by the simulation.
 
-        :param env: The simulation environment.
+        :param env: The simulation environment (NOTE: not used, the stations are made by each run).
         :param config: The simulation's configuration.
 
         :param stations: If True the station nodes are recomputed.
         :param elevation: If true the streets slope is exctacted from Open Maps (NOTE: May take time!).
-        :param elevation_provider: The website trusted to get the nodes elevation data. 
-        :param timeout: The maximum time allowed for a GET request to receive node elevation data.
+        :param elevation_provider: The website trusted to get the nodes elevation data (see PROVIDERS),
+                    or a provider (e.g., a DEMProvider sampling a local raster). 
+        :param timeout: The maximum time allowed for a request to receive node elevation data.
+        :param seed: The seed used to place the stations (if they are placed). If None the 
+                    placement depends on the state of the random module.
 
         :return: A Graph instance.
+
+        NOTE: The elevations of all the nodes are requested at once (see get_elevations), and
+        kept in Config.ELEVATION_CACHE (if set).
+
+        NOTE: With Config.GRAPH_CACHE the graph is read from its binary cache (memory-mapped),
+        which is rebuilt when the GraphML file changes. Placements of stations that depend 
+        on the state of the random module (i.e., without seed) are never cached.
         """
+        path = None
+        if config.GRAPH_CACHE:
+            path = cache_path(config.GRAPH_CACHE, config.GRAPH_FILE, 
+                stations=stations, seed=seed, percentage_stations=config.PERCENTAGE_STATIONS,
+                station_types=[i._id for i in config.STATION_TYPES], station_selector=_describe(config.STATION_SELECTOR),
+                elevation=elevation, elevation_provider=provider_key(elevation_provider) if elevation else None,
+            )
+            if (cache := load_cache(path, config.GRAPH_FILE)) is not None:
+                arrays, meta = cache
+                if not meta["placed"] or seed is not None:
+                    G = cls.from_arrays(arrays, meta)
+                    G.__build(config, csr=G.__cached_csr(arrays))
+                    return G
+
         nxG = ox.load_graphml(config.GRAPH_FILE, 
             node_dtypes={"id_station": int, "is_station": _str_to_bool, "elevation": float, "startp": float, "endp": float}, 
             graph_dtypes={"has_stations": _str_to_bool}
@@ -56,27 +108,32 @@ class Graph(nx.MultiDiGraph):
         
         # Imported from a previous exportation of a Graph 
         if G.graph.get("has_stations") == True and stations == False:
-            for _, node in G.nodes.items():
-                if node["is_station"]:
-                    node["station"] = Station(
-                        env, 
-                        stype=config.STATION_TYPES[node["id_station"]],
-                        btypes=config.BATTERY_TYPES,
-                        swaptime=config.SWAP_TIME
-                    )
-
+            G.__build(config)
+            if path:
+                save_cache(path, config.GRAPH_FILE, G.to_arrays(), G.meta(placed=False))
             return G
 
         # Imported from a previous exportation of a normal networkx.MultiDiGraph
         G.graph["has_stations"] = True 
+
+        # Set nodes elevation 
+        if elevation:
+            nodes = tuple(G.nodes.values())
+            elevations = get_elevations([(node['y'], node['x']) for node in nodes], elevation_provider, timeout, cache=config.ELEVATION_CACHE)
+            # NOTE: Nodes without elevation (e.g., on nodata cells) keep the one of the file, if any.
+            for node, value in zip(nodes, elevations):
+                if value is not None and value == value:
+                    node["elevation"] = value
+
+        # NOTE: With a seed the placement does not depend on (nor change) the state of the random module.
+        state = random.getstate()
+        if seed is not None:
+            random.seed(seed)
+
         # Initialise charging stations
         for node in G.nodes.values():
 
-            # Set node elevation 
-            if elevation:
-                node["elevation"] = get_elevation(node['y'], node['x'], elevation_provider, timeout)
-            else:
-                node["elevation"] = 0.0 if not node.get("elevation") else node["elevation"]
+            node["elevation"] = 0.0 if not node.get("elevation") else node["elevation"]
 
             # Node is not a charging station
             if random.random() > config.PERCENTAGE_STATIONS:
@@ -93,19 +150,273 @@ class Graph(nx.MultiDiGraph):
 
             station_type = config.STATION_SELECTOR(config.STATION_TYPES)
             node["id_station"] = station_type._id
-            node["station"] =  Station(
-                env, 
-                stype=station_type,
-                btypes=config.BATTERY_TYPES,
-                swaptime=config.SWAP_TIME,
-            )
+
+        if seed is not None:
+            random.setstate(state)
 
         # Compute edges slope (i.e., grade) 
         ox.elevation.add_edge_grades(G, add_absolute=True, precision=3)
 
+        G.__build(config)
+        if path and seed is not None:
+            save_cache(path, config.GRAPH_FILE, G.to_arrays(), G.meta(placed=True))
+        return G
+
+
+    @classmethod 
+    def from_shared (cls, env, config, spec):
+        """
+        Method to generate the Graph object of a worker process from the arrays 
+        shared by the parent process (see SharedArrays and to_arrays).
+
+        The CSR view used by the simulation is made of the shared arrays (no copy),
+        and so the preprocessings made by the parent (see preprocessing_arrays): a 
+        worker only makes the ones missing, or made for another configuration.
+        
+        NOTE: The graph has no networkx edges: the routing only uses the CSR view.
+
+        :param env: The simulation environment (NOTE: not used, the stations are made by each run).
+        :param config: The simulation's configuration.
+        :param spec: The spec of the SharedArrays (whose meta are the attributes of the graph).
+        :return: A Graph instance (the shared block is kept as <shared> attribute).
+        """
+        shared = SharedArrays.attach(spec)
+        G = cls.from_arrays(shared.arrays, shared.meta, edges=False)
+        G.shared = shared
+        G.__build(config, csr=G.__cached_csr(shared.arrays))
         return G
 
 
+    @classmethod 
+    def from_arrays (cls, arrays, meta, edges=True):
+        """
+        Method to generate the Graph object from the arrays of its binary cache 
+        (see to_arrays), without preprocessings.
+
+        NOTE: Only the attributes used by the simulation are restored (i.e., coordinates, 
+        elevation, stations, and weights of nodes; length and grades of edges).
+
+        :param arrays: The arrays returned by to_arrays.
+        :param meta: The attributes of the graph.
+        :param edges: If False the networkx edges are not created.
+        :return: A Graph instance.
+        """
+        G = cls()
+        G.graph.update(meta["graph"])
+
+        nodes = arrays["nodes"].tolist()
+        columns = zip(arrays["x"].tolist(), arrays["y"].tolist(), arrays["elevation"].tolist(), arrays["is_station"].tolist(), 
+                    arrays["startp"].tolist(), arrays["endp"].tolist(), arrays["id_station"].tolist())
+        
+        for node, (x, y, elevation, is_station, startp, endp, id_station) in zip(nodes, columns):
+            attrs = {"x": x, "y": y, "is_station": is_station, "startp": startp, "endp": endp}
+            if elevation == elevation:      # NaN when missing
+                attrs["elevation"] = elevation
+            if is_station:
+                attrs["id_station"] = id_station
+            G.add_node(node, **attrs)
+
+        if not edges:
+            return G
+
+        columns = zip(arrays["edge_sources"].tolist(), arrays["edge_targets"].tolist(), arrays["edge_keys"].tolist(),
+                    arrays["edge_length"].tolist(), arrays["edge_grade"].tolist(), arrays["edge_grade_abs"].tolist())
+        G.add_edges_from(
+            (nodes[u], nodes[v], key, {"length": length, "grade": grade, "grade_abs": grade_abs} if grade == grade else {"length": length})
+            for u, v, key, length, grade, grade_abs in columns
+        )
+        return G
+
+
+    def to_arrays (self):
+        """
+        The arrays of the binary cache of the graph: the attributes of nodes and edges 
+        used by the simulation, and the CSR view (NaN for missing elevations and grades).
+        """
+        nodes = tuple(self.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        data = self.nodes
+        edges = tuple(self.edges(keys=True, data=True))
+        csr = self.csr
+
+        return {
+            "nodes": np.asarray(nodes),
+            "x": np.fromiter((data[i]["x"] for i in nodes), dtype=np.float64, count=len(nodes)),
+            "y": np.fromiter((data[i]["y"] for i in nodes), dtype=np.float64, count=len(nodes)),
+            "elevation": np.fromiter((data[i].get("elevation", np.nan) for i in nodes), dtype=np.float64, count=len(nodes)),
+            "is_station": np.fromiter((bool(data[i].get("is_station")) for i in nodes), dtype=bool, count=len(nodes)),
+            "startp": np.fromiter((data[i].get("startp", 0.0) for i in nodes), dtype=np.float64, count=len(nodes)),
+            "endp": np.fromiter((data[i].get("endp", 0.0) for i in nodes), dtype=np.float64, count=len(nodes)),
+            "id_station": np.fromiter((data[i].get("id_station", -1) if data[i].get("is_station") else -1 for i in nodes), dtype=np.int64, count=len(nodes)),
+            "edge_sources": np.fromiter((index[u] for u, _, _, _ in edges), dtype=np.int64, count=len(edges)),
+            "edge_targets": np.fromiter((index[v] for _, v, _, _ in edges), dtype=np.int64, count=len(edges)),
+            "edge_keys": np.fromiter((key for _, _, key, _ in edges), dtype=np.int64, count=len(edges)),
+            "edge_length": np.fromiter((edge["length"] for _, _, _, edge in edges), dtype=np.float64, count=len(edges)),
+            "edge_grade": np.fromiter((edge.get("grade", np.nan) for _, _, _, edge in edges), dtype=np.float64, count=len(edges)),
+            "edge_grade_abs": np.fromiter((edge.get("grade_abs", np.nan) for _, _, _, edge in edges), dtype=np.float64, count=len(edges)),
+            **{f"csr_{name}": getattr(csr, name) for name in ("offsets", "targets", "length", "grade", "grade_abs")},
+        }
+
+
+    def meta (self, placed=False):
+        """ The header of the arrays of the graph (its attributes, and if stations were placed) """
+        return {"graph": {key: value for key, value in self.graph.items() if isinstance(value, (str, int, float, bool))}, "placed": placed}
+
+
+    def __cached_csr (self, arrays):
+        """ The CSR view made of the (memory-mapped) arrays of the binary cache """
+        return CSRGraph(
+            nodes=arrays["nodes"], offsets=arrays["csr_offsets"], targets=arrays["csr_targets"], 
+            length=arrays["csr_length"], grade=arrays["csr_grade"], grade_abs=arrays["csr_grade_abs"],
+            x=arrays["x"], y=arrays["y"], is_station=arrays["is_station"], startp=arrays["startp"], endp=arrays["endp"],
+        )
+
+
+    def __build (self, config, csr=None):
+        """ Method to make the preprocessings required by the simulation """
+        self.build_csr(csr)
+        # NOTE: The matrix of stations is only needed by redistributions, hence built on first use.
+        self.__station_matrix_file = StationMatrix.filename(config.GRAPH_FILE) if config.PERSIST_STATION_MATRIX else None
+        self.__preprocess(config)
+
+
+    def __preprocess (self, config):
+        """ 
+        Method to make the landmarks and the contraction hierarchy required by the 
+        configuration, or to attach the shared ones when they match it.
+        """
+        shared = self.shared.arrays if self.shared is not None else {}
+        if config.LANDMARKS > 0 and len(shared.get("landmarks_landmarks", ())) == min(config.LANDMARKS, self.csr.n_nodes):
+            self.landmarks = Landmarks.from_arrays(self.csr, _prefixed(shared, "landmarks_"))
+        else:
+            self.build_landmarks(config.LANDMARKS)
+        if config.ROUTER == "ch" and "hierarchy_rank" in shared:
+            self.hierarchy = ContractionHierarchy.from_arrays(self.csr, _prefixed(shared, "hierarchy_"))
+        else:
+            self.build_hierarchy(config.ROUTER == "ch")
+        if self.__station_matrix is not None:
+            self.__station_matrix.heuristic = self.landmarks.heuristic if self.landmarks else None
+        self.__preprocessings = (config.LANDMARKS, config.ROUTER == "ch")
+
+
+    def preprocessing_arrays (self):
+        """
+        The arrays of the preprocessings already made (the landmarks, the contraction 
+        hierarchy, and the matrix of stations), whose names are prefixed by the one of 
+        the preprocessing. They are shared with the workers together with the arrays 
+        of the graph (see to_arrays and from_shared).
+        """
+        arrays = {}
+        for name, preprocessing in (("landmarks", self.landmarks), ("hierarchy", self.hierarchy), ("station_matrix", self.__station_matrix)):
+            if preprocessing is not None:
+                arrays.update({f"{name}_{key}": array for key, array in preprocessing.to_arrays().items()})
+        return arrays
+
+
+    def prepare (self, config):
+        """
+        Method to prepare the graph for a new simulation (see SimulationRunner): the
+        network and its preprocessings are kept, and the landmarks and the contraction 
+        hierarchy are only rebuilt if the configuration requires it.
+
+        :param config: The simulation's configuration.
+        :return: The graph itself.
+        """
+        if self.__preprocessings != (config.LANDMARKS, config.ROUTER == "ch"):
+            self.__preprocess(config)
+        return self
+
+
+    def build_csr (self, csr=None):
+        """ 
+        Method to (re)build the compact read-only CSR view of the graph 
+        used by the array-based utilities. 
+        
+        NOTE: The view is not updated when the graph is modified, hence the 
+        method must be called again after any change in nodes or edges.
+
+        :param csr: A view already built (e.g., read from the binary cache).
+        :return: The CSRGraph instance, also kept as <csr> attribute.
+        """
+        self.csr = csr if csr is not None else CSRGraph.from_graph(self)
+        # The overlays of stations built on this view (see overlay), and the matrix of stations (see station_matrix)
+        self.overlays = {}
+        self.__station_matrix = None
+        # NOTE: The strongly connected components are computed once here, so that
+        # reachability checks during the simulation are just lookups.
+        self.csr.components
+        return self.csr
+
+
+    def overlay (self, vtype):
+        """
+        The overlay graph of the stations for a vehicle type (see StationOverlay).
+        It is built the first time it is required, and kept with the other 
+        preprocessings, so it is shared by the following simulations.
+
+        :param vtype: The vehicle type.
+        :return: The StationOverlay instance.
+        """
+        if (overlay := self.overlays.get(vtype)) is None:
+            overlay = self.overlays[vtype] = StationOverlay(self.csr, vtype)
+        return overlay
+
+
+    def build_landmarks (self, k=8, seed=None):
+        """ 
+        Method to (re)build the preprocessing of the ALT heuristic on the CSR view.
+
+        :param k: The number of landmarks (if 0 no preprocessing is made).
+        :param seed: The seed used to select the landmarks (by default the fingerprint of the view).
+        :return: The Landmarks instance, also kept as <landmarks> attribute.
+        """
+        self.landmarks = Landmarks(self.csr, k=k, seed=seed) if k > 0 else None
+        return self.landmarks
+
+
+    def build_hierarchy (self, build=True):
+        """ 
+        Method to (re)build the contraction hierarchy on the length of edges
+        used by the "ch" routing backend.
+
+        :param build: If False no hierarchy is built.
+        :return: The ContractionHierarchy instance, also kept as <hierarchy> attribute.
+        """
+        self.hierarchy = ContractionHierarchy(self.csr) if build else None
+        return self.hierarchy
+
+
+    @property
+    def station_matrix (self):
+        """ The matrix of distances between stations, built (or read) on first use """
+        if self.__station_matrix is None:
+            if self.shared is not None and "station_matrix_distances" in self.shared.arrays:
+                heuristic = self.landmarks.heuristic if self.landmarks else None
+                self.__station_matrix = StationMatrix(self.csr, distances=self.shared.arrays["station_matrix_distances"], heuristic=heuristic)
+            else:
+                self.build_station_matrix(self.__station_matrix_file)
+        return self.__station_matrix
+
+
+    def build_station_matrix (self, filename=None, processes=None):
+        """ 
+        Method to (re)build the matrix of distances between stations used by distributors.
+
+        :param filename: If passed the matrix is read from this file when it belongs to 
+                        the graph, otherwise it is computed and written there.
+        :param processes: The number of worker processes (all the cores by default).
+        :return: The StationMatrix instance, also returned by <station_matrix>.
+        """
+        heuristic = self.landmarks.heuristic if getattr(self, "landmarks", None) else None
+        matrix = StationMatrix.load(filename, self.csr, heuristic=heuristic) if filename else None
+        if matrix is None:
+            matrix = StationMatrix(self.csr, processes=processes, heuristic=heuristic)
+            if filename:
+                matrix.save(filename)
+        self.__station_matrix = matrix
+        return matrix
+
+
     def plot (self):
         """ 
         Method to plot the graph.
@@ -120,10 +431,6 @@ class Graph(nx.MultiDiGraph):
 
     def save (self, filename):
         """ Method to save the graph instance in a GraphML file """
-        for _, node in self.nodes.items():
-            if node["is_station"]:
-                node.pop("station")
-
         ox.save_graphml(self, filename)
 
     
@@ -2,6 +2,11 @@ from simulation.runner import SimulationRunner
 from simulation.utils.io import export_configuration, read_configuration
 from simulation.configuration import Config 
 from simulation.graph import Graph
+from simulation.environment import CountingEnvironment
+from simulation.stats import Welford, StationStats
+from simulation.streams import RandomStreams
+from simulation.routing import RouteStore, warm
+from simulation.sweep import Sweep, expand_grid, scenario_key, lookup_result, store_result
 
 
 import matplotlib.pyplot as plt 
@@ -9,16 +14,38 @@ import time
 import simpy 
 import multiprocessing
 import os 
+import sys 
 import json 
+import argparse 
+import random 
+import dataclasses 
 
 
 
-def run (id, return_dict, config_file):
+def run (id, return_dict, config_file, shared=None, seed=None):
+    """
+    Worker executing a simulation.
+
+    :param shared: The spec of the arrays of the graph shared by the parent process 
+                (if None the graph is read from file).
+    :param seed: The seed of the simulation (see RandomStreams). Seeded runs are memoized 
+                (and returned from the memo without being executed) when Config.RESULT_CACHE is set.
+    """
     print(f"Worker {config_file + str(id)} started")
     config = read_configuration(config_file)
-    env = simpy.Environment()
-    G = Graph.from_file(env, config, stations=False, elevation=False, elevation_provider="open_elevation", timeout=20)
-    sim = SimulationRunner(env, config, G)
+    if (result := lookup_result(config, seed)) is not None:
+        return_dict[config_file + str(id)] = {**result, "cached" : True}
+        print(f"Worker {config_file + str(id)} concluded (cached)")
+        return
+
+    env = CountingEnvironment()
+    if shared is not None:
+        G = Graph.from_shared(env, config, shared)
+    else:
+        G = Graph.from_file(env, config, stations=False, elevation=False, elevation_provider="open_elevation", timeout=20)
+    if seed is not None:
+        random.seed(seed)
+    sim = SimulationRunner(env, config, G, streams=RandomStreams(seed) if seed is not None else None)
     _start = time.time()
     sim()
     _end = time.time()
@@ -30,43 +57,210 @@ def run (id, return_dict, config_file):
     #print("Relative travel time: ", round(sim.relative_travel_time * 60, 3), " mins / km")
     #print("Average waiting time at stations: ", round(sim.avg_waiting_time, 3), " s")
 
-    return_dict[config_file + str(id)] = {
-        "area" : config.GRAPH_FILE,
-        "stations" : sum(1 for i in G.nodes if i['is_station']),
-        "vehicles" : config.N_VEHICLES,
-        "sharing" : config.SHARING,
-        "wait_charge" : config.WAIT_CHARGE,
-        "computational_time" :  round(_end - _start, 3),  # seconds
-        "relative_travel_time" : round(sim.relative_travel_time * 60, 3),  # mins / km
-        "avg_waiting" : round(sim.avg_waiting_time, 3),
-        "avg_queue" : round(sim.avg_queue, 3)
-    }
+    result = sim.report(_end - _start)
+    store_result(config, seed, result)
+    return_dict[config_file + str(id)] = result
     print(f"Worker {config_file + str(id)} concluded")
 
 
 
-def multiprocess_run():
-    
-    for filename in os.listdir("./configs/"):
-        
-        manager = multiprocessing.Manager()
-        return_dict = manager.dict()
-        jobs = []
-        
-        for i in range(3):
-            proc = multiprocessing.Process(
-                target=run, 
-                args=(i, return_dict, "./configs/" + filename)
-            )
-            jobs.append(proc)
-            proc.start()
+def compare_charging (config, seed=0, stations=False):
+    """
+    Method to run the same simulation with the eager and the lazy charging
+    (see Config.LAZY_CHARGING), and report side by side the events scheduled
+    and the wall time.
+
+    :param config: The configuration.
+    :param seed: The seed used by both runs.
+    :param stations: If True the station nodes are recomputed.
+    :return: For each mode, the number of events, the computational time, and some results.
+    """
+    # NOTE: The graph is read once, and both runs use the same random streams.
+    streams = RandomStreams(seed)
+    G = Graph.from_file(simpy.Environment(), config, stations=stations, elevation=False,
+                        seed=streams.seed("placement") if stations else None)
+
+    comparison = {}
+    for lazy in (False, True):
+        random.seed(seed)
+        _config = dataclasses.replace(config, LAZY_CHARGING=lazy)
+        env = CountingEnvironment()
+        sim = SimulationRunner(env, _config, G, streams=streams)
+        _start = time.time()
+        sim()
+        _end = time.time()
+        comparison["lazy" if lazy else "eager"] = {
+            "events" : env.n_events,
+            "computational_time" : round(_end - _start, 3),  # seconds
+            "total_trips" : sim.total_trips,
+            "failed_trips" : sim.failed_trips,
+            "avg_waiting" : round(sim.avg_waiting_time, 3),
+        }
+    return comparison
+
+
+
+def run_replications (config, n=None, seeds=None, stations=False, G=None):
+    """
+    Method to run many replications of a simulation one after the other in this
+    process. The graph is read (and preprocessed) once, and each replication only
+    makes its own stations (see StationRegistry).
+
+    :param config: The configuration.
+    :param n: The number of replications (by default one for each seed).
+    :param seeds: The seeds of the replications (by default 0, 1, ..., n - 1).
+    :param stations: If True the station nodes are recomputed (once, for all the replications).
+    :param G: A graph already loaded (if None it is read from file).
+    :return: The results of each replication (see SimulationRunner.report) with its seed.
+
+    NOTE: With Config.RESULT_CACHE the replications already executed are not executed 
+    again (and the graph is not read if none is missing). Since the memo supposes the
+    stations saved in the graph file, it is not used when stations are recomputed or
+    the graph is passed.
+    """
+    if seeds is None:
+        seeds = range(n)
+    seeds = list(seeds)
+    if n is not None and n != len(seeds):
+        raise Exception(f"{n} replications requested with {len(seeds)} seeds.")
+
+    memo = G is None and not stations
+    results = []
+    for seed in seeds:
+        if memo and (result := lookup_result(config, seed)) is not None:
+            results.append({"seed" : seed, **result, "cached" : True})
+            continue
+
+        if G is None:
+            G = Graph.from_file(simpy.Environment(), config, stations=stations, elevation=False)
+        random.seed(seed)
+        env = CountingEnvironment()
+        sim = SimulationRunner(env, config, G, streams=RandomStreams(seed))
+        _start = time.time()
+        sim()
+        _end = time.time()
+        result = sim.report(_end - _start)
+        if memo:
+            store_result(config, seed, result)
+        results.append({"seed" : seed, **result})
+    return results
+
+
+
+def run_paired (config, variants, seeds=range(3), stations=False, G=None):
+    """
+    Method to compare some variants of a configuration with common random numbers:
+    for each seed, all the variants are executed with the same random streams (see
+    RandomStreams), so they see the same demand and the same batteries, and their 
+    differences are not hidden by the noise of different samples.
+
+    :param config: The base configuration.
+    :param variants: A dict of the overrides of each variant, e.g., {"sharing": {"SHARING": True}}.
+    :param seeds: The seeds (one paired replication each).
+    :param stations: If True the station nodes are recomputed (once, with the first seed).
+    :param G: A graph already loaded (if None it is read from file).
+    :return: For each seed, the seed and the results of each variant (see SimulationRunner.report).
+    """
+    seeds = list(seeds)
+    if G is None:
+        G = Graph.from_file(simpy.Environment(), config, stations=stations, elevation=False,
+                            seed=RandomStreams(seeds[0]).seed("placement") if stations and seeds else None)
+
+    results = []
+    for seed in seeds:
+        streams, paired = RandomStreams(seed), {}
+        for name, overrides in variants.items():
+            _config = dataclasses.replace(config, **overrides)
+            random.seed(seed)
+            env = CountingEnvironment()
+            sim = SimulationRunner(env, _config, G, streams=streams)
+            _start = time.time()
+            sim()
+            _end = time.time()
+            paired[name] = sim.report(_end - _start)
+        results.append({"seed" : seed, "variants" : paired})
+    return results
+
+
+
+def paired_difference (results, metric, a, b):
+    """
+    Method to summarise the paired differences of a metric between two variants
+    (see run_paired).
+
+    :param results: The results of run_paired.
+    :param metric: The key of the metric in the results (e.g., "avg_waiting").
+    :param a: The name of the first variant.
+    :param b: The name of the second variant.
+    :return: The mean and the standard deviation of the differences (a - b), and the pairs.
+    """
+    differences = Welford()
+    for result in results:
+        differences.add(result["variants"][a][metric] - result["variants"][b][metric])
+    return {"mean" : differences.mean, "std" : differences.std, "pairs" : differences.count}
+
+
+
+def merge_station_stats (results):
+    """
+    Method to merge the station statistics of the workers of a scenario
+    (i.e., the accumulators and sketches returned by run).
+
+    :param results: The results of the workers.
+    :return: The summary of the merged statistics.
+    """
+    stats = StationStats()
+    for result in results:
+        stats.merge(StationStats.from_dict(result["station_stats"]))
+    return {key : round(value, 3) if value is not None else None for key, value in stats.report().items()}
 
-        for proc in jobs:
-            proc.join()
 
-        with open("./results", "a") as file:
-            file.write(json.dumps(return_dict))
-            file.write("\n")
+
+def multiprocess_run (grid=None, seeds=range(3), results_file="./results.jsonl", max_workers=None):
+    """
+    Method to run the sweep of the configurations in ./configs/ (see Sweep) on 
+    a pool of worker processes. Results are streamed to the results file, and a 
+    new call only executes the jobs whose results are missing.
+
+    :param grid: A dict of the values of some fields of Config (see expand_grid).
+    :param seeds: The seeds of the replications of each scenario.
+    :param results_file: The JSONL file of the results.
+    :param max_workers: The maximum number of worker processes (all the cores by default).
+    :return: For each scenario, the summary of the station statistics merged over its seeds.
+    """
+    config_files = sorted("./configs/" + i for i in os.listdir("./configs/") if i.endswith(".json"))
+    jobs = expand_grid(config_files, grid, seeds)
+    sweep = Sweep(jobs, results_file, max_workers=max_workers)
+    sweep.run()
+
+    ids, scenarios = {job["id"] for job in jobs}, {}
+    for result in sweep.results():
+        if result["id"] in ids:
+            scenarios.setdefault(scenario_key(result), []).append(result)
+    return {key : merge_station_stats(results) for key, results in scenarios.items()}
+
+
+
+def warm_routes (config_file, store=None, n_pairs=10_000, processes=None):
+    """
+    Method to precompute the routes of the most probable couples (origin, destination)
+    of the graph of a configuration, and write them in its route store (see warm).
+
+    :param config_file: The configuration file defining the graph.
+    :param store: The SQLite file of the routes (Config.ROUTE_STORE by default).
+    :param n_pairs: The number of couples to precompute.
+    :param processes: The number of worker processes (all the cores by default).
+    :return: The number of routes written.
+    """
+    config = read_configuration(config_file)
+    if not (store := store or config.ROUTE_STORE):
+        raise Exception(f"No route store in {config_file}.")
+    G = Graph.from_file(simpy.Environment(), config, stations=False, elevation=False)
+    routes = RouteStore(store, G.csr.fingerprint)
+    try:
+        return warm(routes, G.csr, n_pairs, processes)
+    finally:
+        routes.close()
 
         
 
@@ -74,6 +268,17 @@ def multiprocess_run():
 
 if __name__ == "__main__":
 
+    # NOTE: python -m simulation.main warm <config> precomputes the routes of the store (see warm_routes).
+    if sys.argv[1:2] == ["warm"]:
+        parser = argparse.ArgumentParser(prog="python -m simulation.main warm", description="Precompute the most probable routes of a graph.")
+        parser.add_argument("config", help="The configuration file defining the graph.")
+        parser.add_argument("--store", default=None, help="The SQLite file (ROUTE_STORE of the configuration by default).")
+        parser.add_argument("--pairs", type=int, default=10_000, help="The number of couples (origin, destination).")
+        parser.add_argument("--processes", type=int, default=None, help="The number of worker processes.")
+        args = parser.parse_args(sys.argv[2:])
+        print(f"{warm_routes(args.config, args.store, args.pairs, args.processes)} routes written")
+        sys.exit()
+
     """
     env = simpy.Environment()
 
@@ -107,8 +312,12 @@ if __name__ == "__main__":
     print("Computational time: ", round(_end - _start, 3), "s")
     print("Total trips started: ", sim.total_trips)
     print("Vehicles not arrived to destination: ", sim.failed_trips)
-    print("Graph topology problems: ", sim.nx_failed_trips)
+    print("Graph topology problems: ", sim.nx_failed_trips, "( filtered:", sim.filtered_trips, ")")
     print("Relative travel time: ", sim.relative_travel_time, " hours / km")
     print("Relative travel time: ", round(sim.relative_travel_time * 60, 3), " mins / km")
     print("Average waiting time at stations: ", round(sim.avg_waiting_time, 3), " s")
+    print("Planning time (", config.PLANNER, "): ", round(sim.planning_time, 3), "s")
+    print("Path cache: ", sim.path_cache.stats)
+    if G.landmarks:
+        print("Landmarks: ", G.landmarks.report(n_queries=100))
     
\ No newline at end of file
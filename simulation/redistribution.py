@@ -0,0 +1,103 @@
+import time
+
+import numpy as np
+
+from simulation.utils.algorithms import linear_assignment
+
+
+
+
+class RedistributionPlanner:
+
+    """
+    An instance of this class plans each round of the redistribution of batteries
+    for the whole fleet of distributors at once.
+
+    From a snapshot of the surplus (i.e., batteries on the side) and of the deficit
+    (i.e., capacity minus stored batteries) of stations, the plan is made in two
+    assignment problems solved on the matrix of distances between stations:
+
+        1. each source is coupled with a different target, minimising the meters
+            travelled per battery moved;
+        2. each distributor is assigned a different (source, target) couple,
+            minimising the meters travelled (approach included) per battery moved.
+
+    NOTE: Only the best k sources and targets of the registry are considered,
+    with k the number of distributors.
+
+    NOTE: The planner only keeps the state of a run: the distances are the ones of
+    the matrix of the graph, shared by all the runs on it.
+    """
+
+    def __init__(self, G, registry):
+        """
+        :param G: The graph (with its matrix of stations).
+        :param registry: The registry of the stations of the run.
+
+        :attr planning_time: The overall time in seconds spent planning.
+        :attr rounds: The number of rounds planned.
+        """
+        self.G = G
+        self.csr = G.csr
+        self.registry = registry
+        self.planning_time = 0
+        self.rounds = 0
+
+
+    @property
+    def matrix (self):
+        """ The matrix of distances between stations (built by the graph on first use) """
+        return self.G.station_matrix
+
+
+    def distances_from (self, node):
+        """ The distances from a node (original id) to all the stations, in the order of the matrix """
+        return self.matrix.distances_from(self.csr.index[node])
+
+
+    def distance (self, node, station):
+        """ The distance from a node to a station (original ids) """
+        return float(self.distances_from(node)[self.matrix.index[self.csr.index[station]]])
+
+
+    def plan (self, vehicles):
+        """
+        Method to plan a round of redistribution.
+
+        :param vehicles: The distributors.
+        :return: A list of (distributor, (source id, source station), (target id, target station)).
+        """
+        _start = time.perf_counter()
+        csr, matrix, registry = self.csr, self.matrix, self.registry
+        plans = []
+
+        sources, targets = registry.top(len(vehicles))
+        sources = [i for i in sources if i[1].chargers_ontheside > 0]
+        targets = [i for i in targets if i[1].chargers_capacity - i[1].chargers_level > 0]
+
+        if sources and targets:
+            rows = np.array([matrix.index[csr.index[i]] for i, _ in sources])
+            cols = np.array([matrix.index[csr.index[i]] for i, _ in targets])
+            surplus = np.array([i[1].chargers_ontheside for i in sources], dtype=np.float64)
+            deficit = np.array([i[1].chargers_capacity - i[1].chargers_level for i in targets], dtype=np.float64)
+
+            # Sources -> targets: meters per battery moved
+            moves = np.minimum(surplus[:, None], deficit[None, :])
+            legs = matrix.distances[np.ix_(rows, cols)]
+            legs = np.where(rows[:, None] == cols[None, :], np.inf, legs)
+            tasks = linear_assignment(legs / moves)
+
+            if tasks:
+                task_rows = np.array([rows[s] for s, _ in tasks])
+                task_legs = np.array([legs[s, t] for s, t in tasks])
+                task_moves = np.array([moves[s, t] for s, t in tasks])
+
+                # Distributors -> tasks: meters (approach included) per battery moved
+                approach = np.array([self.distances_from(vehicle.position)[task_rows] for vehicle in vehicles])
+                assignment = linear_assignment((approach + task_legs[None, :]) / task_moves[None, :])
+
+                plans = [(vehicles[d], sources[tasks[k][0]], targets[tasks[k][1]]) for d, k in assignment]
+
+        self.rounds += 1
+        self.planning_time += time.perf_counter() - _start
+        return plans
@@ -0,0 +1,8 @@
+from .cache import PathCache
+from .store import RouteStore, warm
+from .landmarks import Landmarks
+from .contraction import ContractionHierarchy
+from .router import Router
+from .constrained import ConstrainedPlanner
+from .overlay import StationOverlay
+from .matrix import StationMatrix
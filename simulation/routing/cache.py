@@ -0,0 +1,105 @@
+import collections
+
+
+
+
+class PathCache:
+
+    """
+    An instance of this class is a bounded in-process cache of shortest paths
+    with Least Recently Used (LRU) eviction policy.
+
+    Paths are kept as tuples so that they cannot be corrupted by the callers.
+    An empty tuple is used to remember that no path exists between two nodes.
+    """
+
+    def __init__(self, maxsize=50_000):
+        """
+        :param maxsize: The maximum number of paths kept. If 0 nothing is cached.
+
+        :attr hits: The number of lookups that found the path.
+        :attr misses: The number of lookups that did not find the path.
+        :attr evictions: The number of paths removed to make room for new ones.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__paths = collections.OrderedDict()
+
+
+    def __len__ (self):
+        return len(self.__paths)
+
+
+    def __contains__ (self, key):
+        return key in self.__paths
+
+
+    @property
+    def hit_rate (self):
+        """ The rate of lookups that found the path """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0
+
+
+    @property 
+    def stats (self):
+        """ A summary of the cache usage used to size it """
+        return {
+            "maxsize": self.maxsize,
+            "size": len(self.__paths),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+    def get (self, source, target, weight="length"):
+        """
+        Method to look for a path.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param weight: The name of the weight the path minimises.
+        :return: The path as a tuple (empty if the target cannot be reached), 
+                or None if the path is not in the cache.
+        """
+        key = (source, target, weight)
+        if (path := self.__paths.get(key)) is None:
+            self.misses += 1
+            return None
+        self.__paths.move_to_end(key)
+        self.hits += 1
+        return path
+
+
+    def put (self, source, target, path, weight="length"):
+        """
+        Method to store a path. 
+        When the cache is full the least recently used path is evicted.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param path: The path (None or empty if the target cannot be reached).
+        :param weight: The name of the weight the path minimises.
+        :return: The path as stored (i.e., a tuple).
+        """
+        path = tuple(path) if path else ()
+        if self.maxsize <= 0:
+            return path
+
+        key = (source, target, weight)
+        self.__paths[key] = path
+        self.__paths.move_to_end(key)
+        if len(self.__paths) > self.maxsize:
+            self.__paths.popitem(last=False)
+            self.evictions += 1
+        return path
+
+
+    def clear (self):
+        """ Method to remove all the paths and reset the counters """
+        self.__paths.clear()
+        self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,115 @@
+import heapq
+import functools
+
+from simulation.utils.technical import csr_euclidean_distance
+from simulation.exceptions import SimulationNoPath
+
+
+
+
+class ConstrainedPlanner:
+
+    """
+    An instance of this class is an energy-constrained routing engine, which plans
+    with a single search the next leg of a trip: to the target when it can be reached
+    with the energy available, otherwise to a reachable charging station.
+
+    The search is a label-setting A* on the CSR view, where each label is a couple
+    (distance, remaining energy) at a node. Labels are expanded in order of distance
+    plus heuristic, and a label is pruned when a label already settled at the same node
+    has at least the same remaining energy (dominance). Labels are kept in flat
+    predecessor arrays, so paths are rebuilt only for the leg returned.
+
+    When the target cannot be reached, the leg goes to one of the reached stations:
+    the ones closer to the target than the source (according to the heuristic) come 
+    first, and then the closest to the target according to the heuristic, to the 
+    distance as the crow flies, and to the distance travelled.
+
+    NOTE: Lower bounds such as the ALT heuristic are often 0 (or not lower than the one 
+    of the source) far from the landmarks, hence a reachable station is always accepted.
+    """
+
+    def __init__(self, csr, router=None, heuristic=None):
+        """
+        :param csr: The CSR view of the graph.
+        :param router: The Router used to tell apart topology problems when no leg
+                    is found (if not passed a SimulationNoPath is always raised).
+        :param heuristic: The A* heuristic (euclidean distance by default).
+        """
+        self.csr = csr
+        self.router = router
+        self.heuristic = heuristic or functools.partial(csr_euclidean_distance, csr=csr)
+
+
+    def plan (self, source, target, vehicle, level=None):
+        """
+        Method to plan the next leg of a trip.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param vehicle: The vehicle.
+        :param level: The current level of vehicle batteries. If not passed it
+                    is taken from vehicle instance.
+        :return: The path of the leg as a tuple of integer nodes.
+        """
+        csr, h = self.csr, self.heuristic
+        euclidean = functools.partial(csr_euclidean_distance, target=target, csr=csr)
+        adjacency, length, is_station = csr.adjacency, csr.column("length"), csr.column("is_station")
+        costs = csr.energy_costs(vehicle.vtype, aslist=True)
+        push, pop = heapq.heappush, heapq.heappop
+        level = level or vehicle.level
+
+        # Predecessor arrays of labels --i.e., label -> node and label -> previous label
+        label_node, label_pred = [source], [-1]
+        # The maximum remaining energy among the labels settled at each node
+        settled = {}
+
+        # The queue stores priority, distance, negative remaining energy, and label
+        queue = [(h(source, target), 0, -level, 0)]
+        h_source = h(source, target)
+        station, station_key = None, None
+
+        while queue:
+            _, dist, energy, label = pop(queue)
+            node, energy = label_node[label], -energy
+
+            # Dominance: a label with more energy was already settled here
+            if energy <= settled.get(node, -1):
+                continue
+            settled[node] = energy
+
+            if node == target:
+                return self.__path(label_node, label_pred, label)
+
+            # Keep track of the best station reached so far
+            if is_station[node] and node != source:
+                h_node = h(node, target)
+                key = (h_node >= h_source, h_node, euclidean(node), dist)
+                if station_key is None or key < station_key:
+                    station, station_key = label, key
+
+            for neighbor, e in adjacency[node]:
+                if (nenergy := energy - costs[e]) >= 0 and nenergy > settled.get(neighbor, -1):
+                    ndist = dist + length[e]
+                    label_node.append(neighbor)
+                    label_pred.append(label)
+                    push(queue, (ndist + h(neighbor, target), ndist, -nenergy, len(label_node) - 1))
+
+        if station is None:
+            # Raises a NetworkXNoPath exception if the problem is the graph topology
+            if self.router is not None:
+                self.router.shortest_path(source, target)
+            raise SimulationNoPath
+
+        return self.__path(label_node, label_pred, station)
+
+
+    @staticmethod
+    def __path (label_node, label_pred, label):
+        """ Method to rebuild the path ending with a label """
+        path = []
+        while label != -1:
+            path.append(label_node[label])
+            label = label_pred[label]
+        path.reverse()
+        return tuple(path)
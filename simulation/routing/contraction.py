@@ -0,0 +1,293 @@
+import time
+import heapq
+import itertools
+import math
+
+import numpy as np
+
+
+
+
+class ContractionHierarchy:
+
+    """
+    An instance of this class is a Contraction Hierarchy (CH) built on the
+    CSR view of a graph for a given weight (by default the length of edges).
+
+    During the preprocessing nodes are contracted one by one according to their
+    importance (edge difference, contracted neighbours and depth, with lazy updates). When
+    a node v is contracted, for each couple of neighbours (u, w) a shortcut u -> w
+    is added, unless a witness path not passing through v is found by a local search.
+
+    Queries are bidirectional Dijkstra searches that only go upward in the
+    hierarchy, and the shortcuts of the path found are finally unpacked into the
+    original nodes through the middle node each shortcut is replacing.
+    """
+
+    def __init__(self, csr, weight=None, settle_limit=60, estimate_limit=10):
+        """
+        :param csr: The CSR view of the graph.
+        :param weight: The cost of each edge as a sequence indexed by edge id.
+                    If not passed the length of edges is used.
+        :param settle_limit: The maximum number of nodes settled by a witness search.
+                            A lower limit makes the preprocessing faster, but it might
+                            add some unnecessary shortcuts.
+        :param estimate_limit: The maximum number of nodes settled by the witness searches 
+                            used to estimate the importance of nodes.
+
+        :attr rank: The position of each node in the contraction order.
+        :attr shortcuts: The number of shortcuts added.
+        :attr preprocessing_time: The time in seconds required by the preprocessing.
+        """
+        _start = time.perf_counter()
+        self.n_nodes = csr.n_nodes
+        self.settle_limit = settle_limit
+        self.estimate_limit = estimate_limit
+        weight = weight if weight is not None else csr.column("length")
+
+        # All the edges (original and shortcuts) --i.e., (u, v) -> (weight, middle node)
+        self.__edges = {}
+        for e, (u, v) in enumerate(zip(csr.column("sources"), csr.column("targets"))):
+            if u != v and ((u, v) not in self.__edges or weight[e] < self.__edges[u, v][0]):
+                self.__edges[u, v] = (weight[e], None)
+
+        self.shortcuts = 0
+        self.rank = self.__contract()
+        self.__upward()
+
+        self.preprocessing_time = time.perf_counter() - _start
+
+
+    @classmethod
+    def from_arrays (cls, csr, arrays):
+        """
+        Method to restore the hierarchy from its arrays (see to_arrays) without any
+        contraction, e.g. from the arrays shared by another process.
+
+        :param csr: The CSR view of the graph.
+        :param arrays: The arrays returned by to_arrays.
+        :return: A ContractionHierarchy instance (whose preprocessing time is the restoring time).
+        """
+        self = cls.__new__(cls)
+        _start = time.perf_counter()
+        self.n_nodes = csr.n_nodes
+        self.settle_limit, self.estimate_limit = None, None
+        self.rank = arrays["rank"].tolist()
+        self.__edges = {
+            (u, v): (w, mid if mid >= 0 else None) 
+            for u, v, w, mid in zip(arrays["sources"].tolist(), arrays["targets"].tolist(), arrays["weight"].tolist(), arrays["middle"].tolist())
+        }
+        self.shortcuts = int(np.count_nonzero(arrays["middle"] >= 0))
+        self.__upward()
+        self.preprocessing_time = time.perf_counter() - _start
+        return self
+
+
+    def to_arrays (self):
+        """ The arrays of the hierarchy: the rank of nodes, and all the edges with their weight and middle node (-1 if original) """
+        edges = self.__edges
+        return {
+            "rank": np.asarray(self.rank, dtype=np.int64),
+            "sources": np.fromiter((u for u, _ in edges), dtype=np.int64, count=len(edges)),
+            "targets": np.fromiter((v for _, v in edges), dtype=np.int64, count=len(edges)),
+            "weight": np.fromiter((w for w, _ in edges.values()), dtype=np.float64, count=len(edges)),
+            "middle": np.fromiter((-1 if mid is None else mid for _, mid in edges.values()), dtype=np.int64, count=len(edges)),
+        }
+
+
+    def __upward (self):
+        """ Method to build the upward edges used by the forward search and (reversed) by the backward search """
+        self.__up_out = [[] for _ in range(self.n_nodes)]
+        self.__up_in = [[] for _ in range(self.n_nodes)]
+        rank = self.rank
+        for (u, v), (w, _) in self.__edges.items():
+            if rank[u] < rank[v]:
+                self.__up_out[u].append((v, w))
+            else:
+                self.__up_in[v].append((u, w))
+
+
+    def __contract (self):
+        """ Method to contract all the nodes and get their rank """
+        n = self.n_nodes
+        outs = [dict() for _ in range(n)]
+        ins = [dict() for _ in range(n)]
+        for (u, v), (w, _) in self.__edges.items():
+            outs[u][v] = w
+            ins[v][u] = w
+
+        contracted_neighbours = [0] * n
+        depth = [0] * n
+        rank = [0] * n
+        contracted = [False] * n
+
+        def shortcuts_needed (v, settle_limit):
+            """ The shortcuts required when v is contracted """
+            needed = []
+            if not ins[v] or not outs[v]:
+                return needed
+            max_out = max(outs[v].values())
+            for u, w_uv in ins[v].items():
+                dist = self.__witness_search(outs, u, v, w_uv + max_out, settle_limit)
+                for w, w_vw in outs[v].items():
+                    if w != u and dist.get(w, math.inf) > w_uv + w_vw:
+                        needed.append((u, w, w_uv + w_vw))
+            return needed
+
+        def priority (v):
+            """ Edge difference (weighted twice) + contracted neighbours + depth in the hierarchy """
+            # NOTE: Shorter witness searches are used to estimate the shortcuts
+            shortcuts = len(shortcuts_needed(v, self.estimate_limit))
+            return 2 * (shortcuts - len(ins[v]) - len(outs[v])) + contracted_neighbours[v] + depth[v]
+
+        current = [priority(v) for v in range(n)]
+        queue = [(p, v) for v, p in enumerate(current)]
+        heapq.heapify(queue)
+        order = 0
+
+        while queue:
+            p, v = heapq.heappop(queue)
+
+            # Skip the entries made obsolete by a later update
+            if contracted[v] or p != current[v]:
+                continue
+
+            # Lazy update of the priority
+            if queue and (p := priority(v)) > queue[0][0]:
+                current[v] = p
+                heapq.heappush(queue, (p, v))
+                continue
+
+            for u, w, weight in shortcuts_needed(v, self.settle_limit):
+                if weight < outs[u].get(w, math.inf):
+                    outs[u][w] = weight
+                    ins[w][u] = weight
+                    self.__edges[u, w] = (weight, v)
+                    self.shortcuts += 1
+
+            # Remove the node from the remaining graph
+            neighbours = set(ins[v]) | set(outs[v])
+            for u in ins[v]:
+                del outs[u][v]
+            for w in outs[v]:
+                del ins[w][v]
+            ins[v], outs[v] = {}, {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+            # Update the priority of the neighbours
+            for u in neighbours:
+                contracted_neighbours[u] += 1
+                depth[u] = max(depth[u], depth[v] + 1)
+                current[u] = priority(u)
+                heapq.heappush(queue, (current[u], u))
+
+        return rank
+
+
+    def __witness_search (self, outs, source, excluded, limit, settle_limit):
+        """ Local Dijkstra search from source that avoids the node being contracted """
+        dist = {source: 0}
+        queue = [(0, source)]
+        settled = 0
+        while queue and settled < settle_limit:
+            d, node = heapq.heappop(queue)
+            if d > dist[node]:
+                continue
+            if d > limit:
+                break
+            settled += 1
+            for neighbor, w in outs[node].items():
+                if neighbor != excluded and (nd := d + w) < dist.get(neighbor, math.inf):
+                    dist[neighbor] = nd
+                    heapq.heappush(queue, (nd, neighbor))
+        return dist
+
+
+    def distance (self, source, target):
+        """ The shortest distance between two integer nodes (inf if not reachable) """
+        return self.__query(source, target)[0]
+
+
+    def shortest_path (self, source, target):
+        """
+        The shortest path between two integer nodes.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :return: The path as a tuple of integer nodes (empty if the target cannot be reached).
+        """
+        dist, meet, fpred, bpred = self.__query(source, target)
+        if meet is None:
+            return ()
+
+        # Path of edges (possibly shortcuts) from source to target through the meeting node
+        nodes = [meet]
+        while (node := fpred[nodes[-1]]) is not None:
+            nodes.append(node)
+        nodes.reverse()
+        while (node := bpred[nodes[-1]]) is not None:
+            nodes.append(node)
+
+        # Unpack the shortcuts
+        edges = self.__edges
+        path = [source]
+        for u, v in zip(nodes[:-1], nodes[1:]):
+            stack = [(u, v)]
+            while stack:
+                a, b = stack.pop()
+                if (mid := edges[a, b][1]) is None:
+                    path.append(b)
+                else:
+                    stack.append((mid, b))
+                    stack.append((a, mid))
+        return tuple(path)
+
+
+    def __query (self, source, target):
+        """ Bidirectional upward Dijkstra search """
+        if source == target:
+            return 0, source, {source: None}, {target: None}
+
+        up_out, up_in = self.__up_out, self.__up_in
+        push, pop = heapq.heappush, heapq.heappop
+
+        dists = ({source: 0}, {target: 0})
+        preds = ({source: None}, {target: None})
+        queues = ([(0, source)], [(0, target)])
+        adjacency = (up_out, up_in)
+        best, meet = math.inf, None
+
+        for side in itertools.cycle((0, 1)):
+            if not queues[0] and not queues[1]:
+                break
+            queue, dist, pred, other = queues[side], dists[side], preds[side], dists[1 - side]
+            if not queue:
+                continue
+            d, node = pop(queue)
+
+            # Stop when both searches cannot improve the best distance
+            if d >= best and (not queues[1 - side] or queues[1 - side][0][0] >= best):
+                break
+            if d > dist[node] or d >= best:
+                continue
+
+            if node in other and (total := d + other[node]) < best:
+                best, meet = total, node
+
+            for neighbor, w in adjacency[side][node]:
+                if (nd := d + w) < dist.get(neighbor, math.inf):
+                    dist[neighbor] = nd
+                    pred[neighbor] = node
+                    push(queue, (nd, neighbor))
+
+        return best, meet, preds[0], preds[1]
+
+
+    def report (self):
+        """ A summary of the preprocessing """
+        return {
+            "shortcuts": self.shortcuts,
+            "preprocessing_time": round(self.preprocessing_time, 3),
+        }
@@ -0,0 +1,191 @@
+import time
+import random
+import functools
+
+import numpy as np
+from networkx.exception import NetworkXNoPath
+
+from simulation.utils.algorithms import csr_dijkstra, csr_astar_path
+from simulation.utils.technical import csr_euclidean_distance
+
+
+
+
+class Landmarks:
+
+    """
+    An instance of this class is the preprocessing of the ALT (A*, Landmarks,
+    Triangle inequality) algorithm on the CSR view of a graph.
+
+    For each landmark L the distances from L to all nodes (forward) and from all
+    nodes to L (backward) are stored. Because of the triangle inequality:
+
+            d(v, t) >= d(L, t) - d(L, v)
+            d(v, t) >= d(v, L) - d(t, L)
+
+    and the maximum of these lower bounds is a tight admissible heuristic for A*.
+
+    NOTE: Contrarily to the euclidean distance, which compares longitude and latitude
+    degrees with lengths in meters, this heuristic is expressed in the same unit of
+    the weight, hence A* actually avoids exploring the nodes far from the target.
+    """
+
+    def __init__(self, csr, k=8, seed=None):
+        """
+        :param csr: The CSR view of the graph.
+        :param k: The number of landmarks.
+        :param seed: The seed used to pick the first node of the landmarks selection
+                    (by default the fingerprint of the view, see select).
+
+        :attr landmarks: The integer ids of the landmarks.
+        :attr forward: A (k, N) array with the distances from landmarks to nodes.
+        :attr backward: A (k, N) array with the distances from nodes to landmarks.
+        :attr preprocessing_time: The time in seconds required by the preprocessing.
+        """
+        self.csr = csr
+        _start = time.perf_counter()
+
+        # NOTE: The forward distances are the ones computed by the selection.
+        self.landmarks, forward = self.select(csr, k, seed, distances=True)
+        self.forward = np.array(forward, dtype=np.float64).reshape(-1, csr.n_nodes)
+        self.backward = np.array([csr_dijkstra(csr, i, reverse=True) for i in self.landmarks], dtype=np.float64).reshape(-1, csr.n_nodes)
+
+        # The distances organised node by node for the pure python heuristic
+        self.__forward = self.forward.T.tolist()
+        self.__backward = self.backward.T.tolist()
+
+        self.preprocessing_time = time.perf_counter() - _start
+
+
+    @classmethod
+    def from_arrays (cls, csr, arrays):
+        """
+        Method to restore the preprocessing from its arrays (see to_arrays) without
+        any search, e.g. from the arrays shared by another process (no copy).
+
+        NOTE: Only the distances organised node by node for the heuristic are copied.
+
+        :param csr: The CSR view of the graph.
+        :param arrays: The arrays returned by to_arrays.
+        :return: A Landmarks instance (whose preprocessing time is the restoring time).
+        """
+        self = cls.__new__(cls)
+        _start = time.perf_counter()
+        self.csr = csr
+        self.landmarks = arrays["landmarks"].tolist()
+        self.forward, self.backward = arrays["forward"], arrays["backward"]
+        self.__forward = self.forward.T.tolist()
+        self.__backward = self.backward.T.tolist()
+        self.preprocessing_time = time.perf_counter() - _start
+        return self
+
+
+    def to_arrays (self):
+        """ The arrays of the preprocessing: the landmarks and their forward and backward distances """
+        return {"landmarks": np.asarray(self.landmarks, dtype=np.int64), "forward": self.forward, "backward": self.backward}
+
+
+    @staticmethod
+    def select (csr, k, seed=None, distances=False):
+        """
+        Method to select the landmarks with the farthest strategy: the first landmark
+        is the node farthest from a random node, then each new landmark is the node
+        whose distance from the closest landmark already selected is the largest.
+
+        :param csr: The CSR view of the graph.
+        :param k: The number of landmarks.
+        :param seed: The seed used to pick the first node. By default it is the fingerprint
+                    of the view, so the same graph always gets the same landmarks (the
+                    heuristic breaks the ties of A*, hence it must not change the runs).
+        :param distances: If True the distances from the landmarks to all nodes 
+                        (computed by the selection) are returned too.
+        :return: A list of integer nodes (and the list of their distances).
+        """
+        k = min(k, csr.n_nodes)
+        if k <= 0:
+            return ([], []) if distances else []
+
+        start = random.Random(seed if seed is not None else csr.fingerprint).randrange(csr.n_nodes)
+        dist = np.asarray(csr_dijkstra(csr, start), dtype=np.float64)
+        closest = np.where(np.isfinite(dist), dist, -1.0)
+
+        landmarks, rows = [], []
+        while len(landmarks) < k:
+            landmark = int(np.argmax(closest))
+            if closest[landmark] < 0 or landmark in landmarks:
+                # All nodes reachable from the landmarks are already covered
+                landmark = next(i for i in range(csr.n_nodes) if i not in landmarks)
+            landmarks.append(landmark)
+
+            dist = np.asarray(csr_dijkstra(csr, landmark), dtype=np.float64)
+            rows.append(dist)
+            closest = np.minimum(closest, np.where(np.isfinite(dist), dist, np.inf))
+            closest[landmarks] = -1.0
+
+        return (landmarks, rows) if distances else landmarks
+
+
+    @property
+    def nbytes (self):
+        """ The memory used by the distances arrays in bytes """
+        return self.forward.nbytes + self.backward.nbytes
+
+
+    def heuristic (self, node, target):
+        """
+        The ALT lower bound of the distance from a node to the target.
+
+        NOTE: When a node cannot reach the target the bound is inf, and when a
+        landmark cannot see both nodes the bound is nan and it is ignored.
+        """
+        best = 0.0
+        for fv, ft, bv, bt in zip(self.__forward[node], self.__forward[target], self.__backward[node], self.__backward[target]):
+            if (d := ft - fv) > best:
+                best = d
+            if (d := bv - bt) > best:
+                best = d
+        return best
+
+
+    def benchmark (self, n_queries=100, seed=None):
+        """
+        Method to measure the speedup of A* with the ALT heuristic over A* with
+        the euclidean distance on random queries.
+
+        :param n_queries: The number of (source, target) queries.
+        :param seed: The seed used to pick the queries.
+        :return: The average time per query in seconds with both heuristics and the speedup.
+        """
+        csr, rnd = self.csr, random.Random(seed)
+        queries = [(rnd.randrange(csr.n_nodes), rnd.randrange(csr.n_nodes)) for _ in range(n_queries)]
+        times = {}
+
+        for name, heuristic in (("euclidean", functools.partial(csr_euclidean_distance, csr=csr)), ("alt", self.heuristic)):
+            _start = time.perf_counter()
+            for source, target in queries:
+                try:
+                    csr_astar_path(csr, source, target, heuristic=heuristic)
+                except NetworkXNoPath:
+                    pass
+            times[name] = (time.perf_counter() - _start) / max(1, n_queries)
+
+        return {
+            "euclidean_query_time": times["euclidean"],
+            "alt_query_time": times["alt"],
+            "speedup": times["euclidean"] / times["alt"] if times["alt"] > 0 else 0,
+        }
+
+
+    def report (self, n_queries=0, seed=None):
+        """
+        A summary of the preprocessing: number of landmarks, preprocessing time,
+        memory used, and (if n_queries > 0) the per-query speedup.
+        """
+        report = {
+            "landmarks": len(self.landmarks),
+            "preprocessing_time": round(self.preprocessing_time, 3),
+            "memory_bytes": self.nbytes,
+        }
+        if n_queries > 0:
+            report.update(self.benchmark(n_queries, seed))
+        return report
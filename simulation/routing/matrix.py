@@ -0,0 +1,195 @@
+import os
+import time
+import collections
+import multiprocessing
+
+import numpy as np
+
+from simulation.utils.algorithms import csr_dijkstra, csr_shortest_path
+
+
+
+
+class StationMatrix:
+
+    """
+    An instance of this class keeps the shortest distances between all the
+    couples of charging stations of a graph, used by distributors.
+
+    Distances are computed once with a Dijkstra search from each station (in
+    parallel on all the cores when stations are many), and can be persisted
+    next to the graph file. Node paths are only computed (and cached) when a
+    full path is actually needed.
+    """
+
+    # The minimum number of stations for which the searches are made in parallel
+    PARALLEL_THRESHOLD = 64
+
+
+    def __init__(self, csr, distances=None, processes=None, heuristic=None, maxrows=1024):
+        """
+        :param csr: The CSR view of the graph.
+        :param distances: The (S, S) array of distances, if already computed.
+        :param processes: The number of worker processes (all the cores by default).
+        :param heuristic: The A* heuristic used to unpack paths.
+        :param maxrows: The maximum number of rows of nodes that are not stations kept (see distances_from).
+
+        :attr stations: The integer ids of the stations (the order of rows and columns).
+        :attr index: A hashmap to go from the integer id of a station to its row.
+        :attr distances: The (S, S) array of distances in meters (inf if not reachable).
+        :attr preprocessing_time: The time in seconds required to compute the distances.
+        """
+        _start = time.perf_counter()
+        self.csr = csr
+        self.heuristic = heuristic
+        self.stations = np.flatnonzero(csr.is_station)
+        self.index = {station: i for i, station in enumerate(self.stations.tolist())}
+
+        self.distances = distances if distances is not None else self.compute(csr, self.stations, processes)
+        self.distances.flags.writeable = False
+
+        self.__times = {}
+        self.__paths = {}
+        self.maxrows = maxrows
+        self.__rows = collections.OrderedDict()
+        self.preprocessing_time = time.perf_counter() - _start
+
+
+    @classmethod
+    def compute (cls, csr, stations, processes=None):
+        """
+        Method to compute the distances between stations.
+
+        :param csr: The CSR view of the graph.
+        :param stations: The integer ids of the stations.
+        :param processes: The number of worker processes (all the cores by default).
+        :return: The (S, S) array of distances.
+        """
+        stations = np.asarray(stations, dtype=np.int64)
+        # NOTE: Inside a worker process (e.g., of a sweep) the searches are serial, so
+        # that the workers of a pool never start a pool of their own.
+        if multiprocessing.parent_process() is not None:
+            processes = 1
+        if processes == 1 or len(stations) < cls.PARALLEL_THRESHOLD:
+            rows = [_station_row(csr, stations, i) for i in stations.tolist()]
+        else:
+            with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(csr, stations)) as pool:
+                rows = pool.map(_compute_row, stations.tolist(), chunksize=max(1, len(stations) // (4 * (processes or os.cpu_count() or 1))))
+        return np.array(rows, dtype=np.float64).reshape(len(stations), len(stations))
+
+
+    def distance (self, source, target):
+        """ The shortest distance between two stations (integer ids) """
+        return float(self.distances[self.index[source], self.index[target]])
+
+
+    def distances_from (self, node):
+        """
+        The distances from a node (integer id) to all the stations, in the order of
+        the matrix. Rows of nodes that are not stations are computed with a Dijkstra 
+        search and then cached (the last <maxrows> used).
+
+        NOTE: The matrix is kept by the graph and shared by many runs, hence the
+        cache is bounded, whatever the origins they see.
+        """
+        if (row := self.index.get(node)) is not None:
+            return self.distances[row]
+        if (distances := self.__rows.get(node)) is not None:
+            self.__rows.move_to_end(node)
+            return distances
+        dist = csr_dijkstra(self.csr, node)
+        distances = self.__rows[node] = np.array([dist[i] for i in self.stations.tolist()], dtype=np.float64)
+        distances.flags.writeable = False
+        if len(self.__rows) > self.maxrows:
+            self.__rows.popitem(last=False)
+        return distances
+
+
+    def travel_times (self, speed):
+        """ The (S, S) array of travel times in seconds at a given speed (computed once per speed) """
+        if (times := self.__times.get(speed)) is None:
+            times = self.__times[speed] = self.distances / speed
+            times.flags.writeable = False
+        return times
+
+
+    def travel_time (self, source, target, speed):
+        """ The travel time in seconds between two stations (integer ids) """
+        return float(self.travel_times(speed)[self.index[source], self.index[target]])
+
+
+    def path (self, source, target):
+        """
+        The shortest path between two stations, unpacked (and cached) on demand.
+        Raises a NetworkXNoPath exception if the target cannot be reached.
+        """
+        if (path := self.__paths.get((source, target))) is None:
+            path = self.__paths[source, target] = csr_shortest_path(self.csr, source, target, heuristic=self.heuristic)
+        return path
+
+
+    def to_arrays (self):
+        """ The arrays of the matrix (the distances are enough to restore it, see __init__) """
+        return {"distances": self.distances}
+
+
+    def save (self, filename):
+        """ Method to persist the distances (with the graph fingerprint and the stations) """
+        np.savez(filename, fingerprint=np.array(self.csr.fingerprint), stations=self.stations, distances=self.distances)
+
+
+    @classmethod
+    def load (cls, filename, csr, heuristic=None):
+        """
+        Method to read persisted distances.
+
+        :param filename: The file written by save.
+        :param csr: The CSR view of the graph.
+        :param heuristic: The A* heuristic used to unpack paths.
+        :return: A StationMatrix, or None if the file does not exist or does not
+                belong to the graph and its stations.
+        """
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename) as data:
+            if str(data["fingerprint"]) != csr.fingerprint or not np.array_equal(data["stations"], np.flatnonzero(csr.is_station)):
+                return None
+            distances = data["distances"]
+        return cls(csr, distances=distances, heuristic=heuristic)
+
+
+    @staticmethod
+    def filename (graph_file):
+        """ The file where the matrix of a graph file is persisted (next to it) """
+        return os.path.splitext(graph_file)[0] + ".stations.npz"
+
+
+    def report (self):
+        """ A summary of the matrix """
+        return {
+            "stations": len(self.stations),
+            "preprocessing_time": round(self.preprocessing_time, 3),
+            "memory_bytes": self.distances.nbytes,
+            "rows": len(self.__rows),
+        }
+
+
+
+def _station_row (csr, stations, source):
+    """ The distances from a station to all the stations """
+    dist = csr_dijkstra(csr, source)
+    return [dist[i] for i in stations.tolist()]
+
+
+
+# The view of the graph and the stations used by the worker processes
+_worker_csr, _worker_stations = None, None
+
+
+def _init_worker (csr, stations):
+    global _worker_csr, _worker_stations
+    _worker_csr, _worker_stations = csr, stations
+
+
+def _compute_row (source):
+    return _station_row(_worker_csr, _worker_stations, source)
@@ -0,0 +1,224 @@
+import time
+import heapq
+import math
+import collections
+
+import numpy as np
+
+from simulation.exceptions import SimulationNoPath
+
+
+
+
+def bounded_search (csr, source, costs, budget, reverse=False, target=None):
+    """
+    Resource-constrained search on the length of edges from a source: a label-setting
+    Dijkstra where each label is a couple (distance, energy) at a node, and the paths
+    requiring more energy than the budget are discarded.
+
+    NOTE: A label is pruned only when a label settled earlier at the same node (hence
+    not longer) required no more energy. A longer path that saves energy is still
+    expanded, so the nodes it reaches are found even if their shortest path is not
+    feasible.
+
+    :param csr: The CSR view of the graph.
+    :param source: The starting node.
+    :param costs: The energy consumed on each edge (list indexed by edge id).
+    :param budget: The energy available.
+    :param reverse: If True edges are followed backward (i.e., paths to the source).
+    :param target: If passed the search stops as soon as the target is settled.
+    :return: The distance and the energy of the shortest feasible path to each reached
+            node, and the labels used to unpack the paths (see _unpack).
+    """
+    adjacency = csr.reverse_adjacency if reverse else csr.adjacency
+    length = csr.column("length")
+    push, pop = heapq.heappush, heapq.heappop
+
+    # Predecessor arrays of labels --i.e., label -> node and label -> previous label
+    label_node, label_pred = [source], [-1]
+    # The first label settled at each node, and the least energy of the labels settled there
+    dist, energy, first, least = {}, {}, {}, {}
+
+    # The queue stores distance, energy, and label
+    queue = [(0, 0, 0)]
+    while queue:
+        d, en, label = pop(queue)
+        node = label_node[label]
+        if en >= least.get(node, math.inf):
+            continue
+        least[node] = en
+        if node not in dist:
+            dist[node], energy[node], first[node] = d, en, label
+            if node == target:
+                break
+        for neighbor, e in adjacency[node]:
+            if (ne := en + costs[e]) <= budget and ne < least.get(neighbor, math.inf):
+                label_node.append(neighbor)
+                label_pred.append(label)
+                push(queue, (d + length[e], ne, len(label_node) - 1))
+
+    return dist, energy, (first, label_node, label_pred)
+
+
+
+def _unpack (labels, node):
+    """ The path from the root of a search to a node (see bounded_search) """
+    first, label_node, label_pred = labels
+    path, label = [], first[node]
+    while label != -1:
+        path.append(label_node[label])
+        label = label_pred[label]
+    path.reverse()
+    return tuple(path)
+
+
+
+
+class StationOverlay:
+
+    """
+    An instance of this class is the overlay graph of the charging stations
+    for a vehicle type.
+
+    The vertices of the overlay are the stations and its edges are the trips from a
+    station to another that are feasible with a full battery, with their length and
+    energy. A trip is then planned as origin -> overlay -> destination, where only the
+    first and the last legs require a (small, energy-bounded) search on the graph.
+
+    NOTE: The node paths of the overlay edges are not kept in memory, they are unpacked
+    with a bounded search when a trip actually uses them. The stations from which each
+    destination can be reached with a full battery are computed once per destination
+    and kept (for the last <maxtargets> destinations), so replanning a trip only 
+    requires the search from the current position.
+    """
+
+    def __init__(self, csr, vtype, maxtargets=4096):
+        """
+        :param csr: The CSR view of the graph.
+        :param vtype: The vehicle type.
+        :param maxtargets: The maximum number of destinations whose stations are kept.
+
+        :attr capacity: The energy of a full battery set of the vehicle type.
+        :attr stations: The integer ids of the stations.
+        :attr edges: For each station, the reachable stations with (length, energy).
+        :attr preprocessing_time: The time in seconds required to build the overlay.
+        """
+        _start = time.perf_counter()
+        self.csr = csr
+        self.vtype = vtype
+        self.capacity = vtype.btype.capacity * vtype.n_batteries
+        self.costs = csr.energy_costs(vtype, aslist=True)
+        self.stations = np.flatnonzero(csr.is_station).tolist()
+        self.maxtargets = maxtargets
+        self.__targets = collections.OrderedDict()
+
+        self.edges = {}
+        for station in self.stations:
+            dist, energy, _ = bounded_search(csr, station, self.costs, self.capacity)
+            self.edges[station] = {
+                i: (dist[i], energy[i]) for i in self.stations if i in dist and i != station
+            }
+
+        self.preprocessing_time = time.perf_counter() - _start
+
+
+    @property
+    def n_edges (self):
+        """ The number of edges of the overlay """
+        return sum(len(i) for i in self.edges.values())
+
+
+    def leg (self, source, target):
+        """ The node path of the (feasible with a full battery) leg from a station to another node """
+        _, _, labels = bounded_search(self.csr, source, self.costs, self.capacity, target=target)
+        return _unpack(labels, target)
+
+
+    def arrivals (self, target):
+        """ The stations that reach a destination with a full battery, with the length of the leg """
+        if (arrivals := self.__targets.get(target)) is not None:
+            self.__targets.move_to_end(target)
+            return arrivals
+
+        dist, _, _ = bounded_search(self.csr, target, self.costs, self.capacity, reverse=True)
+        arrivals = self.__targets[target] = {i: dist[i] for i in self.stations if i in dist}
+        if len(self.__targets) > self.maxtargets:
+            self.__targets.popitem(last=False)
+        return arrivals
+
+
+    def plan (self, source, target, vehicle, level=None, router=None):
+        """
+        Method to plan a whole trip with stops at stations.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param vehicle: The vehicle.
+        :param level: The current level of vehicle batteries. If not passed it
+                    is taken from vehicle instance.
+        :param router: The Router used to tell apart topology problems when no plan
+                    is found (if not passed a SimulationNoPath is always raised).
+        :return: The list of legs, each one a tuple of integer nodes ending at
+                a station or at the target.
+        """
+        csr, costs = self.csr, self.costs
+        level = level or vehicle.level
+
+        # Search from the origin with the energy available
+        fdist, _, flabels = bounded_search(csr, source, costs, level, target=target)
+        if target in fdist:
+            return [_unpack(flabels, target)]
+
+        # The stations from which the destination is reached with a full battery
+        bdist = self.arrivals(target)
+
+        # Dijkstra on the overlay from the stations reached by the origin
+        # NOTE: The vehicle is not charged where it is, hence the source is not a seed
+        dist, prev = {}, {}
+        queue = []
+        for station in self.stations:
+            if station in fdist and station != source:
+                dist[station], prev[station] = fdist[station], None
+                queue.append((fdist[station], station))
+        heapq.heapify(queue)
+
+        best, last = math.inf, None
+        while queue:
+            d, station = heapq.heappop(queue)
+            if d > dist[station]:
+                continue
+            if d >= best:
+                break
+            if station in bdist and d + bdist[station] < best:
+                best, last = d + bdist[station], station
+            for i, (length, _) in self.edges[station].items():
+                if (nd := d + length) < dist.get(i, math.inf):
+                    dist[i], prev[i] = nd, station
+                    heapq.heappush(queue, (nd, i))
+
+        if last is None:
+            # Raises a NetworkXNoPath exception if the problem is the graph topology
+            if router is not None:
+                router.shortest_path(source, target)
+            raise SimulationNoPath
+
+        # Unpack the legs
+        sequence = [last]
+        while (station := prev[sequence[-1]]) is not None:
+            sequence.append(station)
+        sequence.reverse()
+
+        legs = [_unpack(flabels, sequence[0])]
+        legs.extend(self.leg(i, j) for i, j in zip(sequence[:-1], sequence[1:]))
+        legs.append(self.leg(last, target))
+        return [i for i in legs if len(i) > 1]
+
+
+    def report (self):
+        """ A summary of the overlay """
+        return {
+            "stations": len(self.stations),
+            "edges": self.n_edges,
+            "targets": len(self.__targets),
+            "preprocessing_time": round(self.preprocessing_time, 3),
+        }
@@ -0,0 +1,90 @@
+import functools
+
+from networkx.exception import NetworkXNoPath
+
+from simulation.utils.algorithms import csr_astar_path
+from simulation.utils.technical import csr_euclidean_distance
+
+
+
+
+class Router:
+
+    """
+    An instance of this class answers the point-to-point shortest path queries
+    of the simulation on the CSR view of the graph.
+
+    A path is looked for in the in-process cache first, then in the persistent
+    store, and it is finally computed through the selected backend:
+        - "astar": A* algorithm (with the ALT heuristic if landmarks are available);
+        - "ch": Contraction Hierarchy query.
+
+    NOTE: A* remains the fallback (and the correctness oracle) for the weights
+    the hierarchy is not built for, or when the hierarchy is not available.
+    """
+
+    BACKENDS = ("astar", "ch")
+
+
+    def __init__(self, csr, backend="astar", heuristic=None, hierarchy=None, cache=None, store=None):
+        """
+        :param csr: The CSR view of the graph.
+        :param backend: The routing backend (see BACKENDS).
+        :param heuristic: The A* heuristic (euclidean distance by default).
+        :param hierarchy: The ContractionHierarchy on the length of edges (required by "ch").
+        :param cache: The PathCache used (if any).
+        :param store: The RouteStore used (if any).
+        """
+        if backend not in self.BACKENDS:
+            raise Exception(f"Unknown routing backend {backend}.")
+
+        self.csr = csr
+        self.backend = backend if (backend != "ch" or hierarchy is not None) else "astar"
+        self.heuristic = heuristic or functools.partial(csr_euclidean_distance, csr=csr)
+        self.hierarchy = hierarchy
+        self.cache = cache
+        self.store = store
+
+
+    def search (self, source, target, weight="length"):
+        """
+        The shortest path computed by the backend, with no cache or store.
+
+        :return: The path as a tuple of integer nodes (empty if the target cannot be reached).
+        """
+        if self.backend == "ch" and weight == "length":
+            return self.hierarchy.shortest_path(source, target)
+
+        try:
+            return tuple(csr_astar_path(self.csr, source, target, heuristic=self.heuristic, weight=self.csr.column(weight)))
+        except NetworkXNoPath:
+            return ()
+
+
+    def shortest_path (self, source, target, weight="length"):
+        """
+        The shortest path between two integer nodes.
+        Raises a NetworkXNoPath exception if the target cannot be reached.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param weight: The name of the edges column minimised.
+        :return: The path as a tuple of integer nodes.
+        """
+        cache, store = self.cache, self.store
+        path = cache.get(source, target, weight) if cache is not None else None
+
+        if path is None:
+            path = store.get(source, target, weight) if store is not None else None
+
+            if path is None:
+                path = self.search(source, target, weight)
+                if store is not None:
+                    store.put(source, target, path, weight)
+
+            if cache is not None:
+                path = cache.put(source, target, path, weight)
+
+        if not path:
+            raise NetworkXNoPath(f"Node {target} not reachable from {source}")
+        return path
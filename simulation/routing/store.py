@@ -0,0 +1,238 @@
+import sqlite3
+import os
+import heapq
+import multiprocessing
+
+import numpy as np
+from networkx.exception import NetworkXNoPath
+
+from simulation.utils.algorithms import csr_shortest_path
+from simulation.exceptions import SimulationNoPath
+
+
+
+
+class RouteStore:
+
+    """
+    An instance of this class is a persistent store of shortest paths kept
+    in a local SQLite file, which can be shared across runs and processes.
+
+    Routes are keyed by the fingerprint of the graph (see CSRGraph.fingerprint),
+    the weight minimised, and the couple (source, target) of integer nodes.
+
+    NOTE: The database uses the Write-Ahead Logging journal, so many processes can
+    read it concurrently. To limit the contention between writers, the routes computed
+    during a simulation are buffered and written with a single transaction by flush
+    (which is called every <flush_every> routes, so the buffer is bounded).
+    """
+
+    def __init__(self, filename, fingerprint, timeout=30, flush_every=1000):
+        """
+        :param filename: The SQLite file (created if it does not exist).
+        :param fingerprint: The fingerprint of the graph the routes belong to.
+        :param timeout: The maximum time in seconds waited when the database is locked.
+        :param flush_every: The maximum number of routes kept in memory before a flush.
+
+        :attr hits: The number of lookups that found the route.
+        :attr misses: The number of lookups that did not find the route.
+        """
+        self.filename = filename
+        self.fingerprint = fingerprint
+        self.timeout = timeout
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+
+        self.__pending = []
+        self.__connection, self.__pid = None, None
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                "graph TEXT NOT NULL, weight TEXT NOT NULL, source INTEGER NOT NULL, target INTEGER NOT NULL, path BLOB NOT NULL, "
+                "PRIMARY KEY (graph, weight, source, target)) WITHOUT ROWID"
+            )
+
+
+    def __getstate__ (self):
+        # Connections cannot be shared between processes
+        state = dict(self.__dict__)
+        state["_RouteStore__connection"], state["_RouteStore__pid"] = None, None
+        state["_RouteStore__pending"] = []
+        return state
+
+
+    def __len__ (self):
+        """ The number of routes stored for the graph """
+        query = "SELECT COUNT(*) FROM routes WHERE graph = ?"
+        return self.connection.execute(query, (self.fingerprint,)).fetchone()[0]
+
+
+    @property
+    def connection (self):
+        """ The connection to the database (a different one is opened by each process) """
+        if self.__connection is None or self.__pid != os.getpid():
+            self.__connection = sqlite3.connect(self.filename, timeout=self.timeout)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__pid = os.getpid()
+        return self.__connection
+
+
+    @property
+    def stats (self):
+        """ A summary of the store usage """
+        return {"hits": self.hits, "misses": self.misses, "pending": len(self.__pending)}
+
+
+    def get (self, source, target, weight="length"):
+        """
+        Method to look for a route.
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param weight: The name of the weight the path minimises.
+        :return: The path as a tuple (empty if the target cannot be reached),
+                or None if the route is not in the store.
+        """
+        query = "SELECT path FROM routes WHERE graph = ? AND weight = ? AND source = ? AND target = ?"
+        row = self.connection.execute(query, (self.fingerprint, weight, source, target)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tuple(np.frombuffer(row[0], dtype=np.int32).tolist())
+
+
+    def put (self, source, target, path, weight="length"):
+        """
+        Method to store a route.
+        The route is kept in memory until the next flush (done here when 
+        <flush_every> routes are pending).
+
+        :param source: The starting node.
+        :param target: The destination.
+        :param path: The path (None or empty if the target cannot be reached).
+        :param weight: The name of the weight the path minimises.
+        """
+        self.__pending.append((source, target, path, weight))
+        if len(self.__pending) >= self.flush_every:
+            self.flush()
+
+
+    def put_many (self, routes, weight="length"):
+        """
+        Method to write many routes in a single transaction.
+
+        :param routes: An iterable of (source, target, path).
+        :param weight: The name of the weight the paths minimise.
+        :return: The number of routes written.
+        """
+        fingerprint = self.fingerprint
+        rows = [
+            (fingerprint, weight, source, target, np.asarray(path or (), dtype=np.int32).tobytes())
+            for source, target, path in routes
+        ]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+
+    def flush (self):
+        """ Method to write the routes computed since the last flush """
+        pending, self.__pending = self.__pending, []
+        weights = {weight for *_, weight in pending}
+        return sum(
+            self.put_many(((s, t, p) for s, t, p, w in pending if w == weight), weight=weight)
+            for weight in weights
+        )
+
+
+    def close (self):
+        """ Method to flush the pending routes and close the connection """
+        self.flush()
+        if self.__connection is not None and self.__pid == os.getpid():
+            self.__connection.close()
+        self.__connection, self.__pid = None, None
+
+
+
+
+def most_probable_pairs (csr, n_pairs):
+    """
+    Method to find the most probable couples (origin, destination), according
+    to the <startp> and <endp> weights of nodes.
+
+    NOTE: Origins and destinations are drawn independently, hence the probability
+    of a couple is proportional to startp[origin] * endp[destination].
+    The k largest products are found by merging the two sorted arrays with a heap.
+
+    :param csr: The CSR view of the graph.
+    :param n_pairs: The number of couples required.
+    :return: A list of (origin, destination) integer nodes.
+    """
+    origins = np.argsort(-csr.startp).tolist()
+    dests = np.argsort(-csr.endp).tolist()
+    startp, endp = csr.column("startp"), csr.column("endp")
+
+    heap = [(-startp[o] * endp[dests[0]], i, 0) for i, o in enumerate(origins[:n_pairs])]
+    heapq.heapify(heap)
+
+    pairs = []
+    while heap and len(pairs) < n_pairs:
+        prob, i, j = heapq.heappop(heap)
+        if prob == 0:
+            break
+        if origins[i] != dests[j]:
+            pairs.append((origins[i], dests[j]))
+        if j + 1 < len(dests):
+            heapq.heappush(heap, (-startp[origins[i]] * endp[dests[j + 1]], i, j + 1))
+
+    return pairs
+
+
+
+# The view of the graph used by the processes warming the store
+_worker_csr = None
+
+
+def _init_worker (csr):
+    global _worker_csr
+    _worker_csr = csr
+
+
+def _compute_route (pair):
+    source, target = pair
+    try:
+        return source, target, csr_shortest_path(_worker_csr, source, target)
+    except (NetworkXNoPath, SimulationNoPath):
+        return source, target, ()
+
+
+
+def warm (store, csr, n_pairs=10_000, processes=None, chunksize=64):
+    """
+    Method to precompute in parallel the routes of the most probable couples
+    (origin, destination) and write them in the store.
+
+    :param store: The RouteStore to warm.
+    :param csr: The CSR view of the graph (its fingerprint must be the one of the store).
+    :param n_pairs: The number of couples to precompute.
+    :param processes: The number of worker processes (all the cores by default).
+    :param chunksize: The number of routes sent to a worker at once.
+    :return: The number of routes written.
+    """
+    if store.fingerprint != csr.fingerprint:
+        raise Exception("The store does not belong to the graph.")
+
+    pairs = [(s, t) for s, t in most_probable_pairs(csr, n_pairs) if store.get(s, t) is None]
+
+    written, batch = 0, []
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(csr,)) as pool:
+        for route in pool.imap_unordered(_compute_route, pairs, chunksize=chunksize):
+            batch.append(route)
+            if len(batch) >= 1000:
+                written += store.put_many(batch)
+                batch = []
+    written += store.put_many(batch)
+    return written
@@ -1,18 +1,24 @@
 import simpy
 import random 
-import gc 
-import statistics 
+import time 
 import functools
+import collections
 import networkx as nx
 from networkx.algorithms.shortest_paths import astar
 from networkx.exception import NetworkXNoPath
 
-from simulation.utils.technical import path_travel_time, path_consumption, path_length, euclidean_distance
+from simulation.utils.technical import csr_path_travel_time, csr_path_consumption, csr_path_length
 from simulation.utils.technical import seconds_to_hours, hours_to_seconds, m_to_km
 from simulation.utils.check import check_configuration
-from simulation.utils.algorithms import define_path
+from simulation.utils.algorithms import csr_define_path
 from simulation.graph import Graph
-from simulation.vehicles import Vehicle, Distributor
+from simulation.demand import DemandSampler
+from simulation.streams import RandomStreams
+from simulation.redistribution import RedistributionPlanner
+from simulation.stations.registry import StationRegistry
+from simulation.stats import StationStats
+from simulation.vehicles import Fleet, Distributor
+from simulation.routing import PathCache, RouteStore, Router, ConstrainedPlanner
 from simulation.exceptions import SimulationNoPath, SimulationNoBattery
 
 
@@ -21,22 +27,75 @@ class SimulationRunner:
     
     """ An instance of this class represents a simulation to be executed """
     
-    def __init__(self, env, config, G ):
+    # The number of trips generated at once by the demand sampler of each slot
+    SLOT_BLOCK_SIZE = 32
+    # The percentiles of the waiting time at stations in reports
+    WAITING_QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, env, config, G, streams=None):
         """
         When a runner is instantiated, a simulation environment is created, the graph is imported 
         according to the spacification in the Config instance, and some checks on the feasibility 
         of the configuration are made. 
+
+        NOTE: The graph is never modified by the run (see Graph.prepare), hence many runs can 
+        use it at the same time: the stations of the run are kept by its own registry.
+
+        :param streams: The RandomStreams of the simulation. If not passed they are seeded
+                        from the random module, so that a random.seed also fixes them.
         """
         self.env = env
+        self.streams = streams or RandomStreams(random.getrandbits(64))
         
         self.config = config
         assert check_configuration(config), "Inconsistencies detected in the configuration."
         
-        self.G = G
+        self.G = G.prepare(config)
+        # The stations of this run (empty, and bound to its environment)
+        self.registry = StationRegistry(G, env, config)
+
+        # Precompute the energy consumed on each edge by each vehicle type
+        for vtype in config.VEHICLE_TYPES:
+            G.csr.energy_costs(vtype)
+
+        # The cache of the shortest paths between couples of nodes
+        self.path_cache = PathCache(maxsize=config.PATH_CACHE_SIZE)
+        # The persistent store of routes shared with other runs (if any)
+        self.route_store = RouteStore(config.ROUTE_STORE, G.csr.fingerprint) if config.ROUTE_STORE else None
+        # The router answering shortest path queries through the backend selected
+        # NOTE: The A* heuristic is the euclidean distance when landmarks are not available.
+        self.router = Router(G.csr, 
+            backend=config.ROUTER, 
+            heuristic=G.landmarks.heuristic if getattr(G, "landmarks", None) else None,
+            hierarchy=getattr(G, "hierarchy", None),
+            cache=self.path_cache,
+            store=self.route_store,
+        )
+        # The engine planning the legs of trips (see Config.PLANNER)
+        self.planner = ConstrainedPlanner(G.csr, router=self.router, heuristic=self.router.heuristic) if config.PLANNER == "constrained" else None
+        # The overlay graphs of stations used to plan whole trips (one for each vehicle type)
+        # NOTE: Overlays are preprocessings kept by the graph, hence shared by many runs.
+        self.overlays = {vtype: G.overlay(vtype) for vtype in config.VEHICLE_TYPES} if config.PLANNER == "overlay" else {}
+        # The generator of trips, whose alias tables are shared by the samplers of slots
+        # NOTE: With Config.OD_FILTER = "largest_scc" the trips with origin or destination outside
+        # the largest strongly connected component are rejected without any search (and counted).
+        self.demand = DemandSampler(G.csr, config.VEHICLE_TYPES, config.VEHICLE_SELECTOR,
+            mask=G.csr.components == G.csr.largest_component if config.OD_FILTER == "largest_scc" else None,
+            rng=self.streams.generator("demand"),
+        )
+        # The pool of vehicles recycled from a trip to the next one
+        self.fleet = Fleet(env, speed=config.VEHICLES_SPEED)
+        # The planner of redistribution rounds, the distributors, and the log of rounds
+        self.redistribution_planner = RedistributionPlanner(G, self.registry)
+        self.distributors = ()
+        self.redistribution_log = []
+        # The time (in seconds) spent planning the legs of trips
+        self.planning_time = 0
 
         # The number of trips successfully concluded
         self.failed_trips = 0
         self.nx_failed_trips = 0 
+        self.filtered_trips = 0     # The nx_failed_trips rejected by Config.OD_FILTER without any search (or sampling)
         self.battery_failed_trips = 0
         self.total_trips = 0
         self.total_distance = 0
@@ -45,39 +104,44 @@ class SimulationRunner:
     @property 
     def stations (self):
         """ The charging stations """
-        return tuple(i for i, node in self.G.nodes.items() if node['is_station'])
+        return self.registry.nodes
+
+    @property 
+    def moves_per_km (self):
+        """ The batteries redistributed per km covered by each distributor """
+        return tuple(
+            round(i.moved / m_to_km(i.distance), 3) if i.distance > 0 else 0 
+            for i in self.distributors
+        )
 
     @property 
     def relative_travel_time (self):
         """ The relative travel time in [hours / km] """
         return round(seconds_to_hours(self.total_travel_time) / m_to_km(self.total_distance), 3)
 
+    @property 
+    def station_stats (self):
+        """ The statistics of all the stations merged (queues observed until now) """
+        now, stats = self.env.now, StationStats()
+        for station in self.registry.stations:
+            stats.merge(station.stats.closed(now))
+        return stats
+
     @property 
     def avg_waiting_time (self):
         """ The average waiting time at stations """
-        total_log_times = []
-        for i in self.G.nodes.values():
-            if i['is_station']:
-                total_log_times.extend(i['station'].log_times)
-        
-        if len(total_log_times) == 0:
-            return 0
-
-        return statistics.mean( total_log_times )
-
+        return self.station_stats.waiting.mean
 
     @property 
     def avg_queue (self):
-        """ The average queue at stations """
-        total = []
-        for i in self.G.nodes.values():
-            if i['is_station']:
-                total.extend( list(i['station'].log_queue.values()) )
-        
-        if len(total) == 0:
-            return 0
+        """ The average (time-weighted) queue at stations """
+        return self.station_stats.queue.mean()
 
-        return statistics.mean( total )
+    @property 
+    def waiting_quantiles (self):
+        """ The 50th, 95th and 99th percentiles of the waiting time at stations """
+        sketch = self.station_stats.waiting_sketch
+        return tuple(sketch.quantile(q) or 0 for q in self.WAITING_QUANTILES)
 
     
     def __call__(self):
@@ -88,9 +152,52 @@ class SimulationRunner:
         self.env.process(self._run())
         print("Simulation...", end="")
         self.env.run(self.config.SIM_TIME)    
+        if self.route_store is not None:
+            self.route_store.flush()
         print("done")
 
 
+    def report (self, computational_time):
+        """
+        The results of the simulation (serializable in JSON).
+
+        :param computational_time: The wall time of the simulation in seconds.
+        :return: A dict of results (events are None if the environment does not count them).
+        """
+        # NOTE: The statistics of stations are merged once for all the results.
+        stats = self.station_stats
+        return {
+            "area" : self.config.GRAPH_FILE,
+            "stations" : len(self.registry),
+            "vehicles" : self.config.N_VEHICLES,
+            "sharing" : self.config.SHARING,
+            "wait_charge" : self.config.WAIT_CHARGE,
+            "computational_time" :  round(computational_time, 3),  # seconds
+            "lazy_charging" : self.config.LAZY_CHARGING,
+            "events" : getattr(self.env, "n_events", None),
+            "relative_travel_time" : round(self.relative_travel_time * 60, 3),  # mins / km
+            "avg_waiting" : round(stats.waiting.mean, 3),
+            "avg_queue" : round(stats.queue.mean(), 3),
+            "waiting_quantiles" : tuple(round(stats.waiting_sketch.quantile(q) or 0, 3) for q in self.WAITING_QUANTILES),  # p50, p95, p99
+            "station_stats" : stats.to_dict(),
+            "nx_failed_trips" : self.nx_failed_trips,
+            "filtered_trips" : self.filtered_trips,
+            "planner" : self.config.PLANNER,
+            "planning_time" : round(self.planning_time, 3),  # seconds
+            "path_cache" : self.path_cache.stats,
+            "fleet" : self.fleet.stats,
+            "route_store" : self.route_store.stats if self.route_store else None,
+            "landmarks" : self.G.landmarks.report() if self.G.landmarks else None,
+            "hierarchy" : self.G.hierarchy.report() if self.G.hierarchy else None,
+            "overlays" : [overlay.report() for overlay in self.overlays.values()],
+            "redistribution" : {
+                "rounds" : self.redistribution_planner.rounds,
+                "planning_time" : round(self.redistribution_planner.planning_time, 3),  # seconds
+                "moves_per_km" : self.moves_per_km,
+            },
+        }
+
+
     def _checker (self):
         while True:
             yield self.env.timeout(1000)
@@ -103,26 +210,34 @@ class SimulationRunner:
         yield env.timeout(config.DISTRIBUTION_FREQUENCY)
 
         # Init the vehicles in charge of redistributing batteries
-        vehicles = tuple(
+        rnd, nodes = self.streams.random("distributors"), tuple(G.nodes)
+        self.distributors = tuple(
             Distributor(env, 
                 speed=config.VEHICLES_SPEED, 
-                origin=random.choice(tuple(G.nodes))
+                origin=rnd.choice(nodes)
             )
             for _ in range(config.N_REDISTRIBUTORS)
         )
 
-        # Init the redistribution process 
-        redis_proc = tuple(env.process(__redistribution_trip(i)) for i in vehicles)
-        
         # Simulation loop
         while True:
+            # Plan the round for all the distributors at once
+            _planning_time = self.redistribution_planner.planning_time
+            plans = self.redistribution_planner.plan(self.distributors)
+            self.redistribution_log.append({
+                "time" : env.now, 
+                "planning_time" : self.redistribution_planner.planning_time - _planning_time,
+                "distributors" : len(plans),
+            })
+
+            redis_proc = tuple(env.process(__redistribution_trip(*plan)) for plan in plans)
+
             # Wait for redistributions to be concluded before starting a new round
-            yield env.all_of(redis_proc) and env.timeout(config.DISTRIBUTION_FREQUENCY)
-            redis_proc = tuple(env.process(__redistribution_trip(i)) for i in vehicles)     
+            yield env.all_of(redis_proc) & env.timeout(config.DISTRIBUTION_FREQUENCY)
         
 
 
-    def __redistribution_trip (self, vehicle):
+    def __redistribution_trip (self, vehicle, source, target):
         """
         Process used to simulate a single redistribution from. 
         The vehicle goes form its position to the station where 
@@ -130,33 +245,20 @@ class SimulationRunner:
         batteries.
 
         :param vehicle: The distributor.        
+        :param source: The (node id, station) the batteries are retrieved from.
+        :param target: The (node id, station) the batteries are brought to.
         """
-        env, config, G = self.env, self.config, self.G
-        
-        # Extract the list of charging stations --i.e., (node_id, station object)
-        stations_list = tuple((i, node['station']) for i, node in G.nodes.items() if node['is_station'])
-        
-        # Pick the station the batteries will be retrieved from
-        # NOTE: We choose the one with the highest number of batteries on the side 
-        # (undependently on the battery type).
-        source_id, source = max(stations_list, key=lambda i: i[1].chargers_ontheside )
-
-        # Reconsider eventual suspension of the operation
-        if source.chargers_ontheside == 0:
-            return vehicle 
-
-        # Pick the station the batteries will be brought to
-        # NOTE: We choose the one with the highest difference between capacity and level 
-        # (undependently on the battery type).
-        target_id, target = max(stations_list, key=lambda i: i[1].chargers_capacity - i[1].chargers_level )     
-        
+        env, config, planner = self.env, self.config, self.redistribution_planner
+        (source_id, source), (target_id, target) = source, target
         
         # Move to the source station to retrieve batteries
-        path = astar.astar_path(G, vehicle.position, target_id, heuristic=functools.partial(euclidean_distance, G=G), weight="length")
-        yield env.timeout(path_travel_time(G, path, vehicle))
+        distance = planner.distance(vehicle.position, source_id)
+        yield env.timeout(distance / vehicle.speed)
         vehicle.position = source_id
+        vehicle.distance += distance
 
         # Reconsider eventual suspension of the operation
+        # NOTE: Batteries on the side might be gone in the meanwhile.
         if source.chargers_ontheside == 0:
             return vehicle 
 
@@ -164,16 +266,16 @@ class SimulationRunner:
         batteries = {btype: [] for btype in config.BATTERY_TYPES}
 
         for btype, charger in source.chargers.items():
-            batteries[btype].extend([ event.item for event in charger.put_queue ])
-            charger.reset_put_queue()
+            batteries[btype].extend(charger.take_ontheside())
 
         # Load batteries 
         yield env.timeout(config.DISTRIBUTOR_LOADING_TIME)
 
         # Move to the target station to bring batteries 
-        path = astar.astar_path(G, source_id, target_id, heuristic=functools.partial(euclidean_distance, G=G), weight="length")
-        yield env.timeout(path_travel_time(G, path, vehicle))
+        distance = planner.distance(source_id, target_id)
+        yield env.timeout(distance / vehicle.speed)
         vehicle.position = target_id 
+        vehicle.distance += distance
 
         # Unload batteries 
         yield env.timeout(config.DISTRIBUTOR_LOADING_TIME)
@@ -182,6 +284,7 @@ class SimulationRunner:
             charger = target.chargers[btype]
             for i in batteries_list:
                 charger.put(i)
+            vehicle.moved += len(batteries_list)
         
         return vehicle
             
@@ -190,59 +293,68 @@ class SimulationRunner:
 
     def _run (self):
         """ Starting point of the simulation """
-        env, config, G, __trip = self.env, self.config, self.G, self.__trip
-
-        # Initialise vehicles processes
-        origin_probs = tuple(i["startp"] for i in G.nodes.values())
-        dest_probs = tuple(i["endp"] for i in G.nodes.values())
-
-        _origins = tuple(random.choices(tuple(G.nodes), weights=origin_probs, k=config.N_VEHICLES))
-        _dests = tuple(random.choices(tuple(G.nodes), weights=dest_probs, k=config.N_VEHICLES))
-
-        vehicles_proc = [ 
-            env.process(    
-                __trip(
-                    Vehicle(env, 
-                        vtype=config.VEHICLE_SELECTOR(config.VEHICLE_TYPES), 
-                        speed=config.VEHICLES_SPEED,
-                        origin=_origins[i],
-                        destination=_dests[i],
-                    )
-                )
-            )
-            for i in range(config.N_VEHICLES)
-        ] 
-        self.total_trips += config.N_VEHICLES
+        env, config, __slot = self.env, self.config, self.__slot
+
+        # Initialise a slot process for each vehicle of the fleet
+        # NOTE: Slots never end, hence the fleet keeps a constant size.
+        slots = tuple(env.process(__slot(i)) for i in range(config.N_VEHICLES))
+        yield env.all_of(slots)
+
+
+
+    def __slot (self, i):
+        """ 
+        Process keeping a vehicle of the fleet travelling: as soon as a trip 
+        is concluded a new one starts.
+
+        NOTE: The trip runs inside the slot process (no process or condition is
+        created for it), so the cost of a trip completion does not depend on the
+        number of vehicles.
 
-        # Free memory 
-        del _origins
-        del _dests 
-        gc.collect() 
+        NOTE: Each slot draws its trips and the levels of its batteries from its own 
+        streams, so the k-th trip of a slot is the same in any simulation with the 
+        same seed, whatever happens to the other slots (common random numbers).
 
-        # Simulation loop that add a new trip as soon as a trip is concluded
+        :param i: The index of the slot.
+        """
+        __trip, release, acquire = self.__trip, self.fleet.release, self.fleet.acquire
+        demand = self.demand.fork(self.streams.generator("demand", i), block_size=self.SLOT_BLOCK_SIZE)
+        rng = self.streams.random("batteries", i)
         while True:
-            
-            ended_proc = yield env.any_of(vehicles_proc)
+            self.total_trips += 1
+            origin, destination, vtype = demand.draw()
+            if demand.rejected:
+                # The trips rejected by the sampler (see Config.OD_FILTER) count as filtered
+                self.total_trips += demand.rejected
+                self.nx_failed_trips += demand.rejected
+                self.filtered_trips += demand.rejected
+                demand.rejected = 0
+            release((yield from __trip(acquire(vtype, origin, destination, rng=rng))))
+
 
-            for proc in ended_proc.keys():
-                vehicles_proc.remove(proc)
-            
-            diff = config.N_VEHICLES - len(vehicles_proc)
-            self.total_trips += diff 
 
-            vehicles_proc.extend([
-                env.process( 
-                    __trip( 
-                        Vehicle(
-                            env,
-                            vtype=config.VEHICLE_SELECTOR(config.VEHICLE_TYPES),
-                            speed=config.VEHICLES_SPEED,
-                            origin=random.choices(tuple(G.nodes), weights=origin_probs, k=1)[0],
-                            destination=random.choices(tuple(G.nodes), weights=dest_probs, k=1)[0],
-                        )
-                    )
-                ) for _ in range(diff)
-            ])
+    def __plan (self, source, target, vehicle, legs):
+        """ 
+        The path of the next leg of a trip: to the target (if possible), or 
+        alternatively to an intermediate charging station.
+        The engine used depends on Config.PLANNER.
+
+        :param legs: The legs planned for the rest of the trip by the "overlay" 
+                    planner (updated in place).
+        """
+        csr = self.G.csr
+
+        if self.overlays:
+            # The next leg is used if the vehicle has the energy to cover it, 
+            # otherwise the rest of the trip is planned again.
+            if not legs or legs[0][0] != source or vehicle.level < csr_path_consumption(csr, legs[0], vehicle, check=False):
+                legs.clear()
+                legs.extend(self.overlays[vehicle.vtype].plan(source, target, vehicle, router=self.router))
+            return legs.popleft()
+
+        if self.planner is not None:
+            return self.planner.plan(source, target, vehicle)
+        return csr_define_path(csr, source, target, vehicle, router=self.router)
 
 
 
@@ -252,17 +364,25 @@ class SimulationRunner:
         its origin to its destination.
         :param vehicle: The vehicle that is doing the trip.
         """
-        env, config, G = self.env, self.config, self.G
-        source, target = vehicle.origin, vehicle.destination
+        env, config, G, csr = self.env, self.config, self.G, self.G.csr
+        # NOTE: The path finding works on the integer ids of the CSR view of the graph.
+        source, target = csr.index[vehicle.origin], csr.index[vehicle.destination]
+        legs = collections.deque()
 
+        # Reject the trip before any search if the destination cannot be reached
+        if config.OD_FILTER == "reachable" and not csr.reachable(source, target):
+            self.nx_failed_trips += 1
+            self.filtered_trips += 1
+            return vehicle
 
         # Simulate the travelling station by station (when stations are needed)
         while source != target and vehicle.level > 0:
             
             # The path to the target (if possible), or alternatively 
             # the path to an intermediate charging station. 
+            _start_planning = time.perf_counter()
             try:
-                path = define_path(G, source, target, vehicle)
+                path = self.__plan(source, target, vehicle, legs)
             
             except NetworkXNoPath:
                 # No station or destination can be reached because of the 
@@ -276,23 +396,26 @@ class SimulationRunner:
                 self.failed_trips += 1 
                 return vehicle
 
+            finally:
+                self.planning_time += time.perf_counter() - _start_planning
+
             # Register when the vehicle starts travelling
             _start_travelling = env.now 
             
             # Wait for the vehicle to move
-            yield env.timeout( path_travel_time(G, path, vehicle) )
-            energy_used = path_consumption(G, path, vehicle)
-            vehicle.position, source = path[-1], path[-1]
+            yield env.timeout( csr_path_travel_time(csr, path, vehicle) )
+            energy_used = csr_path_consumption(csr, path, vehicle)
+            vehicle.position, source = csr.node_id(path[-1]), path[-1]
 
             # Update vehicle's batteries state
             vehicle.consume(energy_used)
 
             # Update the distance covered by the vehicle
-            self.total_distance += path_length(G, path)
+            self.total_distance += csr_path_length(csr, path)
 
             # If reached node is a station charge the vehicle.
-            if G.nodes[vehicle.position]["is_station"] and vehicle.position != target: 
-                station = G.nodes[vehicle.position]["station"]
+            if G.nodes[vehicle.position]["is_station"] and source != target: 
+                station = self.registry[vehicle.position]
                 with station.request() as req:
                     yield env.process(station.charge(req, vehicle, config.SHARING, config.WAIT_CHARGE))
             
@@ -1,145 +1,70 @@
-import simpy 
-#from simpy.core import BoundClass 
-#from simpy.resources.store import Store, StoreGet, StorePut
-from simpy.resources.store import FilterStore
-from simpy.resources.container import Container
-
-from simulation.utils.technical import charge_time, level_at_time, missing_time_to_charge
-
-import functools 
-import operator
+from simulation.stations.store import BatteryStore
 
 
 
 
 class Charger:
 
-    def __init__(self, env, capacity, power):
+    def __init__(self, env, capacity, power, lazy=False, on_change=None):
         """
         :param env: The simulation environment.
         :param capacity: The maximum number of batteries allowed.
         :param power: The power erogated by the charged (e.g., ~7Kw).
+        :param lazy: If True the levels of batteries are computed on demand
+                    instead of scheduling the end of each charge.
+        :param on_change: A function called when the batteries stored or on the side change.
 
-        :attr __spacekeeper: A space keeper (a sort of mutex lock) to prevent
-                            weird behaviours due to simpy.
-        :attr __filterstore: The actual store where batteries are kept.
-        :attr charging_processes: A hashmap keeping track of all active 
-                                charging processes.
+        :attr __store: The actual store where batteries are kept, ordered
+                    by expected full-charge time.
         """
         self.env = env
-        self.capacity = capacity  
-        self.power = power 
+        self.capacity = capacity
+        self.power = power
 
-        self.__spacekeeper = Container(env, capacity=capacity, init=0)
-        self.__filterstore = FilterStore(env, capacity=capacity)
-        self.charging_processes = {}
+        self.__store = BatteryStore(env, capacity=capacity, power=power, lazy=lazy, on_change=on_change)
 
-    @property 
+    @property
     def items(self):
         """ Batteries stored """
-        return self.__filterstore.items
+        return self.__store.items
 
-    @property 
+    @property
     def level (self):
         """ The number of batteries currently in charge """
-        return len(self.items)
+        return self.__store.level
 
-    @property 
+    @property
     def incharge (self):
         """ The number of batteries on charge """
-        return sum(1 for i in self.items if i.level < i.capacity)
-    
-    @property 
+        return self.__store.incharge
+
+    @property
     def charged (self):
         """ The number of fully charged batteries """
-        return sum(1 for i in self.items if i.level == i.capacity)
+        return self.__store.charged
 
-    @property 
+    @property
     def ontheside (self):
-        """ The number of batteries left to the station but with no 
+        """ The number of batteries left to the station but with no
         space to be charged """
-        return len(self.__filterstore.put_queue)
+        return len(self.__store.ontheside)
+
+
+    def take_ontheside (self):
+        """ Method to remove (and return) the batteries left to the station
+        with no space to be charged (e.g., for a redistribution) """
+        return self.__store.take_ontheside()
 
-    @property
-    def put_queue (self):
-        return self.__filterstore.put_queue
-
-
-    def reset_put_queue (self):
-        self.__filterstore.put_queue = []
-
-
-    def __charge_process(self, battery):
-        """ Charging process used to charge a battery.
-        This process can be interrupted. """
-        try:
-            yield self.env.timeout( charge_time(battery, self.power) )
-            battery.level = battery.capacity
-            del self.charging_processes[battery]
-
-        except simpy.Interrupt:
-            battery.level = level_at_time(self.env.now, battery, self.power)
-            del self.charging_processes[battery]
-
-
-    def _get_process(self, waitcharge):
-        """ Process used to retrieve an element from the charger """
-        _now = self.env.now
-        # In case a fully charged battery is required...
-        if waitcharge:
-            # If there is an already charged battery, it is retrieved.
-            # Otherwise, we pick the battery with the minimum missing time to charge,
-            # we wait for the charging process to be concluded, and then we retrieve it.
-            toget = min( self.__filterstore.items, 
-                key=lambda i: missing_time_to_charge(_now, i, self.power), 
-                default=None 
-            )
-            
-            if toget:
-                battery = yield self.__filterstore.get(functools.partial(operator.eq, toget))
-            
-            else:
-                battery = yield self.__filterstore.get()
-            
-            if (proc := self.charging_processes.get(battery)):
-                yield proc            
-        
-        # Even partially charged batteries are accepted...
-        else:
-            # We simply pick the battery with the minimum missing time to charge,
-            # we interrupt the charging process and we retrieve the battery.
-            toget = min( self.__filterstore.items, 
-                key=lambda i: missing_time_to_charge(_now, i, self.power), 
-                default=None 
-            )
-            if toget:
-                battery = yield self.__filterstore.get(functools.partial(operator.eq, toget))
-            else:
-                battery = yield self.__filterstore.get()
-            
-            if (proc := self.charging_processes.get(battery)):
-                proc.interrupt()
-        
-        # Remove a space keeper to allow a a new put 
-        yield self.__spacekeeper.get(1)
-
-        # Return the retrieved battery
-        return battery
-
-
-    def _put_process(self, item):
-        """ Process used to store an element into the charger """
-        yield self.__spacekeeper.put(1)
-        yield self.__filterstore.put(item)
-        proc = self.env.process(self.__charge_process(item))
-        self.charging_processes[item] = proc
-        
 
     def get (self, waitcharge=True):
-        """ Syntactic sugar on top of _get_process """
-        return self.env.process(self._get_process(waitcharge))
+        """
+        Method to retrieve the battery with the minimum missing time to charge.
+        If waitcharge is True, the battery is returned when fully charged,
+        otherwise its charging is interrupted.
+        """
+        return self.__store.get(waitcharge)
 
 
     def put (self, item):
-        """ Syntactic sugar on top of _put_process """
-        return self.env.process(self._put_process(item))
+        """ Method to leave a battery to be charged """
+        return self.__store.put(item)
@@ -0,0 +1,186 @@
+import heapq
+
+from .stations import Station
+
+
+
+
+class IndexedHeap:
+
+    """
+    An instance of this class is a binary min-heap of a fixed set of items
+    (i.e., 0, 1, ..., n-1) that keeps the position of each item, so that the
+    key of an item can be updated in O(log n).
+    """
+
+    def __init__(self, keys):
+        """
+        :param keys: The initial key of each item.
+        """
+        self.keys = list(keys)
+        self.heap = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.position = [0] * len(self.keys)
+        for i, item in enumerate(self.heap):
+            self.position[item] = i
+
+
+    def __len__(self):
+        return len(self.heap)
+
+
+    def top (self):
+        """ The item with the lowest key """
+        return self.heap[0]
+
+
+    def top_k (self, k):
+        """
+        The k items with the lowest keys (sorted), found in O(k log k)
+        by visiting the heap from its root.
+        """
+        heap, keys = self.heap, self.keys
+        result, candidates = [], [(keys[heap[0]], 0)] if heap else []
+        while candidates and len(result) < k:
+            _, i = heapq.heappop(candidates)
+            result.append(heap[i])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(candidates, (keys[heap[child]], child))
+        return result
+
+
+    def update (self, item, key):
+        """ Method to change the key of an item """
+        old, self.keys[item] = self.keys[item], key
+        if key < old:
+            self.__sift_up(self.position[item])
+        elif key > old:
+            self.__sift_down(self.position[item])
+
+
+    def __swap (self, i, j):
+        heap, position = self.heap, self.position
+        heap[i], heap[j] = heap[j], heap[i]
+        position[heap[i]], position[heap[j]] = i, j
+
+
+    def __sift_up (self, i):
+        heap, keys = self.heap, self.keys
+        while i > 0 and keys[heap[i]] < keys[heap[(parent := (i - 1) // 2)]]:
+            self.__swap(i, parent)
+            i = parent
+
+
+    def __sift_down (self, i):
+        heap, keys, n = self.heap, self.keys, len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and keys[heap[child]] < keys[heap[smallest]]:
+                    smallest = child
+            if smallest == i:
+                return
+            self.__swap(i, smallest)
+            i = smallest
+
+
+
+
+class StationRegistry:
+
+    """
+    An instance of this class is the registry of the charging stations of a graph
+    in a simulation: the stations are made empty and bound to the environment of
+    the simulation, so each run has its own (the graph is never modified).
+
+    For each station the surplus (i.e., batteries on the side) and the deficit (i.e.,
+    capacity of chargers minus batteries stored) are kept in indexed heaps. Stations
+    notify the registry whenever their chargers put or get batteries, so the best
+    source and target of a redistribution are found in O(log S).
+
+    NOTE: Ties are broken by the order of nodes in the graph, coherently with a
+    max() on the stations.
+    """
+
+    def __init__(self, G, env, config):
+        """
+        :param G: The graph.
+        :param env: The simulation environment.
+        :param config: The simulation's configuration.
+
+        :attr nodes: The node id of each station.
+        :attr stations: The Station instances.
+        """
+        self.nodes = tuple(i for i, node in G.nodes.items() if node["is_station"])
+        self.stations = tuple(
+            Station(
+                env, 
+                stype=config.STATION_TYPES[G.nodes[i]["id_station"]],
+                btypes=config.BATTERY_TYPES,
+                swaptime=config.SWAP_TIME,
+                lazy=config.LAZY_CHARGING,
+            )
+            for i in self.nodes
+        )
+        self.__index = {station: i for i, station in enumerate(self.stations)}
+        self.__stations = dict(zip(self.nodes, self.stations))
+
+        self.__surplus = IndexedHeap(self.__surplus_key(i) for i in range(len(self.stations)))
+        self.__deficit = IndexedHeap(self.__deficit_key(i) for i in range(len(self.stations)))
+
+        for station in self.stations:
+            station.registry = self
+
+
+    def __len__(self):
+        return len(self.stations)
+
+
+    def __iter__(self):
+        """ Iterate (node id, station) couples """
+        return zip(self.nodes, self.stations)
+
+
+    def __getitem__(self, node):
+        """ The station of a node (node id) """
+        return self.__stations[node]
+
+
+    def __surplus_key (self, i):
+        return (-self.stations[i].chargers_ontheside, i)
+
+    def __deficit_key (self, i):
+        station = self.stations[i]
+        return (station.chargers_level - station.chargers_capacity, i)
+
+
+    def update (self, station):
+        """ Method called by a station when its chargers change """
+        i = self.__index[station]
+        self.__surplus.update(i, self.__surplus_key(i))
+        self.__deficit.update(i, self.__deficit_key(i))
+
+
+    def best_source (self):
+        """ The (node id, station) with the highest number of batteries on the side """
+        i = self.__surplus.top()
+        return self.nodes[i], self.stations[i]
+
+
+    def best_target (self):
+        """ The (node id, station) with the highest difference between capacity and level """
+        i = self.__deficit.top()
+        return self.nodes[i], self.stations[i]
+
+
+    def top (self, k):
+        """
+        The best k sources and the best k targets for redistributions.
+
+        :param k: The number of stations.
+        :return: Two lists of (node id, station), sorted from the best.
+        """
+        return (
+            [(self.nodes[i], self.stations[i]) for i in self.__surplus.top_k(k)],
+            [(self.nodes[i], self.stations[i]) for i in self.__deficit.top_k(k)],
+        )
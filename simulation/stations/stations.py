@@ -4,9 +4,7 @@ from simpy.resources.resource import Request, Release
 
 from .charger import Charger
 from simulation.utils.technical import charge_time
-
-
-import collections 
+from simulation.stats import StationStats
 
 
 
@@ -36,12 +34,16 @@ class Station (simpy.Resource):
 
     """ An instance of this class represents a charging station """
 
-    def __init__(self, env, stype, btypes, swaptime):
+    def __init__(self, env, stype, btypes, swaptime, lazy=False):
         """
         :param env: The simulation environment.
         :param stype: The station type.
         :param btypes: The managed batery types.
         :param swaptime: The operator time needed to swap batteries.
+        :param lazy: If True chargers use the lazy charging (see Charger).
+
+        :attr registry: The StationRegistry notified when chargers change (if any).
+        :attr stats: The streaming statistics of waiting times and queue length.
         """
 
         super().__init__(env, stype.capacity)
@@ -52,12 +54,12 @@ class Station (simpy.Resource):
         self.power = stype.power  
 
         self.chargers = {
-                btype: Charger(env, capacity=n, power=stype.power)
+                btype: Charger(env, capacity=n, power=stype.power, lazy=lazy, on_change=self._changed)
             for btype, n in zip(btypes, stype.chargers_capacities)
         }
 
-        self.log_queue = {}
-        self.log_times = collections.deque()
+        self.stats = StationStats()
+        self.registry = None
 
     @property
     def chargers_level (self):
@@ -75,6 +77,12 @@ class Station (simpy.Resource):
         return sum(i.ontheside  for i in self.chargers.values())
 
 
+    def _changed (self):
+        """ Callback of the chargers when their batteries change """
+        if self.registry is not None:
+            self.registry.update(self)
+
+
     def charge (self, req, vehicle, sharing, waitcharge):
         """
         Process that simulates the vehicle charging.
@@ -88,14 +96,14 @@ class Station (simpy.Resource):
 
         # Logs for queue status
         _start_waiting = env.now 
-        self.log_queue[env.now] = len(self.queue)
+        self.stats.update_queue(env.now, len(self.queue))
             
         # Wait for a free charging place
         yield req 
 
         # Logs for queue status
-        self.log_times.append(env.now - _start_waiting)
-        self.log_queue[env.now] = len(self.queue)
+        self.stats.add_waiting(env.now - _start_waiting)
+        self.stats.update_queue(env.now, len(self.queue))
 
         if sharing: 
             # Remove current batteries
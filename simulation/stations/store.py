@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import collections
+
+from simulation.utils.technical import charge_time, level_at_time
+
+
+
+
+class BatteryStore:
+
+    """
+    An instance of this class is the store where the batteries of a charger
+    are kept while charging.
+
+    Batteries are kept in a heap ordered by their expected full-charge time, so the
+    best battery is retrieved in O(log n). When there is no free space, the batteries
+    left are kept on the side (in arrival order) until a place is released, and the
+    requests made when the store is empty wait for the next battery.
+
+    The number of batteries in charge and fully charged are updated incrementally,
+    and no process is started: puts and gets are plain events, and the end of each
+    charge is a timeout event with a callback. In lazy mode, not even this event is
+    scheduled: the level of a battery is computed on demand from its start_charging
+    and the power, and a timer is only scheduled when a request actually waits for
+    a battery to be charged.
+
+    NOTE: A battery retrieved while still charging with waitcharge=True is reserved:
+    it keeps its place until the charge is concluded.
+    """
+
+    def __init__(self, env, capacity, power, lazy=False, on_change=None):
+        """
+        :param env: The simulation environment.
+        :param capacity: The maximum number of batteries allowed.
+        :param power: The power erogated in kW.
+        :param lazy: If True the end of charges is not scheduled (see above).
+        :param on_change: A function called when the batteries stored or on the side change.
+
+        :attr incharge: The number of stored batteries on charge.
+        :attr charged: The number of stored batteries fully charged.
+        :attr ontheside: The batteries (with the event of their put) waiting for a free place.
+        :attr get_queue: The get requests (with their waitcharge) waiting for a battery.
+        :attr charging: For each battery on charge, the event of the end of its charge 
+                    (or its heap entry in lazy mode).
+        """
+        self.env = env
+        self.capacity = capacity
+        self.power = power
+        self.lazy = lazy
+        self.on_change = on_change
+
+        self.__incharge = 0
+        self.__charged = 0
+        self.ontheside = collections.deque()
+        self.get_queue = collections.deque()
+        self.charging = {}
+
+        self.__heap = []                # (expected full-charge time, counter, battery)
+        self.__reserved = {}            # battery -> get request waiting for the end of its charge
+        self.__pending = []             # lazy mode: the heap entries of the batteries on charge
+        self.__counter = itertools.count()
+
+
+    @property
+    def items (self):
+        """ The stored batteries (reserved batteries excluded) """
+        return [i[2] for i in self.__heap]
+
+    @property
+    def level (self):
+        """ The number of stored batteries (reserved batteries excluded) """
+        return len(self.__heap)
+
+    @property
+    def incharge (self):
+        """ The number of stored batteries on charge """
+        self.__update()
+        return self.__incharge
+
+    @property
+    def charged (self):
+        """ The number of stored batteries fully charged """
+        self.__update()
+        return self.__charged
+
+    @property
+    def free (self):
+        """ The number of free places """
+        return self.capacity - len(self.__heap) - len(self.__reserved)
+
+
+    def put (self, battery):
+        """
+        Method to leave a battery.
+
+        :param battery: The battery.
+        :return: An event triggered when the battery is placed in charge.
+        """
+        event = self.env.event()
+        if self.free > 0:
+            self.__store(battery)
+            event.succeed()
+        else:
+            self.ontheside.append((battery, event))
+        self.__changed()
+        return event
+
+
+    def get (self, waitcharge=True):
+        """
+        Method to retrieve the battery with the lowest expected full-charge time.
+
+        :param waitcharge: If True the battery is returned when fully charged, otherwise
+                        its charge is interrupted.
+        :return: An event whose value is the battery.
+        """
+        request = self.env.event()
+        if self.__heap:
+            self.__serve(request, waitcharge)
+        else:
+            self.get_queue.append((request, waitcharge))
+        self.__changed()
+        return request
+
+
+    def take_ontheside (self):
+        """ Method to remove (and return) all the batteries waiting for a free place """
+        batteries = [battery for battery, _ in self.ontheside]
+        self.ontheside.clear()
+        self.__changed()
+        return batteries
+
+
+    def __store (self, battery):
+        """ Method to place a battery in charge """
+        env = self.env
+        battery.start_charging = env.now
+
+        entry = (env.now + charge_time(battery, self.power), next(self.__counter), battery)
+
+        if battery.level < battery.capacity:
+            if self.lazy:
+                self.charging[battery] = entry
+                heapq.heappush(self.__pending, entry)
+            else:
+                event = env.timeout(entry[0] - env.now)
+                event.callbacks.append(lambda event: self.__charge_end(battery, event))
+                self.charging[battery] = event
+            self.__incharge += 1
+        else:
+            self.__charged += 1
+
+        heapq.heappush(self.__heap, entry)
+
+        if self.get_queue:
+            self.__serve(*self.get_queue.popleft())
+
+
+    def __serve (self, request, waitcharge):
+        """ Method to hand out the best battery to a get request """
+        self.__update()
+        ready, _, battery = heapq.heappop(self.__heap)
+
+        if battery not in self.charging:
+            self.__charged -= 1
+        else:
+            self.__incharge -= 1
+            if waitcharge:
+                self.__reserved[battery] = request
+                if self.lazy:
+                    # The only timer scheduled in lazy mode
+                    token = self.charging[battery]
+                    event = self.env.timeout(ready - self.env.now)
+                    event.callbacks.append(lambda event: self.__charge_end(battery, token))
+                return
+            # Interrupt the charge (the end of charge event is ignored)
+            del self.charging[battery]
+            battery.level = level_at_time(self.env.now, battery, self.power)
+
+        self.__release()
+        request.succeed(battery)
+
+
+    def __update (self):
+        """ Lazy mode: method to conclude the charges ended until now """
+        pending, now = self.__pending, self.env.now
+        while pending and pending[0][0] <= now:
+            entry = heapq.heappop(pending)
+            if entry[2] not in self.__reserved:
+                self.__charge_end(entry[2], entry)
+
+
+    def __charge_end (self, battery, token):
+        """ Callback of the end of the charge of a battery """
+        if self.charging.get(battery) is not token:
+            return
+        del self.charging[battery]
+        battery.level = battery.capacity
+
+        if (request := self.__reserved.pop(battery, None)) is not None:
+            self.__release()
+            self.__changed()
+            request.succeed(battery)
+        else:
+            self.__incharge -= 1
+            self.__charged += 1
+
+
+    def __changed (self):
+        """ Method to notify a change of the batteries stored or on the side """
+        if self.on_change is not None:
+            self.on_change()
+
+
+    def __release (self):
+        """ Method to fill a released place with the first battery on the side """
+        if self.ontheside and self.free > 0:
+            battery, event = self.ontheside.popleft()
+            self.__store(battery)
+            event.succeed()
@@ -0,0 +1,281 @@
+import math
+
+
+
+
+class Welford:
+
+    """
+    An instance of this class is a streaming accumulator of the mean and
+    the variance of a sample (Welford algorithm), in O(1) memory.
+
+    Accumulators of different samples can be merged (Chan et al. formula).
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+
+    def add (self, x):
+        """ Method to add an observation """
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+
+    @property
+    def variance (self):
+        """ The sample variance (0 with less than two observations) """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std (self):
+        """ The sample standard deviation """
+        return math.sqrt(self.variance)
+
+
+    def merge (self, other):
+        """ Method to merge the accumulator of another sample into this one """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        return self
+
+
+    def to_dict (self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict (cls, d):
+        return cls(d["count"], d["mean"], d["m2"])
+
+
+
+
+class TimeWeighted:
+
+    """
+    An instance of this class is a streaming accumulator of the time-weighted
+    average of a piecewise constant quantity (e.g., the length of a queue).
+    The integral of the quantity over time is updated at each change.
+    """
+
+    def __init__(self, start=0, value=0, integral=0.0, duration=0.0):
+        """
+        :param start: The time the quantity starts being observed.
+        :param value: The initial value of the quantity.
+        :param integral: The integral of closed intervals.
+        :param duration: The length of closed intervals.
+        """
+        self.last = start
+        self.value = value
+        self.integral = integral
+        self.duration = duration
+
+
+    def update (self, now, value):
+        """ Method to register the value of the quantity from now on """
+        self.integral += self.value * (now - self.last)
+        self.duration += now - self.last
+        self.last, self.value = now, value
+
+
+    def close (self, now):
+        """ Method to close the current interval at the time now """
+        self.update(now, self.value)
+        return self
+
+
+    def mean (self, now=None):
+        """ The time-weighted average (until now, if passed) """
+        integral, duration = self.integral, self.duration
+        if now is not None:
+            integral += self.value * (now - self.last)
+            duration += now - self.last
+        return integral / duration if duration > 0 else 0.0
+
+
+    def merge (self, other):
+        """
+        Method to merge the closed intervals of another quantity into this one.
+        The result is the average over the overall observation time.
+        """
+        self.integral += other.integral
+        self.duration += other.duration
+        return self
+
+
+    def to_dict (self):
+        return {"integral": self.integral, "duration": self.duration}
+
+    @classmethod
+    def from_dict (cls, d):
+        return cls(integral=d["integral"], duration=d["duration"])
+
+
+
+
+class QuantileSketch:
+
+    """
+    An instance of this class is a mergeable sketch of the quantiles of a sample
+    of non-negative values, with logarithmic buckets (as in DDSketch).
+
+    A positive value x falls in the bucket i = ceil(log(x) / log(gamma)), where
+    gamma = (1 + alpha) / (1 - alpha), so each quantile is estimated with a relative
+    error lower than alpha. Values not higher than min_value are counted apart.
+
+    NOTE: The memory is bounded by max_buckets: when they are exceeded, the lowest
+    buckets are collapsed, which only affects the accuracy of the lowest quantiles.
+    """
+
+    def __init__(self, alpha=0.01, max_buckets=2048, min_value=1e-9):
+        """
+        :param alpha: The relative accuracy.
+        :param max_buckets: The maximum number of buckets kept.
+        :param min_value: The values not higher than this are counted as zero.
+        """
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.__log_gamma = math.log(self.gamma)
+
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+
+    def add (self, x):
+        """ Method to add an observation """
+        self.count += 1
+        if x <= self.min_value:
+            self.zero_count += 1
+            return
+        i = math.ceil(math.log(x) / self.__log_gamma)
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self.__collapse()
+
+
+    def __collapse (self):
+        """ Method to merge the lowest buckets to respect max_buckets """
+        keys = sorted(self.buckets)
+        excess = keys[:len(keys) - self.max_buckets + 1]
+        self.buckets[excess[-1]] += sum(self.buckets.pop(i) for i in excess[:-1])
+
+
+    def quantile (self, q):
+        """ The estimate of the q-quantile (0 <= q <= 1), None if the sketch is empty """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                return 2 * self.gamma**i / (self.gamma + 1)
+        return 2 * self.gamma**max(self.buckets) / (self.gamma + 1)
+
+
+    def merge (self, other):
+        """ Method to merge another sketch (with the same alpha) into this one """
+        if other.alpha != self.alpha:
+            raise Exception("Sketches with different accuracy cannot be merged.")
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        while len(self.buckets) > self.max_buckets:
+            self.__collapse()
+        return self
+
+
+    def to_dict (self):
+        return {
+            "alpha": self.alpha, "max_buckets": self.max_buckets, "min_value": self.min_value,
+            "buckets": {str(i): n for i, n in self.buckets.items()},
+            "zero_count": self.zero_count, "count": self.count,
+        }
+
+    @classmethod
+    def from_dict (cls, d):
+        sketch = cls(d["alpha"], d["max_buckets"], d["min_value"])
+        sketch.buckets = {int(i): n for i, n in d["buckets"].items()}
+        sketch.zero_count, sketch.count = d["zero_count"], d["count"]
+        return sketch
+
+
+
+
+class StationStats:
+
+    """
+    An instance of this class keeps the statistics of a charging station (or
+    the merge of the statistics of many stations) in O(1) memory:
+        - the mean and variance of the waiting time (Welford);
+        - the quantiles of the waiting time (QuantileSketch);
+        - the time-weighted length of the queue (TimeWeighted).
+    """
+
+    def __init__(self, waiting=None, waiting_sketch=None, queue=None):
+        self.waiting = waiting or Welford()
+        self.waiting_sketch = waiting_sketch or QuantileSketch()
+        self.queue = queue or TimeWeighted()
+
+
+    def add_waiting (self, wait):
+        """ Method to register the time a vehicle waited """
+        self.waiting.add(wait)
+        self.waiting_sketch.add(wait)
+
+
+    def update_queue (self, now, length):
+        """ Method to register a change in the length of the queue """
+        self.queue.update(now, length)
+
+
+    def merge (self, other):
+        """ Method to merge the statistics of another station (or scenario) """
+        self.waiting.merge(other.waiting)
+        self.waiting_sketch.merge(other.waiting_sketch)
+        self.queue.merge(other.queue)
+        return self
+
+
+    def closed (self, now):
+        """ A copy whose queue interval is closed at the time now (e.g., to merge it) """
+        queue = TimeWeighted(now, self.queue.value, self.queue.integral, self.queue.duration)
+        queue.integral += self.queue.value * (now - self.queue.last)
+        queue.duration += now - self.queue.last
+        return StationStats(Welford.from_dict(self.waiting.to_dict()), QuantileSketch.from_dict(self.waiting_sketch.to_dict()), queue)
+
+
+    def report (self):
+        """ A summary of the statistics """
+        sketch = self.waiting_sketch
+        return {
+            "waiting_mean": self.waiting.mean,
+            "waiting_std": self.waiting.std,
+            "waiting_p50": sketch.quantile(0.5),
+            "waiting_p95": sketch.quantile(0.95),
+            "waiting_p99": sketch.quantile(0.99),
+            "queue_mean": self.queue.mean(),
+        }
+
+
+    def to_dict (self):
+        return {"waiting": self.waiting.to_dict(), "waiting_sketch": self.waiting_sketch.to_dict(), "queue": self.queue.to_dict()}
+
+    @classmethod
+    def from_dict (cls, d):
+        return cls(Welford.from_dict(d["waiting"]), QuantileSketch.from_dict(d["waiting_sketch"]), TimeWeighted.from_dict(d["queue"]))
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+
+
+
+class RandomStreams:
+
+    """
+    An instance of this class provides the independent random streams of the
+    subsystems of a simulation, all derived from a single seed.
+
+    Each stream is identified by a subsystem and (optionally) by some integer keys
+    (e.g., the slot of a vehicle), and its generator only depends on the seed and
+    on this identity (through the spawn key of a numpy SeedSequence), not on the
+    order streams are created or used.
+
+    NOTE: Two simulations with the same seed see the same random numbers in each
+    subsystem (common random numbers), even if they differ in other respects (e.g.,
+    with and without sharing), hence their differences are paired.
+
+    NOTE: The preprocessings of the graph (e.g., the landmarks, which break the ties
+    of the routing) do not use the streams: they are shared by runs with any seed,
+    hence they are seeded by the graph itself (see Landmarks.select).
+    """
+
+    # The subsystems that have their own streams
+    SUBSYSTEMS = ("placement", "demand", "batteries", "distributors")
+
+
+    def __init__(self, seed=None):
+        """
+        :param seed: The seed (if None it is drawn from the OS entropy).
+
+        :attr entropy: The seed actually used (to reproduce the streams).
+        """
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self.__index = {name: i for i, name in enumerate(self.SUBSYSTEMS)}
+
+
+    def __repr__(self):
+        return f"RandomStreams({self.entropy})"
+
+
+    def sequence (self, name, *keys):
+        """ The numpy SeedSequence of a stream """
+        if (i := self.__index.get(name)) is None:
+            raise Exception(f"Unknown random stream {name}.")
+        return np.random.SeedSequence(self.entropy, spawn_key=(i, *keys))
+
+
+    def generator (self, name, *keys):
+        """ A numpy Generator on a stream """
+        return np.random.default_rng(self.sequence(name, *keys))
+
+
+    def seed (self, name, *keys):
+        """ A 64 bits integer seed derived from a stream (e.g., for functions taking a seed) """
+        high, low = self.sequence(name, *keys).generate_state(2, dtype=np.uint32).tolist()
+        return (high << 32) | low
+
+
+    def random (self, name, *keys):
+        """ A random.Random on a stream """
+        return random.Random(self.seed(name, *keys))
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import itertools
+import traceback
+import dataclasses
+import concurrent.futures
+
+import simpy
+
+from simulation.configuration import Config
+from simulation.environment import CountingEnvironment
+from simulation.graph import Graph
+from simulation.runner import SimulationRunner
+from simulation.streams import RandomStreams
+from simulation.utils.io import read_configuration, run_fingerprint
+from simulation.utils.cache import ResultStore
+from simulation.utils.shared import SharedArrays
+
+
+
+
+def expand_grid (config_files, grid=None, seeds=(0,)):
+    """
+    Method to expand a parameter grid into the jobs of a sweep: a job for each
+    configuration file, each combination of the values in the grid, and each seed.
+
+    :param config_files: The configuration files (see export_configuration).
+    :param grid: A dict of the values of some fields of Config, e.g., {"N_VEHICLES": [100, 200]}.
+    :param seeds: The seeds of the replications of each combination.
+    :return: A list of jobs, i.e. dicts with id, config_file, overrides, and seed.
+    """
+    grid = grid or {}
+    fields = {field.name for field in dataclasses.fields(Config)}
+    if (unknown := set(grid) - fields):
+        raise Exception(f"Unknown configuration fields: {sorted(unknown)}.")
+
+    keys = sorted(grid)
+    jobs = []
+    for config_file in config_files:
+        for values in itertools.product(*(grid[key] for key in keys)):
+            overrides = dict(zip(keys, values))
+            for seed in seeds:
+                job = {"config_file": config_file, "overrides": overrides, "seed": seed}
+                job["id"] = job_id(job)
+                jobs.append(job)
+    return jobs
+
+
+
+def scenario_key (job):
+    """ The key of the scenario of a job (i.e., the job without the seed) """
+    return json.dumps({"config_file": job["config_file"], "overrides": job["overrides"]}, sort_keys=True)
+
+
+
+def job_id (job):
+    """ A unique id of a job, stable across runs """
+    key = json.dumps({"scenario": scenario_key(job), "seed": job["seed"]}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+
+def job_config (job):
+    """ The configuration of a job """
+    return dataclasses.replace(read_configuration(job["config_file"]), **job["overrides"])
+
+
+
+
+def lookup_result (config, seed):
+    """ 
+    The result of a run memoized in Config.RESULT_CACHE (see run_fingerprint), or 
+    None if missing (or if the cache is disabled, or the run is not seeded).
+    """
+    if not config.RESULT_CACHE or seed is None:
+        return None
+    return ResultStore(config.RESULT_CACHE).get(run_fingerprint(config, seed))
+
+
+def store_result (config, seed, result):
+    """ Method to memoize the result of a run in Config.RESULT_CACHE (if enabled and seeded) """
+    if config.RESULT_CACHE and seed is not None:
+        ResultStore(config.RESULT_CACHE).put(run_fingerprint(config, seed), result)
+
+
+
+
+# The graphs shared by the parent process, and the last graph used by the worker
+_worker_shared, _worker_graph = {}, (None, None)
+
+
+def _init_worker (shared):
+    global _worker_shared
+    _worker_shared = shared
+
+
+def run_job (job):
+    """
+    Method executed by the workers of a sweep to run a job.
+
+    NOTE: The graph is read (or attached from the shared memory) once per worker,
+    and the following jobs on the same graph only make their own stations.
+    Jobs with the same seed use the same random streams (see RandomStreams), so the
+    scenarios of a sweep are compared with common random numbers.
+
+    :param job: The job.
+    :return: The job, with the results of the simulation (see SimulationRunner.report),
+            and its wall time (loading included).
+    """
+    global _worker_graph
+    _start = time.time()
+    config = job_config(job)
+    if (result := lookup_result(config, job["seed"])) is not None:
+        return {**job, **result, "cached": True}
+    env = CountingEnvironment()
+
+    key, G = _worker_graph
+    if key != config.GRAPH_FILE:
+        if (spec := _worker_shared.get(config.GRAPH_FILE)) is not None:
+            G = Graph.from_shared(env, config, spec)
+        else:
+            G = Graph.from_file(env, config, stations=False, elevation=False)
+        _worker_graph = (config.GRAPH_FILE, G)
+
+    random.seed(job["seed"])
+    sim = SimulationRunner(env, config, G, streams=RandomStreams(job["seed"]))
+    _sim_start = time.time()
+    sim()
+    _end = time.time()
+    result = {**sim.report(_end - _sim_start), "wall_time": round(_end - _start, 3)}
+    store_result(config, job["seed"], result)
+    return {**job, **result}
+
+
+
+
+class Sweep:
+
+    """
+    An instance of this class executes the jobs of a sweep (see expand_grid) on
+    a bounded pool of worker processes.
+
+    Each result is appended to a JSONL file (one line per job) as soon as its job
+    is concluded, so a crash only loses the jobs in execution: when the sweep is
+    executed again, the jobs whose results are already in the file are skipped.
+
+    Jobs are scheduled longest-first, according to the wall times of the scenario
+    recorded in the file by previous runs (jobs never executed go first). Jobs 
+    whose results are memoized in Config.RESULT_CACHE are not executed at all.
+
+    NOTE: The graphs are read once by the parent process and shared with the
+    workers (see SharedArrays).
+    """
+
+    def __init__(self, jobs, results_file="./results.jsonl", max_workers=None, share_graphs=True):
+        """
+        :param jobs: The jobs.
+        :param results_file: The JSONL file of the results.
+        :param max_workers: The maximum number of worker processes (all the cores by default).
+        :param share_graphs: If True the graphs are shared with the workers.
+
+        :attr completed: The number of jobs concluded by this run (cached ones included).
+        :attr cached: The number of jobs whose results were memoized.
+        :attr failed: The ids of the jobs that raised an exception (retried by the next run).
+        """
+        self.jobs = list(jobs)
+        self.results_file = results_file
+        self.max_workers = max_workers
+        self.share_graphs = share_graphs
+        self.completed = 0
+        self.cached = 0
+        self.failed = []
+
+
+    def results (self):
+        """ The results in the file (an incomplete last line is ignored) """
+        results = []
+        if os.path.exists(self.results_file):
+            with open(self.results_file) as file:
+                for line in file:
+                    try:
+                        results.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        return results
+
+
+    def pending (self):
+        """ The jobs whose results are not in the file, longest first """
+        results = self.results()
+        done = {result["id"] for result in results}
+
+        # NOTE: Results memoized by other runs (e.g., run_replications) have no wall time.
+        runtimes = {}
+        for result in results:
+            if (wall_time := result.get("wall_time")) is not None:
+                runtimes.setdefault(scenario_key(result), []).append(wall_time)
+        expected = {key: sum(times) / len(times) for key, times in runtimes.items()}
+
+        jobs = [job for job in self.jobs if job["id"] not in done]
+        return sorted(jobs, key=lambda job: -expected.get(scenario_key(job), float("inf")))
+
+
+    def __write (self, result):
+        """ Method to append a result to the file (as soon as it is available) """
+        with open(self.results_file, "ab+") as file:
+            # A line interrupted by a crash is terminated, so it does not corrupt the next one
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    file.write(b"\n")
+            file.write((json.dumps(result) + "\n").encode())
+            file.flush()
+            os.fsync(file.fileno())
+
+
+    def __share (self, jobs):
+        """ 
+        The graphs of the jobs in shared memory (one for each graph file), with the
+        preprocessings needed by their jobs, so that workers do not make them again.
+
+        NOTE: The landmarks are the ones of the first job (the workers of jobs asking 
+        for a different number of landmarks make their own).
+        """
+        configs = {}
+        for job in jobs:
+            config = job_config(job)
+            configs.setdefault(config.GRAPH_FILE, []).append(config)
+
+        shared = {}
+        for graph_file, group in configs.items():
+            G = Graph.from_file(simpy.Environment(), group[0], stations=False, elevation=False)
+            if G.hierarchy is None and any(config.ROUTER == "ch" for config in group):
+                G.build_hierarchy()
+            if any(config.SHARING for config in group):
+                G.station_matrix
+            shared[graph_file] = SharedArrays.create({**G.to_arrays(), **G.preprocessing_arrays()}, meta=G.meta())
+        return shared
+
+
+    def run (self):
+        """
+        Method to execute the pending jobs.
+
+        :return: The number of jobs concluded.
+        """
+        jobs = []
+        for job in self.pending():
+            if (result := lookup_result(job_config(job), job["seed"])) is not None:
+                self.__write({**job, **result, "cached": True})
+                self.completed += 1
+                self.cached += 1
+            else:
+                jobs.append(job)
+        if not jobs:
+            return self.completed
+
+        shared = self.__share(jobs) if self.share_graphs else {}
+        try:
+            with concurrent.futures.ProcessPoolExecutor(self.max_workers, initializer=_init_worker,
+                                                        initargs=({key: i.spec for key, i in shared.items()},)) as pool:
+                futures = {pool.submit(run_job, job): job for job in jobs}
+                for future in concurrent.futures.as_completed(futures):
+                    job = futures[future]
+                    try:
+                        self.__write(future.result())
+                        self.completed += 1
+                    except concurrent.futures.process.BrokenProcessPool:
+                        raise
+                    except Exception:
+                        self.failed.append(job["id"])
+                        print(f"Job {job['id']} failed:", file=sys.stderr)
+                        traceback.print_exc()
+        finally:
+            for block in shared.values():
+                block.unlink()
+        return self.completed
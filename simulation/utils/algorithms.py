@@ -1,15 +1,17 @@
 from networkx.algorithms.shortest_paths import astar
 
-from simulation.utils.technical import consumption
-from simulation.utils.technical import euclidean_distance
+from simulation.utils.technical import consumption, csr_consumption
+from simulation.utils.technical import euclidean_distance, csr_euclidean_distance
 from simulation.exceptions import SimulationNoPath
 
 import functools
 import itertools
+import math
 import collections 
 import heapq
 import osmnx as ox
 import networkx as nx 
+import numpy as np
 
 
 
@@ -169,4 +171,380 @@ def station_breath_first_search (G, node, level, vehicle, tabu):
             explored_nodes.add(i)
     
     # No station found
-    return None
\ No newline at end of file
+    return None
+
+
+
+# ------------------------------------------------------------------------------------------------------------
+# Variants of the previous algorithms working on the CSR view of the graph (see simulation.csr.CSRGraph).
+# Nodes are integer ids and paths are sequences of integer ids.
+# The dict-based algorithms above are kept as reference.
+# ------------------------------------------------------------------------------------------------------------
+
+def csr_astar_path (csr, source, target, heuristic=None, weight=None):
+    """
+    A* algorithm on the CSR view of the graph.
+    It replicates the networkx.astar_path implementation.
+
+    :param csr: The CSR view of the graph.
+    :param source: The starting node.
+    :param target: The destination.
+    :param heuristic: A function h(node, target) estimating the distance from a node 
+                    to the target. If not passed no heuristic is used (i.e., Dijkstra).
+    :param weight: The cost of each edge as a sequence indexed by edge id. 
+                If not passed the length of edges is used.
+    :return: The path as a list of integer nodes.
+    """
+    weight = weight if weight is not None else csr.column("length")
+    adjacency = csr.adjacency
+    push, pop = heapq.heappush, heapq.heappop
+    counter = itertools.count()
+
+    # The queue stores priority, counter, node, cost to reach, and parent.
+    queue = [(0, next(counter), source, 0, None)]
+    # Maps enqueued nodes to distance of discovered paths and the heuristic
+    enqueued = {}
+    # Maps explored nodes to parent closest to the source
+    explored = {}
+
+    while queue:
+        _, __, curnode, dist, parent = pop(queue)
+
+        if curnode == target:
+            path = [curnode]
+            node = parent
+            while node is not None:
+                path.append(node)
+                node = explored[node]
+            path.reverse()
+            return path
+
+        if curnode in explored:
+            # Do not override the parent of starting node
+            if explored[curnode] is None:
+                continue
+            # Skip bad paths that were enqueued before finding a better one
+            qcost, h = enqueued[curnode]
+            if qcost < dist:
+                continue
+
+        explored[curnode] = parent
+
+        for neighbor, e in adjacency[curnode]:
+            ncost = dist + weight[e]
+            if neighbor in enqueued:
+                qcost, h = enqueued[neighbor]
+                if qcost <= ncost:
+                    continue
+            else:
+                h = heuristic(neighbor, target) if heuristic else 0
+            enqueued[neighbor] = ncost, h
+            push(queue, (ncost + h, next(counter), neighbor, ncost, curnode))
+
+    raise nx.NetworkXNoPath(f"Node {target} not reachable from {source}")
+
+
+
+def csr_dijkstra (csr, source, weight=None, reverse=False):
+    """
+    Dijkstra algorithm on the CSR view of the graph, computing the 
+    distance from the source to all the other nodes.
+
+    :param csr: The CSR view of the graph.
+    :param source: The starting node.
+    :param weight: The cost of each edge as a sequence indexed by edge id. 
+                If not passed the length of edges is used.
+    :param reverse: If True edges are followed backward, so the distances
+                    are the ones from each node to the source.
+    :return: A list of distances indexed by integer node (inf for unreachable nodes).
+    """
+    weight = weight if weight is not None else csr.column("length")
+    adjacency = csr.reverse_adjacency if reverse else csr.adjacency
+    push, pop = heapq.heappush, heapq.heappop
+
+    dist = [math.inf] * csr.n_nodes
+    dist[source] = 0
+    queue = [(0, source)]
+
+    while queue:
+        d, node = pop(queue)
+        if d > dist[node]:
+            continue
+        for neighbor, e in adjacency[node]:
+            if (nd := d + weight[e]) < dist[neighbor]:
+                dist[neighbor] = nd
+                push(queue, (nd, neighbor))
+
+    return dist
+
+
+
+def csr_strongly_connected_components (csr):
+    """
+    Tarjan algorithm (iterative version) on the CSR view of the graph.
+
+    NOTE: Components are numbered in reverse topological order, hence the 
+    edges leaving a component always go to components with a lower label.
+
+    :param csr: The CSR view of the graph.
+    :return: A list with the label of the component of each integer node.
+    """
+    adjacency, n = csr.adjacency, csr.n_nodes
+    index, low, onstack, component = [-1] * n, [0] * n, [False] * n, [-1] * n
+    stack, counter, label = [], 0, 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        onstack[root] = True
+        work = [(root, 0)]
+
+        while work:
+            node, i = work[-1]
+            if i < len(adjacency[node]):
+                work[-1] = (node, i + 1)
+                succ = adjacency[node][i][0]
+                if index[succ] == -1:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    onstack[succ] = True
+                    work.append((succ, 0))
+                elif onstack[succ] and index[succ] < low[node]:
+                    low[node] = index[succ]
+                continue
+
+            # All the successors visited
+            work.pop()
+            if work and low[node] < low[work[-1][0]]:
+                low[work[-1][0]] = low[node]
+
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    onstack[member] = False
+                    component[member] = label
+                    if member == node:
+                        break
+                label += 1
+
+    return component
+
+
+
+def csr_shortest_path (csr, source, target, weight="length", heuristic=None):
+    """
+    The shortest path between two integer nodes computed through the A* algorithm.
+    Raises a NetworkXNoPath exception if the target cannot be reached.
+
+    NOTE: The simulation obtains paths through a Router (see simulation.routing), 
+    which also uses caches and other backends.
+
+    :param csr: The CSR view of the graph.
+    :param source: The starting node.
+    :param target: The destination.
+    :param weight: The name of the edges column minimised.
+    :param heuristic: The A* heuristic h(node, target). If not passed the 
+                    euclidean distance is used.
+    :return: The path as a tuple of integer nodes.
+    """
+    heuristic = heuristic or functools.partial(csr_euclidean_distance, csr=csr)
+    return tuple(csr_astar_path(csr, source, target, heuristic=heuristic, weight=csr.column(weight)))
+
+
+
+def csr_define_path (csr, source, target, vehicle, level=None, router=None):
+    """
+    Algorithm used to find a path from a source to a target, by considering 
+    stations and necessity to recharge (see define_path).
+
+    :param csr: The CSR view of the graph.
+    :param source: The starting node.
+    :param target: The destination.
+    :param vehicle: The vehicle.
+    :param level: The current level of vehicle batteries. If not passed it 
+                is taken from vehicle instance.
+    :param router: The Router used for the baseline path. If not passed 
+                the A* algorithm is used.
+
+    :return: The new path considering stops and necessity to recharge.
+    """
+    # Define a baseline path with no stops
+    if router is not None:
+        baseline_path = router.shortest_path(source, target)
+    else:
+        baseline_path = csr_shortest_path(csr, source, target)
+
+    # Init fuel level and keep track of last station visited
+    level = level or vehicle.level
+    last_station, last_station_pointer = None, None 
+    is_station, costs = csr.column("is_station"), csr.energy_costs(vehicle.vtype, aslist=True)
+
+    # Iterate throught the edges of the baseline to predict the consumption
+    for i, (e, nextnode) in enumerate(zip(csr.path_edges(baseline_path).tolist(), baseline_path[1:])):
+
+        if ( nextlevel := level - costs[e] ) >= 0:
+            # We can reach out the next node...
+            level = nextlevel
+            # If the reached node is a station, it is saved as station.
+            if is_station[nextnode]:
+                last_station, last_station_pointer = nextnode, i + 1
+
+        else:
+            # We cannot reach out the next node...
+            if last_station is not None:
+                # If we passed through a station, for the moment, we simply return 
+                # the path to that station.
+                return baseline_path[:last_station_pointer+1]
+
+            # If we didn't pass through a station, a station search in neighbour nodes is required.
+            if (bfs_path := csr_neighbour_station(csr, baseline_path[:i + 1], vehicle, level)):
+                return bfs_path
+
+            # No station even through the breath-first search
+            raise SimulationNoPath 
+
+    # The destion can be reached out without any stop.
+    return baseline_path
+
+
+
+def csr_neighbour_station (csr, path, vehicle, level):
+    """
+    Search of a charging station out of the baseline path (see neighbour_station).
+
+    :param csr: The CSR view of the graph.
+    :param path: The covered integer nodes from the beginning of the baseline 
+                path to the last considered node.
+    :param vehicle: The vehicle.
+    :param level: The current battery level.
+    :return: A new path that is currently leaving the baseline path
+            in order to reach a charging station.
+    """
+    N = len(path)
+
+    for i, node in enumerate(reversed(path)):
+
+        # Update the fuel if the vehicle retry
+        if i > 0:
+            level += csr_consumption(csr, csr.edge(node, path[N - i]), vehicle)
+
+        # Try to find a station with a Breath-First Search
+        path_to_station = csr_station_breath_first_search(csr, node, level, vehicle, set(path[:N - i]))
+        if path_to_station:
+            return tuple(itertools.chain( path[:N - i], path_to_station )) 
+
+    # No path to station found
+    return None
+
+
+
+def csr_station_breath_first_search (csr, node, level, vehicle, tabu): 
+    """
+    Breath-First Search of a charging station (see station_breath_first_search).
+
+    :param csr: The CSR view of the graph.
+    :param node: The root node the search starts from.
+    :param level: The fuel level at the root node.
+    :param vehicle: the vehicle.
+    :param tabu: The set of tabu nodes which is not our interest visiting.
+    :return: The path to the station found.
+    """
+    adjacency, is_station = csr.adjacency, csr.column("is_station")
+    costs = csr.energy_costs(vehicle.vtype, aslist=True)
+    roots = [(0, node, [], level)]
+    explored_nodes = set()
+
+    while len(roots) > 0:
+
+        # Get the next node strating from which we can look for a station
+        tree_level, cnode, path, _level = heapq.heappop(roots)
+        tree_level += 1
+
+        # Visit the sons...
+        for i, e in adjacency[cnode]:
+
+            # If the node can be reached with the remaining energy...
+            if (i not in tabu) and (i not in explored_nodes) and (newlevel := _level - costs[e]) >= 0:
+
+                # A station was found
+                if is_station[i]:
+                    return path + [i]
+
+                # A reachable node that can be used later as root was found
+                heapq.heappush(roots,  (tree_level, i, path + [i], newlevel) )
+
+            # Update the set of explored nodes.
+            explored_nodes.add(i)
+
+    # No station found
+    return None
+
+
+
+def linear_assignment (cost):
+    """
+    Hungarian algorithm (with potentials, vectorized on the columns) solving
+    the rectangular assignment problem: each row is assigned to a different
+    column (or vice versa when rows are more than columns), minimising the 
+    overall cost.
+
+    NOTE: Infinite costs are forbidden assignments, the couples with infinite 
+    cost are never returned (hence some rows might remain unassigned).
+
+    :param cost: A (n, m) matrix of costs.
+    :return: A list of (row, column) couples.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return []
+    if (transposed := cost.shape[0] > cost.shape[1]):
+        cost = cost.T
+
+    finite = np.isfinite(cost)
+    # Forbidden assignments get a cost higher than any feasible solution
+    big = (np.abs(cost[finite]).sum() + 1) * 2 if finite.any() else 1.0
+    weights = np.where(finite, cost, big)
+
+    n, m = weights.shape
+    u, v = np.zeros(n + 1), np.zeros(m + 1)
+    p, way = np.zeros(m + 1, dtype=np.int64), np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0], j0 = i, 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            current = weights[i0 - 1] - u[i0] - v[1:]
+            better = free & (current < minv[1:])
+            minv[1:][better] = current[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            columns = np.flatnonzero(used)
+            u[p[columns]] += delta
+            v[columns] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        # Augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j] != 0]
+    pairs = [(i, j) for i, j in pairs if finite[i, j]]
+    return sorted((j, i) for i, j in pairs) if transposed else pairs
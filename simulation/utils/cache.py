@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+
+# The version of the format of caches (caches of other versions are rebuilt)
+CACHE_VERSION = 1
+
+
+
+
+def file_hash (filename, chunk_size=1 << 20):
+    """ The sha1 of the content of a file """
+    sha = hashlib.sha1()
+    with open(filename, "rb") as file:
+        while (chunk := file.read(chunk_size)):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+
+def source_signature (filename, previous=None):
+    """
+    The signature of a source file: its size, its modification time, and its sha1.
+
+    NOTE: If size and modification time are the ones of a previous signature, the
+    file is not read again and the previous sha1 is trusted.
+
+    :param filename: The source file.
+    :param previous: A previous signature of the same file (if any).
+    :return: A dict with size, mtime_ns, and sha1.
+    """
+    stat = os.stat(filename)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return dict(previous)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": file_hash(filename)}
+
+
+
+def cache_path (directory, source, **params):
+    """
+    The directory of the cache of a source file built with some parameters.
+
+    :param directory: The directory of caches.
+    :param source: The source file.
+    :param params: The parameters the content depends on (e.g., a seed), which must
+                    be serializable in JSON (otherwise their string is used).
+    :return: The path of the cache.
+    """
+    key = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{os.path.splitext(os.path.basename(source))[0]}-{key}")
+
+
+
+def save_cache (path, source, arrays, meta):
+    """
+    Method to write a cache: each array in a .npy file, and a small JSON header
+    (meta.json) with the signature of the source and the content of meta.
+
+    NOTE: Each file is written aside and then renamed, so processes that have an
+    older version mapped in memory are not affected. The header is written last,
+    hence a cache without header is incomplete and is never read.
+
+    :param path: The directory of the cache.
+    :param source: The source file.
+    :param arrays: A dict of numpy arrays (object arrays are not allowed).
+    :param meta: A dict serializable in JSON.
+    """
+    os.makedirs(path, exist_ok=True)
+    header = os.path.join(path, "meta.json")
+    if os.path.exists(header):
+        os.remove(header)
+
+    for name, array in arrays.items():
+        tmp = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp, np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(tmp, os.path.join(path, f"{name}.npy"))
+
+    content = {"version": CACHE_VERSION, "source": source_signature(source), "arrays": sorted(arrays), "meta": meta}
+    with open(header + ".tmp", "w") as file:
+        json.dump(content, file)
+    os.replace(header + ".tmp", header)
+
+
+
+def load_cache (path, source, mmap=True):
+    """
+    Method to read a cache.
+
+    :param path: The directory of the cache.
+    :param source: The source file.
+    :param mmap: If True arrays are memory-mapped (read-only) instead of read.
+    :return: The dict of arrays and the meta, or None if the cache does not exist,
+            is incomplete, or is stale (i.e., the source changed).
+    """
+    header = os.path.join(path, "meta.json")
+    if not os.path.exists(header):
+        return None
+    with open(header) as file:
+        content = json.load(file)
+
+    if content.get("version") != CACHE_VERSION:
+        return None
+    if source_signature(source, content["source"])["sha1"] != content["source"]["sha1"]:
+        return None
+
+    try:
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+            for name in content["arrays"]
+        }
+    except (OSError, ValueError):
+        return None
+    return arrays, content["meta"]
+
+
+
+# The signatures of the graph files already hashed by this process
+_signatures = {}
+
+
+def graph_hash (filename):
+    """ The sha1 of a (graph) file, computed once per process unless the file changes """
+    _signatures[filename] = source_signature(filename, _signatures.get(filename))
+    return _signatures[filename]["sha1"]
+
+
+
+
+class ResultStore:
+
+    """
+    An instance of this class is a local content-addressed store of the results 
+    of simulations: each result is a JSON file named after its fingerprint (see 
+    run_fingerprint), so equal scenarios are executed once.
+
+    NOTE: Results are written aside and then renamed, so many processes can share 
+    the same store.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: The directory of the store (created if missing).
+
+        :attr hits: The number of results found.
+        :attr misses: The number of results not found.
+        """
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+
+    def path (self, fingerprint):
+        """ The file of a result """
+        return os.path.join(self.directory, fingerprint[:2], f"{fingerprint}.json")
+
+
+    def get (self, fingerprint):
+        """ The result memoized under a fingerprint, or None """
+        try:
+            with open(self.path(fingerprint)) as file:
+                result = json.load(file)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+
+    def put (self, fingerprint, result):
+        """ Method to memoize a result (serializable in JSON) under a fingerprint """
+        path = self.path(fingerprint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as file:
+            json.dump(result, file)
+        os.replace(tmp, path)
+
+
+    @property
+    def stats (self):
+        return {"hits": self.hits, "misses": self.misses}
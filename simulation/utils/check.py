@@ -7,5 +7,15 @@ def check_configuration (config):
             raise Exception("Inconsistency detected in batteries number. Please, check length of chargers_capacities in stations.")
 
 
+    if config.ROUTER not in ("astar", "ch"):
+        raise Exception(f"Unknown routing backend {config.ROUTER}. Please, use astar or ch.")
+
+    if config.PLANNER not in ("baseline", "constrained", "overlay"):
+        raise Exception(f"Unknown planner {config.PLANNER}. Please, use baseline, constrained, or overlay.")
+
+    if config.OD_FILTER not in (None, "largest_scc", "reachable"):
+        raise Exception(f"Unknown OD filter {config.OD_FILTER}. Please, use None, largest_scc, or reachable.")
+
+
     # Return True if the controls are correctly concluded.
     return True
@@ -1,43 +1,102 @@
 import json 
+import copy
+import hashlib
 import functools
 
 from simulation.configuration import Config 
-from vehicles import VehicleType
-from batteries import BatteryType 
-from stations import StationType
-from utils.selection import OPTIONS
+from simulation.vehicles import VehicleType
+from simulation.batteries import BatteryType 
+from simulation.stations import StationType
+from simulation.utils.selection import OPTIONS
+from simulation.utils.cache import graph_hash
+
+
+# The version of the results of simulations: to be increased when a change of the 
+# simulation changes its results, so that results memoized before are not used
+RESULTS_VERSION = 4
+
+# The fields of the configuration that do not change the results of simulations (caches and stores)
+NOT_RESULTS_FIELDS = ("GRAPH_CACHE", "RESULT_CACHE", "ELEVATION_CACHE", "ROUTE_STORE", "PATH_CACHE_SIZE", "PERSIST_STATION_MATRIX")
+
+
+
+def _selector_to_dict (selector):
+    """ The serialization of a selector (a function of OPTIONS, or a partial of it) """
+    func = getattr(selector, "func", selector)
+    return {"function": func.__name__, "args": dict(getattr(selector, "keywords", None) or {})}
+
+
+
+def config_to_dict (config):
+    """
+    The canonical serialization of a configuration, without side effects: selectors 
+    are described by name and arguments, and types by their attributes (the battery 
+    type of a vehicle type only by its id).
+
+    :param config: The configuration.
+    :return: A dict serializable in JSON (the same for equal configurations).
+    """
+    c = dict(config.__dict__)
+    c["BATTERY_SELECTOR"] = _selector_to_dict(config.BATTERY_SELECTOR)
+    c["VEHICLE_SELECTOR"] = _selector_to_dict(config.VEHICLE_SELECTOR)
+    c["STATION_SELECTOR"] = _selector_to_dict(config.STATION_SELECTOR)
+    c["STATION_TYPES"] = [dict(i.__dict__) for i in config.STATION_TYPES]
+    c["BATTERY_TYPES"] = [dict(i.__dict__) for i in config.BATTERY_TYPES]
+    c["VEHICLE_TYPES"] = [{key: value for key, value in i.__dict__.items() if key != "btype"} for i in config.VEHICLE_TYPES]
+    return json.loads(json.dumps(c))
+
+
+
+def config_fingerprint (config):
+    """ A hash of the canonical serialization of a configuration """
+    return hashlib.sha1(json.dumps(config_to_dict(config), sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+
+def run_fingerprint (config, seed):
+    """
+    The fingerprint of the results of a simulation: the configuration, the content 
+    of the graph file, and the seed (and the version of results, see RESULTS_VERSION).
+
+    NOTE: The stations are supposed to be the ones saved in the graph file.
+    """
+    key = {
+        "version": RESULTS_VERSION,
+        "config": {key: value for key, value in config_to_dict(config).items() if key not in NOT_RESULTS_FIELDS},
+        "graph": graph_hash(config.GRAPH_FILE),
+        "seed": seed,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
 
 
 
 def export_configuration (config, filename="config.json"):
     """ Method to export a configuration """
-    for v in config.VEHICLE_TYPES:
-        v.btype = None 
-    c = dict(config.__dict__)
-    c["BATTERY_SELECTOR"] = {"function": config.BATTERY_SELECTOR.func.__name__, "args": config.BATTERY_SELECTOR.keywords}
-    c["VEHICLE_SELECTOR"] = {"function": config.VEHICLE_SELECTOR.func.__name__, "args": config.VEHICLE_SELECTOR.keywords}
-    c["STATION_SELECTOR"] = {"function": config.STATION_SELECTOR.func.__name__, "args": config.STATION_SELECTOR.keywords}
     with open(filename, 'w') as file:
-        file.write(json.dumps(c, default=lambda i: i.__dict__, indent=4, sort_keys=True))
+        file.write(json.dumps(config_to_dict(config), indent=4, sort_keys=True))
 
 
 
 
-def read_configuration (filename):
-    """ Method to read a configuration exported to json """
-    with open(filename, 'r') as file:
-        d = json.load(file)
-    
+def config_from_dict (d):
+    """ Method to build a configuration from its serialization (see config_to_dict) """
+    d = copy.deepcopy(d)
     d["BATTERY_SELECTOR"] = functools.partial(OPTIONS[d["BATTERY_SELECTOR"]["function"]], **d["BATTERY_SELECTOR"]["args"])
     d["VEHICLE_SELECTOR"] = functools.partial(OPTIONS[d["VEHICLE_SELECTOR"]["function"]], **d["VEHICLE_SELECTOR"]["args"])
     d["STATION_SELECTOR"] = functools.partial(OPTIONS[d["STATION_SELECTOR"]["function"]], **d["STATION_SELECTOR"]["args"])
     
     for i in d["VEHICLE_TYPES"]:
-        del i["btype"]
+        i.pop("btype", None)
     
     d["STATION_TYPES"] = tuple(StationType(**i) for i in d["STATION_TYPES"])
     d["BATTERY_TYPES"] = tuple(BatteryType(**i) for i in d["BATTERY_TYPES"])
     d["VEHICLE_TYPES"] = tuple(VehicleType(**i, btypes=d["BATTERY_TYPES"]) for i in d["VEHICLE_TYPES"])
    
-    
-    return Config(**d)
\ No newline at end of file
+    return Config(**d)
+
+
+
+def read_configuration (filename):
+    """ Method to read a configuration exported to json """
+    with open(filename, 'r') as file:
+        return config_from_dict(json.load(file))
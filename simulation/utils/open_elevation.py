@@ -1,52 +1,396 @@
+import os
+import abc
+import json
+import time
+import urllib.parse
+import threading
+import concurrent.futures
+
+import numpy as np
 import requests
-import urllib
-import pandas as pd
+
+from simulation.utils.cache import file_hash
+
+
+
+
+class ElevationCache:
+
+    """
+    An instance of this class is an on-disk cache of the elevations returned by
+    the providers, keyed by provider (see key of providers, which includes their 
+    endpoint) and coordinates rounded to some decimals (5 decimals are about 1 m), 
+    so the same points are never requested twice.
+
+    NOTE: The cache is a JSON file written aside and then renamed, hence a crash
+    while saving never corrupts it.
+    """
+
+    # The version of the format of the file (files of other versions are ignored)
+    VERSION = 2
+
+    def __init__(self, filename, precision=5):
+        """
+        :param filename: The JSON file of the cache (created when saved).
+        :param precision: The decimals of the coordinates in the keys.
+
+        :attr hits: The number of elevations found.
+        :attr misses: The number of elevations not found.
+        """
+        self.filename = filename
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.elevations = {}
+        if os.path.exists(filename):
+            try:
+                with open(filename) as file:
+                    content = json.load(file)
+            except ValueError:
+                content = {}
+            if content.get("version") == self.VERSION and content.get("precision") == precision:
+                self.elevations = content["elevations"]
+
+
+    def key (self, latitude, longitude):
+        """ The key of a point """
+        return f"{latitude:.{self.precision}f},{longitude:.{self.precision}f}"
+
+
+    def get (self, provider, latitude, longitude):
+        """ The elevation of a point returned by a provider (its key), or None """
+        elevation = self.elevations.get(provider, {}).get(self.key(latitude, longitude))
+        if elevation is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return elevation
+
+
+    def put (self, provider, latitude, longitude, elevation):
+        """ 
+        Method to keep the elevation of a point returned by a provider (its key, see save).
+
+        NOTE: Missing elevations (None) are not kept, so they are requested again.
+        """
+        if elevation is None:
+            return
+        self.elevations.setdefault(provider, {})[self.key(latitude, longitude)] = float(elevation)
+
+
+    def save (self):
+        """ Method to write the cache on disk """
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.filename}.{os.getpid()}.tmp"
+        with open(tmp, "w") as file:
+            json.dump({"version": self.VERSION, "precision": self.precision, "elevations": self.elevations}, file)
+        os.replace(tmp, self.filename)
+
+
+    @property
+    def stats (self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+
+
+class _HTTPProvider(abc.ABC):
+
+    """
+    Base class of the providers answering through a web API: the coordinates are
+    split in batches, and the batches are requested concurrently by a bounded pool
+    of threads. A request failed for a transient error (i.e., a timeout, a connection
+    lost, or an error of the server) is retried after an exponential backoff; other
+    errors (e.g., a bad request, or an unexpected answer) are raised at once.
+    """
+
+    # The name of the provider (see PROVIDERS)
+    name = None
+    # True if the elevations are kept in the on-disk cache
+    cached = True
+
+    def __init__(self, url, batch_size=1, max_workers=4, timeout=20, retries=2, backoff=1.0):
+        """
+        :param url: The url of the API.
+        :param batch_size: The maximum number of points of a request.
+        :param max_workers: The maximum number of requests in flight.
+        :param timeout: The maximum time allowed for a request.
+        :param retries: The number of times a failed request is retried.
+        :param backoff: The waiting time (in seconds) before the first retry (doubled at each retry).
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.url})"
+
+
+    @property
+    def key (self):
+        """ The description of the provider used in the keys of caches """
+        return repr(self)
+
+
+    @abc.abstractmethod
+    def _request (self, session, batch):
+        """ The elevations of a batch of (latitude, longitude) """
+
+
+    @staticmethod
+    def _json (r):
+        """ The JSON of a response (an HTTPError is raised for any status but 200 and 201) """
+        if r.status_code != 200 and r.status_code != 201:
+            raise requests.HTTPError(f"{r.status_code} {r.reason} for {r.url}", response=r)
+        return r.json()
+
+
+    @staticmethod
+    def _transient (error):
+        """ True for the errors worth a retry: timeouts, connections lost, and errors of the server (5xx) """
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code >= 500
+        return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+    def __batch (self, session, batch):
+        """ Method to request a batch, with retries """
+        for attempt in range(self.retries + 1):
+            try:
+                return self._request(session, batch)
+            except Exception as error:
+                if attempt == self.retries or not self._transient(error):
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+
+    def lookup (self, coordinates):
+        """
+        Method to get the elevation of some points.
+
+        :param coordinates: A list of (latitude, longitude).
+        :return: The list of elevations (in the same order).
+        """
+        batches = [coordinates[i:i + self.batch_size] for i in range(0, len(coordinates), self.batch_size)]
+        # NOTE: A session for each thread keeps its connection open between requests.
+        sessions = {}
+
+        def request (batch):
+            if (session := sessions.get(threading.get_ident())) is None:
+                session = sessions[threading.get_ident()] = requests.Session()
+            return self.__batch(session, batch)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(self.max_workers) as pool:
+                return [elevation for elevations in pool.map(request, batches) for elevation in elevations]
+        finally:
+            for session in sessions.values():
+                session.close()
 
 
 
 
-def _get_elevation_open_elevation(latitude, longitude, timeout=20):
-    """ Method to get the elevation of a node, using the Open Elevation API """
-    
-    # Request with a timeout for slow responses
-    r = requests.get(f'https://api.open-elevation.com/api/v1/lookup?locations={latitude},{longitude}', timeout = timeout)
+class OpenElevation(_HTTPProvider):
 
-    # Only get the json response in case of 200 or 201
-    if r.status_code == 200 or r.status_code == 201:
-        #print(r.json())
-        elevation = pd.json_normalize(r.json(), 'results')['elevation'].values[0]
-    else: 
-        raise Exception(r)
-    return elevation
+    """ The Open Elevation API, which accepts many locations in a single POST """
 
+    name = "open_elevation"
 
+    def __init__(self, url="https://api.open-elevation.com/api/v1/lookup", batch_size=100, **kwargs):
+        super().__init__(url, batch_size=batch_size, **kwargs)
 
-def _get_elevation_nationalmap(latitude, longitude, timeout=20):
-    # USGS Elevation Point Query Service
-    url = r"https://nationalmap.gov/epqs/pqs.php?"
 
-    params = {
-        'output': 'json',
-        'x': longitude,
-        'y': latitude,
-        'units': 'Meters'
-    }
-    
-    r = requests.get( url + urllib.parse.urlencode(params), timeout=timeout )
-    if r.status_code == 200 or r.status_code == 201:
-        return r.json()['USGS_Elevation_Point_Query_Service']['Elevation_Query']['Elevation']
-    else:
-        raise Exception(r)
+    def _request (self, session, batch):
+        locations = [{"latitude": latitude, "longitude": longitude} for latitude, longitude in batch]
+        r = session.post(self.url, json={"locations": locations}, timeout=self.timeout)
 
+        # Only get the json response in case of 200 or 201
+        results = self._json(r)["results"]
+        if len(results) != len(batch):
+            raise Exception(f"{len(results)} elevations received for {len(batch)} locations.")
+        return [result["elevation"] for result in results]
 
 
 
-funcs = {
-    "open_elevation" : _get_elevation_open_elevation,
-    "nationalmap" : _get_elevation_nationalmap,
+
+class NationalMap(_HTTPProvider):
+
+    """ The USGS Elevation Point Query Service, which answers a point at a time """
+
+    name = "nationalmap"
+
+    def __init__(self, url="https://nationalmap.gov/epqs/pqs.php", **kwargs):
+        super().__init__(url, batch_size=1, **kwargs)
+
+
+    def _request (self, session, batch):
+        (latitude, longitude), = batch
+        params = {
+            'output': 'json',
+            'x': longitude,
+            'y': latitude,
+            'units': 'Meters'
+        }
+        r = session.get(self.url + "?" + urllib.parse.urlencode(params), timeout=self.timeout)
+        return [self._json(r)['USGS_Elevation_Point_Query_Service']['Elevation_Query']['Elevation']]
+
+
+
+
+class DEMProvider:
+
+    """
+    A local (offline) provider sampling a raster of elevations (DEM) saved as a
+    .npy file, next to a JSON file with its transform (see save_dem). The raster
+    is memory-mapped, so only the pages around the points are read.
+
+    The value of a point is the bilinear interpolation of the 4 nearest cells
+    (whose values refer to their centers); nodata cells give NaN.
+    """
+
+    name = "dem"
+    # NOTE: Sampling the raster is faster than reading the cache.
+    cached = False
+
+    def __init__(self, filename):
+        """
+        :param filename: The .npy file of the raster (rows from north to south).
+
+        :attr west, north: The coordinates of the north-west corner of the raster.
+        :attr dx, dy: The size of a cell in degrees of longitude and latitude.
+        """
+        self.filename = filename
+        with open(os.path.splitext(filename)[0] + ".json") as file:
+            transform = json.load(file)
+        self.west, self.north = transform["west"], transform["north"]
+        self.dx, self.dy = transform["dx"], transform["dy"]
+        self.nodata = transform.get("nodata")
+        self.raster = np.load(filename, mmap_mode="r")
+
+
+    def __repr__(self):
+        return f"DEMProvider({self.filename})"
+
+
+    @property
+    def key (self):
+        """ The description of the provider used in the keys of caches (the content of its files included) """
+        return f"DEMProvider({self.filename}, {file_hash(self.filename)}, {file_hash(os.path.splitext(self.filename)[0] + '.json')})"
+
+
+    def lookup (self, coordinates):
+        """
+        Method to get the elevation of some points.
+
+        :param coordinates: A list of (latitude, longitude).
+        :return: The list of elevations (in the same order).
+        """
+        if not coordinates:
+            return []
+        points = np.asarray(coordinates, dtype=np.float64)
+        rows, cols = self.raster.shape
+        # The position of points in cells (whose centers are at integer positions)
+        r = (self.north - points[:, 0]) / self.dy - 0.5
+        c = (points[:, 1] - self.west) / self.dx - 0.5
+        if np.any((r < -0.5) | (r > rows - 0.5) | (c < -0.5) | (c > cols - 0.5)):
+            raise Exception(f"{int(np.sum((r < -0.5) | (r > rows - 0.5) | (c < -0.5) | (c > cols - 0.5)))} points outside the raster {self.filename}.")
+
+        r, c = np.clip(r, 0, rows - 1), np.clip(c, 0, cols - 1)
+        r0, c0 = np.minimum(r.astype(np.int64), max(rows - 2, 0)), np.minimum(c.astype(np.int64), max(cols - 2, 0))
+        r1, c1 = np.minimum(r0 + 1, rows - 1), np.minimum(c0 + 1, cols - 1)
+        fr, fc = r - r0, c - c0
+
+        values = [np.asarray(self.raster[i, j], dtype=np.float64) for i, j in ((r0, c0), (r0, c1), (r1, c0), (r1, c1))]
+        if self.nodata is not None:
+            values = [np.where(v == self.nodata, np.nan, v) for v in values]
+        v00, v01, v10, v11 = values
+        elevations = (v00 * (1 - fc) + v01 * fc) * (1 - fr) + (v10 * (1 - fc) + v11 * fc) * fr
+        return elevations.tolist()
+
+
+
+
+def save_dem (filename, raster, west, north, dx, dy, nodata=None):
+    """
+    Method to save a raster of elevations for the DEMProvider.
+
+    :param filename: The .npy file of the raster (the transform is saved in a .json beside).
+    :param raster: A 2D array of elevations (rows from north to south).
+    :param west, north: The coordinates of the north-west corner of the raster.
+    :param dx, dy: The size of a cell in degrees of longitude and latitude.
+    :param nodata: The value of cells without data (if any).
+    """
+    np.save(filename, np.ascontiguousarray(raster), allow_pickle=False)
+    with open(os.path.splitext(filename)[0] + ".json", "w") as file:
+        json.dump({"west": west, "north": north, "dx": dx, "dy": dy, "nodata": nodata}, file)
+
+
+
+
+PROVIDERS = {
+    "open_elevation" : OpenElevation,
+    "nationalmap" : NationalMap,
 }
 
 
-def get_elevation(latitude, longitude, provider="open_elevation", timeout=20):
-    func = funcs[provider]
-    return func(latitude, longitude, timeout=timeout)
\ No newline at end of file
+def get_provider (provider="open_elevation", timeout=20):
+    """ The provider called <provider> (see PROVIDERS), or the provider itself if it is not a name """
+    if isinstance(provider, str):
+        return PROVIDERS[provider](timeout=timeout)
+    return provider
+
+
+
+def provider_key (provider):
+    """ The description of a provider (its name, see PROVIDERS, or the provider) used in the keys of caches """
+    return provider if isinstance(provider, str) else provider.key
+
+
+
+def get_elevations (coordinates, provider="open_elevation", timeout=20, cache=None, chunk_size=10000):
+    """
+    Method to get the elevation of many points: the ones in the cache are not
+    requested again, and the others are requested in chunks (the cache is saved
+    after each chunk, so an interrupted lookup does not start from scratch).
+
+    :param coordinates: A list of (latitude, longitude).
+    :param provider: The name of a provider (see PROVIDERS) or a provider (e.g., a DEMProvider).
+    :param timeout: The maximum time allowed for a request.
+    :param cache: The ElevationCache, or the filename of its JSON file (None to disable).
+    :param chunk_size: The number of points requested between two savings of the cache.
+    :return: The list of elevations (in the same order), None for the points without elevation.
+    """
+    provider = get_provider(provider, timeout)
+    if isinstance(cache, str):
+        cache = ElevationCache(cache)
+    if cache is None or not provider.cached:
+        return provider.lookup(list(coordinates))
+
+    elevations = [cache.get(provider.key, latitude, longitude) for latitude, longitude in coordinates]
+    # NOTE: Points equal once rounded are requested once.
+    missing = {}
+    for i, (latitude, longitude) in enumerate(coordinates):
+        if elevations[i] is None:
+            missing.setdefault(cache.key(latitude, longitude), []).append(i)
+
+    keys = list(missing)
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        points = [coordinates[missing[key][0]] for key in chunk]
+        for key, (latitude, longitude), elevation in zip(chunk, points, provider.lookup(points)):
+            cache.put(provider.key, latitude, longitude, elevation)
+            for i in missing[key]:
+                elevations[i] = elevation
+        cache.save()
+    return elevations
+
+
+
+def get_elevation (latitude, longitude, provider="open_elevation", timeout=20):
+    """ Method to get the elevation of a single point (see get_elevations) """
+    return get_elevations([(latitude, longitude)], provider, timeout)[0]
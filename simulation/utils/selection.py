@@ -20,6 +20,35 @@ def biased_randomised_selection(options, beta=0.4):
 
 
 
+def selection_probabilities(selector, n):
+    """
+    The probability each option has to be picked by a selector, used to make 
+    the same selection in blocks (e.g., with numpy).
+
+    For the biased randomised selection int(log(u, 1 - beta)) is geometric, and 
+    the probability of the option k is:
+
+                beta * (1 - beta)^k / (1 - (1 - beta)^n)
+
+
+    :param selector: The selection function (a function of OPTIONS, or a partial of it).
+    :param n: The number of options.
+    :return: A list of n probabilities, or None if the selector is not known.
+    """
+    func = getattr(selector, "func", selector)
+    keywords = getattr(selector, "keywords", None) or {}
+
+    if func == biased_randomised_selection:
+        beta = keywords.get("beta", 0.4)
+        return [beta * (1.0 - beta)**k / (1.0 - (1.0 - beta)**n) for k in range(n)]
+
+    if func == random.choice:
+        return [1.0 / n] * n
+
+    return None
+
+
+
 OPTIONS = {
     "biased_randomised_selection" : biased_randomised_selection,
     "choice" : random.choice
@@ -0,0 +1,109 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+
+
+class SharedArrays:
+
+    """
+    An instance of this class keeps some numpy arrays in a single block of
+    shared memory, so that many processes can read them without any copy.
+
+    The process that creates the block owns it (and must unlink it when the other
+    processes are concluded); the others attach to it through its spec, which is
+    small and can be passed to a new process.
+
+    NOTE: Arrays of processes that attach to the block are read-only.
+    """
+
+    # The alignment in bytes of each array in the block
+    ALIGNMENT = 64
+
+
+    def __init__(self, shm, layout, meta, owner):
+        """
+        :param shm: The SharedMemory block.
+        :param layout: For each array, its (name, dtype, shape, offset) in the block.
+        :param meta: A small (picklable) header shared with the arrays.
+        :param owner: True for the process that created the block.
+
+        :attr arrays: A dict of numpy arrays whose buffer is the block.
+        """
+        self.shm = shm
+        self.layout = layout
+        self.meta = meta
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, dtype, shape, offset in layout
+        }
+        if not owner:
+            for array in self.arrays.values():
+                array.flags.writeable = False
+
+
+    @classmethod
+    def create (cls, arrays, meta=None):
+        """
+        Method to copy some arrays into a new block of shared memory.
+
+        :param arrays: A dict of numpy arrays (object arrays are not allowed).
+        :param meta: A small (picklable) header shared with the arrays.
+        :return: A SharedArrays instance owning the block.
+        """
+        layout, size = [], 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype.hasobject:
+                raise Exception(f"The array {name} cannot be shared: object arrays are not allowed.")
+            size = -(-size // cls.ALIGNMENT) * cls.ALIGNMENT
+            layout.append((name, array.dtype.str, array.shape, size))
+            size += array.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        shared = cls(shm, tuple(layout), meta, owner=True)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+
+    @classmethod
+    def attach (cls, spec):
+        """
+        Method to attach to a block created by another process.
+
+        :param spec: The spec of the block (see spec).
+        :return: A SharedArrays instance.
+        """
+        name, layout, meta = spec
+        # NOTE: Processes started by multiprocessing share the resource tracker of their
+        # parent, so the block is not removed when a worker is concluded.
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, layout, meta, owner=False)
+
+
+    @property
+    def spec (self):
+        """ The (picklable) description used by other processes to attach to the block """
+        return self.shm.name, self.layout, self.meta
+
+
+    @property
+    def nbytes (self):
+        """ The size of the block in bytes """
+        return self.shm.size
+
+
+    def close (self):
+        """ Method to detach from the block (arrays cannot be used anymore) """
+        self.arrays = {}
+        self.shm.close()
+
+
+    def unlink (self):
+        """ Method to close and remove the block (only by its owner) """
+        self.close()
+        if self.owner:
+            self.shm.unlink()
@@ -1,4 +1,5 @@
 import math 
+import numpy as np 
 
 
 
@@ -159,3 +160,96 @@ def euclidean_distance (source, target, G):
     return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
 
 
+
+
+
+# ------------------------------------------------------------------------------------------------------------
+# Variants of the previous utilities working on the CSR view of the graph (see simulation.csr.CSRGraph).
+# Paths are sequences of integer node ids and edges are identified by their integer id.
+# The dict-based utilities above are kept as reference.
+# ------------------------------------------------------------------------------------------------------------
+
+def csr_consumption (csr, edge, vehicle):
+    """ 
+    Method to get the energy consumed by a vehicle to run 
+    a given edge of the CSR view.
+
+    NOTE: The consumption is read from the table of the vehicle type
+    (see edges_consumption and CSRGraph.energy_costs).
+    
+    :param csr: The CSR view of the graph.
+    :param edge: The edge id. 
+    :param vehicle: The vehicle.
+    :return: The consumption in kWh.
+    """
+    return csr.energy_costs(vehicle.vtype, aslist=True)[edge]
+
+
+
+def edges_consumption (csr, vtype):
+    """ 
+    Vectorized version of consumption: it calculates the energy consumed 
+    by a vehicle type to run each edge of the CSR view.
+    
+    :param csr: The CSR view of the graph.
+    :param vtype: The vehicle type.
+    :return: A numpy array with the consumption in kWh indexed by edge id.
+    """
+    slope_factor = np.where(csr.grade >= 0, vtype.positive_slope_rate, vtype.negative_slope_rate)
+    grades = np.degrees(np.arctan(csr.grade_abs))
+    return vtype.consumption * (1 + np.maximum(-1, slope_factor * grades)) * csr.length / 1000
+
+
+
+def csr_path_consumption (csr, path, vehicle, check=True):
+    """
+    Method to calculate the energy consumed by a vehicle
+    covering a path of integer nodes.
+
+    :param csr: The CSR view of the graph.
+    :param path: The path to cover.
+    :param vehicle: The vehicle.
+    :param check: If True the vehicle must be at the beginning of the path.
+    :return: The consumption in kWh.
+    """
+    if check and csr.index[vehicle.position] != path[0]:
+        raise Exception("The vehicle is not on the path.")
+    return float(csr.energy_costs(vehicle.vtype)[csr.path_edges(path)].sum())
+
+
+
+def csr_path_travel_time (csr, path, vehicle):
+    """ 
+    Method used to calculate the time a vehicle requires 
+    to cover a path of integer nodes.
+
+    NOTE: Uniform linear motion is considered.
+    
+    :param csr: The CSR view of the graph.
+    :param path: The path to cover.
+    :param vehicle: The vehicle.
+    :return: The travel time in seconds [s].
+    """
+    if csr.index[vehicle.position] != path[0]:
+        raise Exception("The vehicle is not on the path.")
+    return csr_path_length(csr, path) / vehicle.speed
+
+
+
+def csr_path_length (csr, path):
+    """ Method to calculate the length of the given path of integer nodes in meters [m] """
+    return float(csr.length[csr.path_edges(path)].sum())
+
+
+
+def csr_euclidean_distance (source, target, csr):
+    """ 
+    The distance as the crow flies between two integer nodes.
+    
+    :param source: The starting node.
+    :param target: The ending node.
+    :param csr: The CSR view of the graph the nodes own to.
+    :return: The distance.
+    """
+    x, y = csr.column("x"), csr.column("y")
+    return math.sqrt((x[source] - x[target])**2 + (y[source] - y[target])**2)
@@ -1,2 +1,3 @@
 from .vehicle import VehicleType, Vehicle
-from .distributor import Distributor
\ No newline at end of file
+from .distributor import Distributor
+from .fleet import Fleet
\ No newline at end of file
@@ -8,15 +8,23 @@ class Distributor:
     In future, for a more accurate simulation, they might be electric vehicles
     as others, and they might have alimited capacity.
     """
+
+    __slots__ = ("env", "speed", "position", "origin", "destination", "moved", "distance")
+
     def __init__(self, env, speed, origin, destination=None):
         """
         :param env: The simulation environment
         :param speed: The vehicle speed 
         :param origin: The node the vehicle starts from 
         :param detination: The node where the vehicle is going.        
+
+        :attr moved: The number of batteries redistributed so far.
+        :attr distance: The distance covered so far in meters.
         """
         self.env = env 
         self.speed = speed 
         self.position = origin 
         self.origin = origin 
         self.destination = destination 
+        self.moved = 0
+        self.distance = 0 
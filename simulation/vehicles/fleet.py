@@ -0,0 +1,62 @@
+import collections
+
+from .vehicle import Vehicle
+
+
+
+
+class Fleet:
+
+    """
+    An instance of this class is the pool of the vehicles of a simulation.
+
+    When a trip is concluded its vehicle is released, and it is recycled (with its
+    batteries) for the next trip of the same vehicle type, so the objects created
+    are bounded by the number of vehicles travelling at the same time, instead of
+    growing with the number of trips.
+
+    NOTE: A recycled vehicle draws the level of its batteries as a new one would,
+    so the random sequence (and the results) do not change. The level is drawn from 
+    the generator passed to acquire, so a trip does not depend on which vehicle 
+    (new or recycled) is assigned to it.
+    """
+
+    def __init__(self, env, speed):
+        """
+        :param env: The simulation environment.
+        :param speed: The average speed of vehicles.
+
+        :attr created: The number of vehicles created.
+        :attr recycled: The number of times a vehicle has been recycled.
+        """
+        self.env = env
+        self.speed = speed
+        self.created = 0
+        self.recycled = 0
+        self.__free = collections.defaultdict(list)
+
+
+    def acquire (self, vtype, origin, destination, rng=None):
+        """ 
+        A vehicle of a given type for a trip from the origin to the destination 
+
+        :param rng: The random.Random drawing the level of batteries (the random module by default).
+        """
+        if (free := self.__free[vtype]):
+            vehicle = free.pop()
+            vehicle.reset(origin, destination, rng=rng)
+            self.recycled += 1
+            return vehicle
+        self.created += 1
+        return Vehicle(self.env, vtype=vtype, speed=self.speed, origin=origin, destination=destination, rng=rng)
+
+
+    def release (self, vehicle):
+        """ Method to return a vehicle whose trip is concluded (it must not be used anymore) """
+        self.__free[vehicle.vtype].append(vehicle)
+
+
+    @property
+    def stats (self):
+        """ The vehicles created and recycled """
+        return {"created": self.created, "recycled": self.recycled}
@@ -35,19 +35,32 @@ class VehicleType:
 
 class Vehicle:
 
-    """ An instance of this class represents a single vehicle """
+    """ 
+    An instance of this class represents a single vehicle.
 
-    def __init__(self, env, vtype, speed, origin, destination):
+    NOTE: The attributes of the type used during trips (e.g., consumption, slope rates) 
+    are copied once when the vehicle is created instead of being looked up at each access,
+    and vehicles can be recycled for new trips (see Fleet).
+    """
+
+    __slots__ = (
+        "env", "vtype", "batteries", "speed", "origin", "destination", "position",
+        "n_batteries", "btype", "capacity", "consumption", "positive_slope_rate", "negative_slope_rate",
+    )
+
+    def __init__(self, env, vtype, speed, origin, destination, rng=None):
         """
         :param env: The simulation environment 
         :param vtype: The type of vehicle 
         :param speed: The average speed of the vehicle 
         :param origin: The node where the vehicle starts its trip.
         :param destination: The node where the vehicle ends its trip.
+        :param rng: The random.Random drawing the level of batteries (the random module by default).
         """
+        rng = rng or random
         self.env = env 
         self.vtype = vtype 
-        self.batteries = tuple(Battery(vtype.btype, level=random.random() * vtype.btype.capacity) 
+        self.batteries = tuple(Battery(vtype.btype, level=rng.random() * vtype.btype.capacity) 
                             for _ in range(vtype.n_batteries))
         self.speed = speed 
         
@@ -55,33 +68,33 @@ class Vehicle:
         self.destination = destination 
         self.position = origin 
 
+        self.n_batteries = vtype.n_batteries
+        self.btype = vtype.btype
+        self.capacity = sum(i.capacity for i in self.batteries)
+        self.consumption = vtype.consumption
+        self.positive_slope_rate = vtype.positive_slope_rate
+        self.negative_slope_rate = vtype.negative_slope_rate
+
     @property 
     def level (self):
         return sum(i.level for i in self.batteries)
 
-    @property 
-    def capacity (self):
-        return sum(i.capacity for i in self.batteries)
-
-    @property 
-    def n_batteries (self):
-        return self.vtype.n_batteries
 
-    @property 
-    def btype (self):
-        return self.batteries[0].btype
-
-    @property 
-    def consumption (self):
-        return self.vtype.consumption
-
-    @property 
-    def positive_slope_rate (self):
-        return self.vtype.positive_slope_rate
+    def reset (self, origin, destination, rng=None):
+        """
+        Method to recycle the vehicle for a new trip: its batteries are 
+        reset to a random level (as for a new vehicle).
 
-    @property 
-    def negative_slope_rate (self):
-        return self.vtype.negative_slope_rate
+        :param origin: The node where the vehicle starts its trip.
+        :param destination: The node where the vehicle ends its trip.
+        :param rng: The random.Random drawing the level of batteries (the random module by default).
+        """
+        rng = rng or random
+        for battery in self.batteries:
+            battery.reset(rng.random() * battery.capacity)
+        self.origin = origin 
+        self.destination = destination 
+        self.position = origin 
 
 
     def consume (self, energy):
@@ -93,9 +106,6 @@ class Vehicle:
 
         :param energy: The energy consumed in kWh.
         """
-        uenergy = energy / len(self.batteries)
+        uenergy = energy / self.n_batteries
         for b in self.batteries:
             b.level = max(0, b.level - uenergy)
-
-        
-    
\ No newline at end of file
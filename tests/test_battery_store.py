@@ -0,0 +1,119 @@
+
+from simulation.stations.store import BatteryStore
+from simulation.environment import CountingEnvironment
+from simulation.batteries import Battery, BatteryType
+from simulation.utils.technical import charge_time
+
+
+def make_store(capacity=2, power=10, lazy=False):
+    env = CountingEnvironment()
+    return env, BatteryStore(env, capacity=capacity, power=power, lazy=lazy), BatteryType(0, 100)
+
+
+def test_best_battery():
+    env, store, btype = make_store(capacity=3)
+    batteries = [Battery(btype, level=10), Battery(btype, level=80), Battery(btype, level=50)]
+    for i in batteries:
+        store.put(i)
+    assert store.level == 3 and store.incharge == 3 and store.charged == 0
+
+    # The battery with the lowest expected full-charge time is retrieved first
+    request = store.get(waitcharge=False)
+    env.run(until=1)
+    assert request.value is batteries[1]
+    assert store.level == 2 and store.incharge == 2
+
+
+def test_waitcharge():
+    env, store, btype = make_store(capacity=1)
+    battery, other = Battery(btype, level=10), Battery(btype, level=10)
+    duration = charge_time(battery, store.power)
+    store.put(battery)
+    put = store.put(other)
+    assert store.ontheside and not put.triggered
+
+    # The reserved battery keeps its place until it is charged
+    request = store.get(waitcharge=True)
+    env.run(until=duration - 1)
+    assert not request.triggered and len(store.ontheside) == 1
+
+    env.run(until=duration + 1)
+    assert request.value is battery and battery.charged
+    assert put.triggered and not store.ontheside
+    assert store.level == 1 and store.incharge == 1 and other.start_charging == duration
+
+    # Fully charged batteries are counted as charged
+    env.run(until=2 * duration + 1)
+    assert store.incharge == 0 and store.charged == 1
+
+
+def test_interrupt():
+    env, store, btype = make_store(capacity=1)
+    battery = Battery(btype, level=10)
+    env.run(until=100)
+    store.put(battery)
+    env.run(until=100 + 3600)
+    request = store.get(waitcharge=False)
+    env.run(until=100 + 3601)
+    assert request.value is battery and battery.level == 20
+    assert store.level == 0 and store.incharge == 0 and store.charged == 0
+
+    # The end of the interrupted charge is ignored
+    env.run()
+    assert battery.level == 20
+
+
+def test_pending_get():
+    env, store, btype = make_store(capacity=2)
+    request = store.get(waitcharge=False)
+    env.run(until=10)
+    assert not request.triggered
+    battery = Battery(btype)
+    store.put(battery)
+    env.run(until=11)
+    assert request.value is battery and store.level == 0 and store.charged == 0
+
+
+def test_take_ontheside():
+    env, store, btype = make_store(capacity=1)
+    batteries = [Battery(btype, level=10) for _ in range(3)]
+    for i in batteries:
+        store.put(i)
+    assert store.take_ontheside() == batteries[1:]
+    assert not store.ontheside and store.level == 1
+
+
+
+def test_lazy():
+    results = {}
+    for lazy in (False, True):
+        env, store, btype = make_store(capacity=3, lazy=lazy)
+        batteries = [Battery(btype, level=level) for level in (10, 60, 90)]
+        for i in batteries:
+            store.put(i)
+        env.run(until=3600 * 5)
+        counts = (store.incharge, store.charged)
+        retrieved = [store.get(waitcharge=False), store.get(waitcharge=True), store.get(waitcharge=True)]
+        env.run()
+        results[lazy] = (counts, [(batteries.index(i.value), i.value.level) for i in retrieved], env.now, env.n_events)
+
+    # Same batteries, levels, and times, with fewer events scheduled
+    assert results[False][:3] == results[True][:3]
+    assert results[False][0] == (1, 2)
+    assert results[True][3] < results[False][3]
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_best_battery,
+        test_waitcharge,
+        test_interrupt,
+        test_pending_get,
+        test_take_ontheside,
+        test_lazy,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -82,7 +82,7 @@ def test3 (env, charger, batteries):
         env.process(putter(env, charger, i))
         
     yield env.timeout(10)
-    print(charger.put_queue)
+    print(charger.ontheside)
    
     #yield env.timeout(0)
     print(charger.items)
@@ -0,0 +1,89 @@
+import math
+import simpy
+import random
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.vehicles import Vehicle
+from simulation.routing import ConstrainedPlanner, Router
+from simulation.exceptions import SimulationNoPath
+from simulation.utils.algorithms import csr_dijkstra, csr_define_path
+from simulation.utils.technical import csr_path_length
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1)
+    env = simpy.Environment()
+    return env, config, Graph.from_file(env, config, stations=True)
+
+
+def test_legs():
+    env, config, G = load_graph()
+    csr = G.csr
+    planner = ConstrainedPlanner(csr, router=Router(csr), heuristic=G.landmarks.heuristic)
+    rnd = random.Random(0)
+    for _ in range(200):
+        source, target = rnd.randrange(csr.n_nodes), rnd.randrange(csr.n_nodes)
+        dist = csr_dijkstra(csr, source)[target]
+        if source == target or math.isinf(dist):
+            continue
+
+        vehicle = Vehicle(env, vtype=config.VEHICLE_TYPES[0], speed=config.VEHICLES_SPEED, origin=csr.node_id(source), destination=csr.node_id(target))
+        costs = csr.energy_costs(vehicle.vtype)
+
+        # With plenty of energy the leg is the shortest path to the target
+        path = planner.plan(source, target, vehicle, level=1000)
+        assert path[0] == source and path[-1] == target
+        assert math.isclose(csr_path_length(csr, path), dist)
+
+        # With little energy the leg is feasible and ends at the target or at a station
+        level = 0.3 * float(costs[csr.path_edges(path)].sum())
+        try:
+            path = planner.plan(source, target, vehicle, level=level)
+        except SimulationNoPath:
+            continue
+        assert float(costs[csr.path_edges(path)].sum()) <= level + 1e-9
+        assert path[-1] == target or csr.is_station[path[-1]]
+
+
+
+def test_zero_heuristic():
+    env, config, G = load_graph()
+    csr = G.csr
+    # A lower bound that is 0 everywhere, as ALT far from its landmarks
+    planner = ConstrainedPlanner(csr, router=Router(csr), heuristic=lambda node, target: 0.0)
+    rnd, fallbacks = random.Random(0), 0
+    for _ in range(300):
+        source, target = rnd.randrange(csr.n_nodes), rnd.randrange(csr.n_nodes)
+        if source == target or math.isinf(csr_dijkstra(csr, source)[target]):
+            continue
+        vehicle = Vehicle(env, vtype=config.VEHICLE_TYPES[0], speed=config.VEHICLES_SPEED, origin=csr.node_id(source), destination=csr.node_id(target))
+        level = rnd.uniform(0.05, 1.0)
+        try:
+            baseline = csr_define_path(csr, source, target, vehicle, level=level)
+        except SimulationNoPath:
+            continue
+
+        # Whenever the baseline reaches a station, the planner reaches one too
+        path = planner.plan(source, target, vehicle, level=level)
+        assert path[-1] == target or csr.is_station[path[-1]]
+        if baseline[-1] != target:
+            fallbacks += 1
+            assert path[-1] != source
+    assert fallbacks > 0
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_legs,
+        test_zero_heuristic,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,63 @@
+import math
+import simpy
+import random
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.routing import Router
+from simulation.utils.algorithms import csr_dijkstra
+from simulation.utils.technical import csr_path_length
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, ROUTER="ch")
+    return Graph.from_file(simpy.Environment(), config, stations=True)
+
+
+def test_against_oracle():
+    G = load_graph()
+    csr, hierarchy = G.csr, G.hierarchy
+    report = hierarchy.report()
+    assert report["shortcuts"] == hierarchy.shortcuts and report["shortcuts"] >= 0
+    assert report["preprocessing_time"] >= 0
+    for source in range(csr.n_nodes):
+        dist = csr_dijkstra(csr, source)
+        for target in range(0, csr.n_nodes, 3):
+            path = hierarchy.shortest_path(source, target)
+            if math.isinf(dist[target]):
+                assert path == ()
+                continue
+            assert path[0] == source and path[-1] == target
+            # The path is made of original edges and it is the shortest one
+            assert math.isclose(csr_path_length(csr, path), dist[target], abs_tol=1e-6)
+            assert math.isclose(hierarchy.distance(source, target), dist[target], abs_tol=1e-6)
+
+
+def test_router_backends():
+    G = load_graph()
+    csr = G.csr
+    astar = Router(csr, backend="astar", heuristic=G.landmarks.heuristic)
+    ch = Router(csr, backend="ch", hierarchy=G.hierarchy)
+    rnd = random.Random(0)
+    for _ in range(200):
+        source, target = rnd.randrange(csr.n_nodes), rnd.randrange(csr.n_nodes)
+        a, c = astar.search(source, target), ch.search(source, target)
+        assert bool(a) == bool(c)
+        if a:
+            assert math.isclose(csr_path_length(csr, a), csr_path_length(csr, c), abs_tol=1e-6)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_against_oracle,
+        test_router_backends,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
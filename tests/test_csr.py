@@ -0,0 +1,97 @@
+import simpy
+import random
+import functools
+import math
+import networkx as nx
+
+from networkx.algorithms.shortest_paths import astar
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.vehicles import Vehicle
+from simulation.utils.technical import consumption, path_consumption, path_length, path_travel_time, euclidean_distance
+from simulation.utils.technical import csr_path_consumption, csr_path_length, csr_path_travel_time, csr_euclidean_distance
+from simulation.utils.algorithms import csr_astar_path
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE)
+    env = simpy.Environment()
+    G = Graph.from_file(env, config, stations=True)
+    return env, config, G
+
+
+def random_pairs(G, n=50):
+    nodes = tuple(G.nodes)
+    return [(random.choice(nodes), random.choice(nodes)) for _ in range(n)]
+
+
+def test_structure():
+    env, config, G = load_graph()
+    csr = G.csr
+    assert csr.n_nodes == len(G.nodes)
+    assert csr.offsets[-1] == csr.n_edges
+    for u, v in zip(csr.sources.tolist(), csr.targets.tolist()):
+        assert G.has_edge(csr.node_id(u), csr.node_id(v))
+    assert not csr.length.flags.writeable
+
+
+def test_paths():
+    env, config, G = load_graph()
+    csr = G.csr
+    for source, target in random_pairs(G):
+        try:
+            ref = astar.astar_path(G, source, target, heuristic=functools.partial(euclidean_distance, G=G), weight="length")
+        except Exception:
+            continue
+        path = csr_astar_path(csr, csr.index[source], csr.index[target], heuristic=functools.partial(csr_euclidean_distance, csr=csr))
+        assert math.isclose(path_length(G, ref), csr_path_length(csr, path))
+
+        vehicle = Vehicle(env, vtype=config.VEHICLE_TYPES[0], speed=config.VEHICLES_SPEED, origin=source, destination=target)
+        assert math.isclose(path_consumption(G, ref, vehicle), csr_path_consumption(csr, csr.from_nodes(ref), vehicle))
+        assert math.isclose(path_travel_time(G, ref, vehicle), csr_path_travel_time(csr, csr.from_nodes(ref), vehicle))
+
+
+def test_energy_costs():
+    env, config, G = load_graph()
+    csr = G.csr
+    for vtype in config.VEHICLE_TYPES:
+        vehicle = Vehicle(env, vtype=vtype, speed=config.VEHICLES_SPEED, origin=csr.node_id(0), destination=csr.node_id(1))
+        costs = csr.energy_costs(vtype)
+        assert costs is csr.energy_costs(vtype)
+        for e, (u, v) in enumerate(zip(csr.sources.tolist(), csr.targets.tolist())):
+            assert math.isclose(costs[e], consumption(G[csr.node_id(u)][csr.node_id(v)][0], vehicle))
+
+
+
+def test_components():
+    env, config, G = load_graph()
+    csr = G.csr
+    components = csr.column("components")
+    for scc in nx.strongly_connected_components(G):
+        assert len({components[csr.index[i]] for i in scc}) == 1
+    assert len(set(components)) == nx.number_strongly_connected_components(G)
+
+    largest = max(nx.strongly_connected_components(G), key=len)
+    assert components[csr.index[next(iter(largest))]] == csr.largest_component
+
+    for source, target in random_pairs(G, n=200):
+        assert csr.reachable(csr.index[source], csr.index[target]) == nx.has_path(G, source, target)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_structure,
+        test_paths,
+        test_energy_costs,
+        test_components,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,94 @@
+import simpy
+import random
+import functools
+
+import numpy as np
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.demand import AliasTable, DemandSampler
+from simulation.runner import SimulationRunner
+from simulation.streams import RandomStreams
+from simulation.utils.selection import biased_randomised_selection, selection_probabilities
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE)
+    env = simpy.Environment()
+    return env, config, Graph.from_file(env, config, stations=True)
+
+
+def test_alias_table():
+    weights = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+    table = AliasTable(weights)
+    samples = table.sample(np.random.default_rng(0), 200_000)
+    freq = np.bincount(samples, minlength=len(weights)) / len(samples)
+    assert freq[0] == 0
+    assert np.allclose(freq, weights / weights.sum(), atol=0.01)
+
+
+def test_selection_probabilities():
+    options = tuple(range(4))
+    selector = functools.partial(biased_randomised_selection, beta=0.4)
+    probs = selection_probabilities(selector, len(options))
+    assert abs(sum(probs) - 1) < 1e-9
+
+    random.seed(0)
+    counts = [0] * len(options)
+    for _ in range(100_000):
+        counts[selector(options)] += 1
+    assert np.allclose(np.array(counts) / 100_000, probs, atol=0.01)
+
+    assert selection_probabilities(functools.partial(random.choice), 4) == [0.25] * 4
+    assert selection_probabilities(lambda options: options[0], 4) is None
+
+
+def test_sampler():
+    env, config, G = load_graph()
+    csr = G.csr
+
+    # The same seed gives the same trips
+    first = DemandSampler(csr, config.VEHICLE_TYPES, config.VEHICLE_SELECTOR, seed=1, block_size=64).draw_many(200)
+    second = DemandSampler(csr, config.VEHICLE_TYPES, config.VEHICLE_SELECTOR, seed=1, block_size=64).draw_many(200)
+    assert first == second
+    for origin, destination, vtype in first:
+        assert origin in G.nodes and destination in G.nodes and vtype in config.VEHICLE_TYPES
+
+    # Masked nodes are never drawn
+    mask = np.zeros(csr.n_nodes, dtype=bool)
+    mask[:10] = True
+    allowed = set(csr.nodes[:10].tolist())
+    sampler = DemandSampler(csr, config.VEHICLE_TYPES, config.VEHICLE_SELECTOR, seed=1, mask=mask)
+    for origin, destination, _ in sampler.draw_many(500):
+        assert origin in allowed and destination in allowed
+    # The trips filtered by the mask are counted
+    assert sampler.rejected > 500
+
+
+
+def test_largest_scc_filter():
+    env, config, G = load_graph()
+    config = Config(GRAPH_FILE=GRAPH_FILE, SIM_TIME=2000, N_VEHICLES=50, SHARING=False, OD_FILTER="largest_scc")
+    sim = SimulationRunner(env, config, G, streams=RandomStreams(0))
+    sim()
+    # The trips out of the largest component are never started, but they are reported
+    assert sim.filtered_trips > 0
+    assert sim.nx_failed_trips >= sim.filtered_trips and sim.total_trips > sim.filtered_trips
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_alias_table,
+        test_selection_probabilities,
+        test_sampler,
+        test_largest_scc_filter,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
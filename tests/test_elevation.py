@@ -0,0 +1,170 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import http.server
+
+import numpy as np
+import simpy
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.utils.open_elevation import OpenElevation, NationalMap, DEMProvider, ElevationCache, get_elevations, save_dem
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    """ 
+    A local stub of the elevation APIs: the elevation of a point is latitude + longitude,
+    and points at latitude 0 have no elevation.
+    """
+
+    requests, failures, status, truncate = [], 0, 500, False
+
+    def do_POST(self):
+        locations = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["locations"]
+        StubHandler.requests.append(len(locations))
+        if StubHandler.failures > 0:
+            StubHandler.failures -= 1
+            return self.__reply(StubHandler.status, {})
+        results = [{**i, "elevation": i["latitude"] + i["longitude"] if i["latitude"] != 0 else None} for i in locations]
+        self.__reply(200, {"results": results[:-1] if StubHandler.truncate else results})
+
+    def do_GET(self):
+        query = dict(i.split("=") for i in self.path.split("?")[1].split("&"))
+        StubHandler.requests.append(1)
+        elevation = float(query["y"]) + float(query["x"])
+        self.__reply(200, {"USGS_Elevation_Point_Query_Service": {"Elevation_Query": {"Elevation": elevation}}})
+
+    def __reply(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_open_elevation():
+    server, url = _server()
+    directory = tempfile.mkdtemp()
+    try:
+        StubHandler.requests = []
+        points = [(45.0 + i * 1e-3, 7.0 + i * 1e-3) for i in range(250)] + [(45.0, 7.0)]
+        provider = OpenElevation(url + "/api/v1/lookup", batch_size=100, max_workers=3)
+        elevations = get_elevations(points, provider, cache=os.path.join(directory, "elevations.json"))
+        assert np.allclose(elevations, [lat + lon for lat, lon in points])
+        # Points equal once rounded are requested once, in batches
+        assert sorted(StubHandler.requests) == [50, 100, 100]
+
+        # Elevations in the cache are not requested again (rounded to 5 decimals)
+        StubHandler.requests = []
+        cache = ElevationCache(os.path.join(directory, "elevations.json"))
+        again = get_elevations([(lat + 1e-7, lon) for lat, lon in points], provider, cache=cache)
+        assert again == elevations and StubHandler.requests == [] and cache.hits == len(points)
+
+        # Failed requests are retried
+        StubHandler.requests, StubHandler.failures = [], 1
+        assert get_elevations([(1.0, 2.0)], OpenElevation(url, backoff=0)) == [3.0]
+        assert len(StubHandler.requests) == 2
+
+        # Bad requests and unexpected answers are not retried
+        for status, failures, truncate in ((400, 1, False), (500, 0, True)):
+            StubHandler.requests, StubHandler.failures, StubHandler.status, StubHandler.truncate = [], failures, status, truncate
+            try:
+                get_elevations([(1.0, 2.0), (3.0, 4.0)], OpenElevation(url, backoff=0))
+                assert False
+            except Exception as ex:
+                assert str(status if failures else "elevations received") in str(ex)
+            assert len(StubHandler.requests) == 1
+        StubHandler.status, StubHandler.truncate = 500, False
+
+        # Missing elevations are not kept in the cache (and are requested again)
+        StubHandler.requests = []
+        cache = ElevationCache(os.path.join(directory, "missing.json"))
+        assert get_elevations([(0.0, 2.0), (1.0, 2.0)], provider, cache=cache) == [None, 3.0]
+        assert get_elevations([(0.0, 2.0), (1.0, 2.0)], provider, cache=cache) == [None, 3.0]
+        assert StubHandler.requests == [2, 1]
+
+        # Providers with the same name and different endpoints do not share their elevations
+        StubHandler.requests = []
+        cache = ElevationCache(os.path.join(directory, "endpoints.json"))
+        for endpoint in ("/a", "/b", "/a"):
+            assert get_elevations([(1.0, 2.0)], OpenElevation(url + endpoint), cache=cache) == [3.0]
+        assert StubHandler.requests == [1, 1] and len(cache.elevations) == 2
+
+        # Point queries are concurrent too
+        StubHandler.requests = []
+        assert get_elevations(points[:10], NationalMap(url + "/epqs/pqs.php", max_workers=4)) == elevations[:10]
+        assert len(StubHandler.requests) == 10
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
+
+
+def test_dem():
+    directory = tempfile.mkdtemp()
+    try:
+        # A plane: elevation = 1000 * latitude + 100 * longitude (exact with bilinear interpolation)
+        west, north, dx, dy = 7.0, 46.0, 0.01, 0.01
+        lats = north - (np.arange(100) + 0.5) * dy
+        lons = west + (np.arange(200) + 0.5) * dx
+        raster = 1000 * lats[:, None] + 100 * lons[None, :]
+        filename = os.path.join(directory, "dem.npy")
+        save_dem(filename, raster, west, north, dx, dy)
+
+        dem = DEMProvider(filename)
+        assert isinstance(dem.raster, np.memmap)
+        points = [(45.5, 7.5), (45.123, 8.456), (lats[0], lons[0]), (lats[-1], lons[-1])]
+        assert np.allclose(dem.lookup(points), [1000 * lat + 100 * lon for lat, lon in points])
+        try:
+            dem.lookup([(47.0, 7.5)])
+            assert False
+        except Exception as ex:
+            assert "outside" in str(ex)
+
+        # The slopes of a graph from a local raster
+        config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1)
+        G = Graph.from_file(simpy.Environment(), config, stations=True, seed=7, elevation=False)
+        ys, xs = [node["y"] for node in G.nodes.values()], [node["x"] for node in G.nodes.values()]
+        west, north = min(xs) - 0.01, max(ys) + 0.01
+        save_dem(filename, np.full((200, 200), 100.0), west, north, (max(xs) - west + 0.01) / 200, (north - min(ys) + 0.01) / 200)
+        G = Graph.from_file(simpy.Environment(), config, stations=True, seed=7, elevation=True, elevation_provider=DEMProvider(filename))
+        assert all(node["elevation"] == 100.0 for node in G.nodes.values())
+        assert all(edge["grade"] == 0 for _, _, edge in G.edges(data=True))
+
+        # The binary cache of the graph is not reused when the raster changes
+        config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, GRAPH_CACHE=os.path.join(directory, "cache"))
+        transform = (west, north, (max(xs) - west + 0.01) / 200, (north - min(ys) + 0.01) / 200)
+        for value in (100.0, 200.0):
+            save_dem(filename, np.full((200, 200), value), *transform)
+            G = Graph.from_file(simpy.Environment(), config, stations=True, seed=7, elevation=True, elevation_provider=DEMProvider(filename))
+            assert all(node["elevation"] == value for node in G.nodes.values())
+        assert len(os.listdir(config.GRAPH_CACHE)) == 2
+    finally:
+        shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_open_elevation,
+        test_dem,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
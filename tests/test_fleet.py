@@ -0,0 +1,41 @@
+import simpy
+import random
+
+from simulation.configuration import Config
+from simulation.vehicles import Vehicle, Fleet
+
+
+def test_fleet():
+    config = Config()
+    env = simpy.Environment()
+    fleet = Fleet(env, speed=config.VEHICLES_SPEED)
+
+    # A recycled vehicle draws the levels of batteries as a new one
+    random.seed(0)
+    expected = [Vehicle(env, vtype, config.VEHICLES_SPEED, 0, 1).level for vtype in config.VEHICLE_TYPES * 3]
+    random.seed(0)
+    levels = []
+    for vtype in config.VEHICLE_TYPES * 3:
+        vehicle = fleet.acquire(vtype, 0, 1)
+        levels.append(vehicle.level)
+        vehicle.consume(vehicle.level)
+        fleet.release(vehicle)
+    assert levels == expected
+    assert fleet.created == len(config.VEHICLE_TYPES)
+    assert fleet.recycled == 2 * len(config.VEHICLE_TYPES)
+
+    vehicle = fleet.acquire(config.VEHICLE_TYPES[0], 2, 3)
+    assert vehicle.origin == vehicle.position == 2 and vehicle.destination == 3
+    assert vehicle.capacity == sum(i.capacity for i in vehicle.batteries)
+    assert all(i.btype is vehicle.btype and i.start_charging == 0 for i in vehicle.batteries)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_fleet,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,76 @@
+import os
+import shutil
+import simpy
+import random
+import tempfile
+
+import numpy as np
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.utils.cache import load_cache
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def test_graph_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        config = Config(GRAPH_FILE=GRAPH_FILE, GRAPH_CACHE=directory, PERCENTAGE_STATIONS=0.1)
+        G = Graph.from_file(simpy.Environment(), config, stations=True, seed=3)
+        assert len(os.listdir(directory)) == 1
+
+        state = random.getstate()
+        cached = Graph.from_file(simpy.Environment(), config, stations=True, seed=3)
+        assert random.getstate() == state
+        assert isinstance(cached.csr.targets, np.memmap)
+        assert cached.csr.fingerprint == G.csr.fingerprint
+        assert list(cached.nodes) == list(G.nodes)
+        assert list(cached.edges(keys=True)) == list(G.edges(keys=True))
+        for i, node in G.nodes.items():
+            assert cached.nodes[i]["is_station"] == node["is_station"]
+            assert cached.nodes[i]["startp"] == node["startp"] and cached.nodes[i]["endp"] == node["endp"]
+            if node["is_station"]:
+                assert cached.nodes[i]["id_station"] == node["id_station"]
+        for u, v, key, edge in G.edges(keys=True, data=True):
+            assert cached[u][v][key]["grade_abs"] == edge["grade_abs"]
+        assert np.array_equal(cached.station_matrix.distances, G.station_matrix.distances)
+
+        # Placements without seed are never cached
+        Graph.from_file(simpy.Environment(), config, stations=True)
+        assert len(os.listdir(directory)) == 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_stale_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        graph_file = shutil.copy(GRAPH_FILE, directory)
+        config = Config(GRAPH_FILE=graph_file, GRAPH_CACHE=directory, PERCENTAGE_STATIONS=0.1)
+        Graph.from_file(simpy.Environment(), config, stations=True, seed=3)
+        path = next(os.path.join(directory, i) for i in os.listdir(directory) if os.path.isdir(os.path.join(directory, i)))
+        assert load_cache(path, graph_file) is not None
+
+        with open(graph_file, "a") as file:
+            file.write("\n")
+        assert load_cache(path, graph_file) is None
+
+        # The cache is rebuilt in place
+        Graph.from_file(simpy.Environment(), config, stations=True, seed=3)
+        assert load_cache(path, graph_file) is not None
+    finally:
+        shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_graph_cache,
+        test_stale_cache,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,82 @@
+import math
+import simpy
+import random
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.routing import Landmarks
+from simulation.utils.algorithms import csr_dijkstra, csr_astar_path
+from simulation.utils.technical import csr_path_length
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, LANDMARKS=4)
+    return Graph.from_file(simpy.Environment(), config, stations=True)
+
+
+def test_admissible():
+    G = load_graph()
+    csr, landmarks = G.csr, G.landmarks
+    assert len(landmarks.landmarks) == 4
+    for source in range(0, csr.n_nodes, 7):
+        dist = csr_dijkstra(csr, source)
+        for target in range(csr.n_nodes):
+            h = landmarks.heuristic(source, target)
+            assert h <= dist[target] + 1e-6 or math.isinf(dist[target])
+
+
+def test_forward_distances():
+    G = load_graph()
+    csr, landmarks = G.csr, G.landmarks
+    for i, landmark in enumerate(landmarks.landmarks):
+        assert landmarks.forward[i].tolist() == csr_dijkstra(csr, landmark)
+
+
+def test_optimal_paths():
+    G = load_graph()
+    csr, landmarks = G.csr, G.landmarks
+    rnd = random.Random(1)
+    for _ in range(100):
+        source, target = rnd.randrange(csr.n_nodes), rnd.randrange(csr.n_nodes)
+        dist = csr_dijkstra(csr, source)[target]
+        if math.isinf(dist):
+            continue
+        path = csr_astar_path(csr, source, target, heuristic=landmarks.heuristic)
+        assert math.isclose(csr_path_length(csr, path), dist)
+
+
+def test_report():
+    G = load_graph()
+    report = G.landmarks.report(n_queries=20, seed=0)
+    assert report["landmarks"] == 4
+    assert report["preprocessing_time"] >= 0
+    assert report["memory_bytes"] == 2 * 4 * G.csr.n_nodes * 8
+    assert report["euclidean_query_time"] > 0 and report["alt_query_time"] > 0
+    assert report["speedup"] == report["euclidean_query_time"] / report["alt_query_time"]
+
+
+
+def test_deterministic():
+    G, other = load_graph(), load_graph()
+    assert G.landmarks.landmarks == other.landmarks.landmarks
+    assert G.landmarks.landmarks == Landmarks.select(G.csr, 4)
+    assert Landmarks.select(G.csr, 4, seed=1) == Landmarks.select(G.csr, 4, seed=1)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_admissible,
+        test_forward_distances,
+        test_optimal_paths,
+        test_report,
+        test_deterministic,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
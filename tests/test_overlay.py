@@ -0,0 +1,102 @@
+import math
+import simpy
+import random
+
+import numpy as np
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.vehicles import Vehicle
+from simulation.csr import CSRGraph
+from simulation.routing import StationOverlay, Router
+from simulation.routing.overlay import bounded_search, _unpack
+from simulation.exceptions import SimulationNoPath
+from simulation.utils.algorithms import csr_dijkstra
+from simulation.utils.technical import csr_path_length
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1)
+    env = simpy.Environment()
+    return env, config, Graph.from_file(env, config, stations=True)
+
+
+def test_plans():
+    env, config, G = load_graph()
+    csr = G.csr
+    vtype = config.VEHICLE_TYPES[0]
+    overlay = StationOverlay(csr, vtype)
+    router = Router(csr)
+    costs = csr.energy_costs(vtype)
+    rnd = random.Random(0)
+
+    for _ in range(200):
+        source, target = rnd.randrange(csr.n_nodes), rnd.randrange(csr.n_nodes)
+        dist = csr_dijkstra(csr, source)[target]
+        if source == target or math.isinf(dist):
+            continue
+
+        vehicle = Vehicle(env, vtype=vtype, speed=config.VEHICLES_SPEED, origin=csr.node_id(source), destination=csr.node_id(target))
+
+        # With plenty of energy the plan is the shortest path to the target
+        legs = overlay.plan(source, target, vehicle, level=1000, router=router)
+        assert len(legs) == 1 and legs[0][0] == source and legs[0][-1] == target
+        assert math.isclose(csr_path_length(csr, legs[0]), dist)
+
+        # With little energy the legs are chained, feasible, and stop at stations
+        level = 0.3 * float(costs[csr.path_edges(legs[0])].sum())
+        try:
+            legs = overlay.plan(source, target, vehicle, level=level, router=router)
+        except SimulationNoPath:
+            continue
+        assert legs[0][0] == source and legs[-1][-1] == target
+        assert float(costs[csr.path_edges(legs[0])].sum()) <= level + 1e-9
+        for leg, following in zip(legs[:-1], legs[1:]):
+            assert leg[-1] == following[0] and csr.is_station[leg[-1]]
+            assert float(costs[csr.path_edges(following)].sum()) <= overlay.capacity + 1e-9
+
+
+
+def test_bounded_search():
+    # 0 -> 1 is short but expensive, 0 -> 2 -> 1 is longer but saves energy to reach 3
+    targets, costs = [1, 2, 3, 1], [2.0, 0.5, 1.5, 0.5]
+    csr = CSRGraph(
+        nodes=np.arange(4), offsets=np.array([0, 2, 3, 4, 4]), targets=np.array(targets),
+        length=np.array([1.0, 1.0, 1.0, 1.0]), grade=np.zeros(4), grade_abs=np.zeros(4),
+        x=np.zeros(4), y=np.zeros(4), is_station=np.zeros(4, dtype=bool), startp=np.ones(4), endp=np.ones(4),
+    )
+    dist, energy, labels = bounded_search(csr, 0, costs, budget=3.0)
+    assert dist[1] == 1.0 and energy[1] == 2.0 and _unpack(labels, 1) == (0, 1)
+    assert dist[3] == 3.0 and energy[3] == 2.5 and _unpack(labels, 3) == (0, 2, 1, 3)
+
+    dist, energy, labels = bounded_search(csr, 3, costs, budget=3.0, reverse=True)
+    assert dist[0] == 3.0 and _unpack(labels, 0) == (3, 1, 2, 0)
+
+
+def test_shared_overlay():
+    env, config, G = load_graph()
+    vtype = config.VEHICLE_TYPES[0]
+    overlay = G.overlay(vtype)
+    assert G.overlay(vtype) is overlay
+
+    # The stations that reach a destination are computed once per destination
+    target = overlay.stations[0]
+    assert overlay.arrivals(target) is overlay.arrivals(target)
+    assert overlay.report()["targets"] == 1
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_plans,
+        test_bounded_search,
+        test_shared_overlay,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,46 @@
+from simulation.routing import PathCache
+
+
+def test_lru():
+    cache = PathCache(maxsize=2)
+    cache.put(0, 1, [0, 2, 1])
+    cache.put(1, 0, [1, 0])
+    assert cache.get(0, 1) == (0, 2, 1)
+
+    # (1, 0) is now the least recently used path
+    cache.put(2, 3, [2, 3])
+    assert cache.get(1, 0) is None
+    assert cache.get(0, 1) == (0, 2, 1)
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_immutable_and_no_path():
+    cache = PathCache(maxsize=10)
+    path = [0, 1]
+    stored = cache.put(0, 1, path)
+    path.append(2)
+    assert stored == (0, 1) and cache.get(0, 1) == (0, 1)
+
+    # Unreachable targets are remembered with an empty path
+    cache.put(1, 0, None)
+    assert cache.get(1, 0) == ()
+
+
+def test_disabled():
+    cache = PathCache(maxsize=0)
+    cache.put(0, 1, [0, 1])
+    assert len(cache) == 0 and cache.get(0, 1) is None
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_lru,
+        test_immutable_and_no_path,
+        test_disabled,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
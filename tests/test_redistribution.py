@@ -0,0 +1,77 @@
+import simpy
+import random
+import itertools
+
+import numpy as np
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.batteries import Battery
+from simulation.vehicles import Distributor
+from simulation.redistribution import RedistributionPlanner
+from simulation.stations.registry import StationRegistry
+from simulation.utils.algorithms import linear_assignment
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def test_linear_assignment():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n, m = map(int, rng.integers(1, 6, 2))
+        cost = rng.random((n, m)) * 10
+        pairs = linear_assignment(cost)
+        assert len(pairs) == min(n, m)
+        assert len({i for i, _ in pairs}) == len({j for _, j in pairs}) == len(pairs)
+
+        if n <= m:
+            best = min(sum(cost[i, j] for i, j in enumerate(perm)) for perm in itertools.permutations(range(m), n))
+        else:
+            best = min(sum(cost[i, j] for j, i in enumerate(perm)) for perm in itertools.permutations(range(n), m))
+        assert abs(sum(cost[i, j] for i, j in pairs) - best) < 1e-9
+
+    # Forbidden couples are never assigned
+    cost = np.array([[np.inf, 1.0], [np.inf, 2.0]])
+    assert linear_assignment(cost) == [(0, 1)]
+
+
+def test_plan():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1)
+    env = simpy.Environment()
+    G = Graph.from_file(env, config, stations=True)
+    registry = StationRegistry(G, env, config)
+    stations = list(registry)
+
+    # Three stations with batteries on the side
+    btype = config.BATTERY_TYPES[0]
+    for node, station in stations[:3]:
+        for _ in range(station.chargers[btype].capacity + 2):
+            station.chargers[btype].put(Battery(btype, level=1))
+    env.run(until=1)
+
+    vehicles = [Distributor(env, speed=config.VEHICLES_SPEED, origin=node) for node, _ in stations[-4:]]
+    planner = RedistributionPlanner(G, registry)
+    plans = planner.plan(vehicles)
+
+    assert 0 < len(plans) <= 3
+    assert len({id(vehicle) for vehicle, _, _ in plans}) == len(plans)
+    assert len({source[0] for _, source, _ in plans}) == len(plans)
+    assert len({target[0] for _, _, target in plans}) == len(plans)
+    for _, (_, source), (_, target) in plans:
+        assert source.chargers_ontheside > 0
+        assert target.chargers_capacity - target.chargers_level > 0
+    assert planner.rounds == 1
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_linear_assignment,
+        test_plan,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
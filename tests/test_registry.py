@@ -0,0 +1,62 @@
+import simpy
+import random
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.batteries import Battery
+from simulation.stations.registry import IndexedHeap, StationRegistry
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def test_indexed_heap():
+    rnd = random.Random(0)
+    keys = [(rnd.randrange(20), i) for i in range(50)]
+    heap = IndexedHeap(keys)
+    for _ in range(1000):
+        i = rnd.randrange(50)
+        keys[i] = (rnd.randrange(20), i)
+        heap.update(i, keys[i])
+        assert heap.top() == min(range(50), key=keys.__getitem__)
+        assert heap.top_k(5) == sorted(range(50), key=keys.__getitem__)[:5]
+
+
+def test_registry():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE)
+    env = simpy.Environment()
+    G = Graph.from_file(env, config, stations=True)
+    registry = StationRegistry(G, env, config)
+    stations_list = tuple(registry)
+    assert len(registry) == sum(node["is_station"] for node in G.nodes.values())
+    assert all(registry[i] is station for i, station in stations_list)
+
+    rnd = random.Random(0)
+    for _ in range(300):
+        _, station = rnd.choice(stations_list)
+        btype = rnd.choice(config.BATTERY_TYPES)
+        if rnd.random() < 0.7:
+            station.chargers[btype].put(Battery(btype, level=btype.capacity / 2))
+        else:
+            station.chargers[btype].get(waitcharge=False)
+        env.run(until=env.now + 1)
+
+        assert registry.best_source() == max(stations_list, key=lambda i: i[1].chargers_ontheside)
+        assert registry.best_target() == max(stations_list, key=lambda i: i[1].chargers_capacity - i[1].chargers_level)
+
+        sources, targets = registry.top(3)
+        assert [i[1].chargers_ontheside for i in sources] == sorted((i[1].chargers_ontheside for i in stations_list), reverse=True)[:3]
+        assert len(targets) == min(3, len(stations_list))
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_indexed_heap,
+        test_registry,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,58 @@
+import simpy
+import random
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.runner import SimulationRunner
+from simulation.streams import RandomStreams
+from simulation.main import run_replications
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+KEYS = ("events", "relative_travel_time", "avg_waiting", "avg_queue", "nx_failed_trips")
+
+
+def test_replications():
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, SIM_TIME=2000, N_VEHICLES=30, N_REDISTRIBUTORS=2)
+    G = Graph.from_file(simpy.Environment(), config, stations=True, seed=7)
+
+    results = run_replications(config, seeds=[0, 1, 0], G=G)
+    assert [i["seed"] for i in results] == [0, 1, 0]
+    assert all(results[0][key] == results[2][key] for key in KEYS)
+    assert any(results[0][key] != results[1][key] for key in KEYS)
+
+    # The stations of replications are never stored in the graph
+    assert all("station" not in node for node in G.nodes.values())
+
+    # A replication gives the results of a simulation on a graph just read
+    fresh = Graph.from_file(simpy.Environment(), config, stations=True, seed=7)
+    random.seed(0)
+    env = simpy.Environment()
+    sim = SimulationRunner(env, config, fresh, streams=RandomStreams(0))
+    sim()
+    assert round(sim.avg_queue, 3) == results[0]["avg_queue"]
+    assert sim.nx_failed_trips == results[0]["nx_failed_trips"]
+    assert round(sim.relative_travel_time * 60, 3) == results[0]["relative_travel_time"]
+
+    # Runs made on the same graph at the same time do not share their stations
+    runs = [SimulationRunner(simpy.Environment(), config, G, streams=RandomStreams(seed)) for seed in (0, 1)]
+    assert not set(runs[0].registry.stations) & set(runs[1].registry.stations)
+    for sim in runs:
+        sim()
+    assert round(runs[0].avg_queue, 3) == results[0]["avg_queue"]
+    assert runs[0].nx_failed_trips == results[0]["nx_failed_trips"]
+
+    # A different configuration rebuilds the preprocessings it changes
+    run_replications(Config(GRAPH_FILE=GRAPH_FILE, SIM_TIME=500, N_VEHICLES=5, N_REDISTRIBUTORS=1, LANDMARKS=0, ROUTER="ch"), n=1, G=G)
+    assert G.landmarks is None and G.hierarchy is not None
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_replications,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
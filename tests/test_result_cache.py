@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import functools
+import dataclasses
+
+from simulation.configuration import Config
+from simulation.stations import StationType
+from simulation.utils.io import config_to_dict, config_fingerprint, export_configuration, read_configuration, run_fingerprint
+from simulation.utils.selection import biased_randomised_selection
+from simulation.main import run_replications
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def _config (**kwargs):
+    """ A configuration on the test graph (whose stations have three types) """
+    station_types = Config.STATION_TYPES + (StationType(_id=2, capacity=2, power=22, chargers_capacities=(10, 10, 10)),)
+    return Config(**{"GRAPH_FILE": GRAPH_FILE, "STATION_TYPES": station_types, "SIM_TIME": 1000, "N_VEHICLES": 20, "N_REDISTRIBUTORS": 2, **kwargs})
+
+
+def test_fingerprint():
+    config = _config()
+    btypes = [vtype.btype for vtype in config.VEHICLE_TYPES]
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "config.json")
+        export_configuration(config, filename)
+        # No side effects on the configuration
+        assert [vtype.btype for vtype in config.VEHICLE_TYPES] == btypes
+        assert config_fingerprint(read_configuration(filename)) == config_fingerprint(config)
+    finally:
+        shutil.rmtree(directory)
+
+    assert config_fingerprint(_config()) == config_fingerprint(config)
+    assert config_fingerprint(_config(N_VEHICLES=21)) != config_fingerprint(config)
+    other = dataclasses.replace(config, VEHICLE_SELECTOR=functools.partial(biased_randomised_selection, beta=0.5))
+    assert config_to_dict(other)["VEHICLE_SELECTOR"] == {"function": "biased_randomised_selection", "args": {"beta": 0.5}}
+    assert config_fingerprint(other) != config_fingerprint(config)
+
+    assert run_fingerprint(config, 0) != run_fingerprint(config, 1)
+    assert run_fingerprint(config, 0) == run_fingerprint(_config(GRAPH_CACHE="./somewhere"), 0)
+    # Caches and stores only change the performance
+    assert run_fingerprint(config, 0) == run_fingerprint(_config(ROUTE_STORE="./routes.db", PATH_CACHE_SIZE=10, PERSIST_STATION_MATRIX=True), 0)
+
+
+def test_result_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        config = _config(RESULT_CACHE=directory)
+        first = run_replications(config, seeds=[0, 1])
+        assert not any(i.get("cached") for i in first)
+        again = run_replications(config, seeds=[1, 0, 2])
+        assert [i.get("cached", False) for i in again] == [True, True, False]
+        assert again[1]["relative_travel_time"] == first[0]["relative_travel_time"]
+        assert again[1]["computational_time"] == first[0]["computational_time"]
+        assert again[0]["avg_queue"] == first[1]["avg_queue"]
+
+        # A memoized result is the one of a fresh run with the same key (landmarks included)
+        config = _config(RESULT_CACHE=directory, PLANNER="constrained")
+        memo = run_replications(config, seeds=[0])[0]
+        fresh = run_replications(dataclasses.replace(config, RESULT_CACHE=None), seeds=[0])[0]
+        assert not memo.get("cached") and not fresh.get("cached")
+        for key in ("relative_travel_time", "avg_waiting", "avg_queue", "nx_failed_trips", "station_stats"):
+            assert memo[key] == fresh[key], key
+    finally:
+        shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_fingerprint,
+        test_result_cache,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import simpy
+import random
+import tempfile
+import subprocess
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.routing import RouteStore, warm
+from simulation.routing.store import most_probable_pairs
+from simulation.utils.algorithms import csr_shortest_path
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE)
+    return Graph.from_file(simpy.Environment(), config, stations=True)
+
+
+def test_most_probable_pairs():
+    csr = load_graph().csr
+    pairs = most_probable_pairs(csr, 100)
+    probs = [csr.startp[o] * csr.endp[d] for o, d in pairs]
+    assert len(pairs) == 100
+    assert probs == sorted(probs, reverse=True)
+
+
+def test_warm_and_read():
+    csr = load_graph().csr
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "routes.sqlite")
+        store = RouteStore(filename, csr.fingerprint)
+        assert warm(store, csr, n_pairs=50, processes=2) == 50
+        assert len(store) == 50
+
+        # A second store (e.g., another worker) reads the same routes
+        other = RouteStore(filename, csr.fingerprint)
+        for source, target in most_probable_pairs(csr, 50):
+            path = other.get(source, target)
+            try:
+                assert path == csr_shortest_path(csr, source, target)
+            except Exception:
+                assert path == ()
+        assert other.hits == 50
+
+        # Routes of a different graph are not visible
+        assert RouteStore(filename, "another graph").get(*most_probable_pairs(csr, 1)[0]) is None
+
+        # Routes put are written as soon as <flush_every> of them are pending
+        bounded = RouteStore(filename, "bounded graph", flush_every=3)
+        for source, target in most_probable_pairs(csr, 4):
+            bounded.put(source, target, (source, target))
+        assert len(bounded) == 3 and bounded.stats["pending"] == 1
+        bounded.close()
+        assert len(bounded) == 4
+
+
+
+def test_warm_command():
+    csr = load_graph().csr
+    with tempfile.TemporaryDirectory() as folder:
+        # A configuration on the test graph (whose stations have three types)
+        with open("./configs/config.json") as file:
+            d = json.load(file)
+        d["GRAPH_FILE"] = GRAPH_FILE
+        d["STATION_TYPES"].append(dict(d["STATION_TYPES"][-1], _id=2))
+        config_file, filename = os.path.join(folder, "config.json"), os.path.join(folder, "routes.sqlite")
+        with open(config_file, "w") as file:
+            json.dump(d, file)
+
+        command = [sys.executable, "-m", "simulation.main", "warm", config_file, "--store", filename, "--pairs", "20", "--processes", "2"]
+        output = subprocess.run(command, capture_output=True, text=True, check=True, env={**os.environ, "PYTHONPATH": os.getcwd()}).stdout
+        assert "20 routes written" in output
+        assert len(RouteStore(filename, csr.fingerprint)) == 20
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_most_probable_pairs,
+        test_warm_and_read,
+        test_warm_command,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,93 @@
+import simpy
+import random
+import multiprocessing
+
+import numpy as np
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.runner import SimulationRunner
+from simulation.utils.shared import SharedArrays
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def _worker (config, spec, queue):
+    random.seed(1)
+    env = simpy.Environment()
+    G = Graph.from_shared(env, config, spec)
+    sim = SimulationRunner(env, config, G)
+    sim()
+    queue.put((G.csr.fingerprint, len(sim.registry), G.csr.targets.flags.owndata, sim.total_trips, sim.failed_trips))
+
+
+def test_shared_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, SIM_TIME=2000, N_VEHICLES=20, N_REDISTRIBUTORS=2)
+    G = Graph.from_file(simpy.Environment(), config, stations=True)
+    shared = SharedArrays.create(G.to_arrays(), meta=G.meta())
+    try:
+        # The same graph (and simulation) in this process and in workers
+        random.seed(1)
+        env = simpy.Environment()
+        local = Graph.from_shared(env, config, shared.spec)
+        assert not local.csr.targets.flags.owndata
+        assert not local.csr.targets.flags.writeable
+        sim = SimulationRunner(env, config, local)
+        sim()
+        expected = (G.csr.fingerprint, int(G.csr.is_station.sum()), False, sim.total_trips, sim.failed_trips)
+
+        queue = multiprocessing.Queue()
+        jobs = [multiprocessing.Process(target=_worker, args=(config, shared.spec, queue)) for _ in range(2)]
+        for proc in jobs:
+            proc.start()
+        results = [queue.get(timeout=60) for _ in jobs]
+        for proc in jobs:
+            proc.join()
+        assert all(result == expected for result in results), (results, expected)
+    finally:
+        shared.unlink()
+
+
+
+def test_shared_preprocessings():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, ROUTER="ch", LANDMARKS=4)
+    G = Graph.from_file(simpy.Environment(), config, stations=True)
+    G.station_matrix
+    shared = SharedArrays.create({**G.to_arrays(), **G.preprocessing_arrays()}, meta=G.meta())
+    try:
+        local = Graph.from_shared(simpy.Environment(), config, shared.spec)
+
+        # The preprocessings are attached to the shared arrays, not made again
+        assert local.landmarks.landmarks == G.landmarks.landmarks
+        assert not local.landmarks.forward.flags.writeable and not local.landmarks.backward.flags.writeable
+        assert local.hierarchy.rank == G.hierarchy.rank and local.hierarchy.shortcuts == G.hierarchy.shortcuts
+        assert not local.station_matrix.distances.flags.owndata
+        assert np.array_equal(local.station_matrix.distances, G.station_matrix.distances)
+
+        rnd = random.Random(0)
+        for _ in range(50):
+            source, target = rnd.randrange(G.csr.n_nodes), rnd.randrange(G.csr.n_nodes)
+            assert local.hierarchy.shortest_path(source, target) == G.hierarchy.shortest_path(source, target)
+            assert local.landmarks.heuristic(source, target) == G.landmarks.heuristic(source, target)
+
+        # The ones of another configuration are made by the worker
+        local = Graph.from_shared(simpy.Environment(), Config(GRAPH_FILE=GRAPH_FILE, LANDMARKS=2), shared.spec)
+        assert len(local.landmarks.landmarks) == 2 and local.landmarks.forward.flags.writeable
+        assert local.hierarchy is None
+    finally:
+        shared.unlink()
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_shared_graph,
+        test_shared_preprocessings,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
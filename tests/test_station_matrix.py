@@ -0,0 +1,138 @@
+import os
+import math
+import simpy
+import random
+import shutil
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.runner import SimulationRunner
+from simulation.routing import StationMatrix
+from simulation.utils.algorithms import csr_dijkstra
+from simulation.utils.technical import csr_path_length
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def load_graph():
+    random.seed(0)
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1)
+    env = simpy.Environment()
+    return env, config, Graph.from_file(env, config, stations=True)
+
+
+def test_distances():
+    env, config, G = load_graph()
+    csr, matrix = G.csr, G.station_matrix
+    assert len(matrix.stations) == int(csr.is_station.sum())
+
+    for source in matrix.stations.tolist():
+        dist = csr_dijkstra(csr, source)
+        for target in matrix.stations.tolist():
+            assert matrix.distance(source, target) == dist[target]
+            assert math.isclose(matrix.travel_time(source, target, 10), dist[target] / 10)
+            if source != target and not math.isinf(dist[target]):
+                path = matrix.path(source, target)
+                assert path[0] == source and path[-1] == target
+                assert math.isclose(csr_path_length(csr, path), dist[target])
+
+
+def test_parallel():
+    env, config, G = load_graph()
+    csr, matrix = G.csr, G.station_matrix
+    # NOTE: The threshold is lowered to force the worker processes on the small test graph
+    threshold, StationMatrix.PARALLEL_THRESHOLD = StationMatrix.PARALLEL_THRESHOLD, 0
+    try:
+        assert np.array_equal(StationMatrix.compute(csr, matrix.stations, processes=2), matrix.distances)
+    finally:
+        StationMatrix.PARALLEL_THRESHOLD = threshold
+
+
+def test_rows():
+    env, config, G = load_graph()
+    csr = G.csr
+    matrix = StationMatrix(csr, distances=G.station_matrix.distances, maxrows=5)
+    stations = matrix.stations.tolist()
+    others = [i for i in range(csr.n_nodes) if not csr.is_station[i]][:20]
+    for node in others + others[-3:]:
+        dist = csr_dijkstra(csr, node)
+        assert matrix.distances_from(node).tolist() == [dist[i] for i in stations]
+    # Only the last rows of nodes that are not stations are kept
+    assert matrix.report()["rows"] == 5
+    assert matrix.distances_from(stations[0]) is not None and matrix.report()["rows"] == 5
+
+
+def test_persistence():
+    env, config, G = load_graph()
+    with tempfile.TemporaryDirectory() as folder:
+        filename = StationMatrix.filename(os.path.join(folder, "Test.graphml"))
+        matrix = G.build_station_matrix(filename)
+        assert os.path.exists(filename)
+
+        loaded = StationMatrix.load(filename, G.csr)
+        assert loaded is not None and np.array_equal(loaded.distances, matrix.distances)
+
+        # The matrix of a different set of stations is not reused
+        G.nodes[G.csr.node_id(int(matrix.stations[0]))]["is_station"] = False
+        G.build_csr()
+        assert StationMatrix.load(filename, G.csr) is None
+
+
+
+def test_lazy():
+    directory = tempfile.mkdtemp()
+    try:
+        graph_file = shutil.copy(GRAPH_FILE, directory)
+        random.seed(0)
+        config = Config(GRAPH_FILE=graph_file, PERCENTAGE_STATIONS=0.1, PERSIST_STATION_MATRIX=True,
+            SHARING=False, SIM_TIME=2000, N_VEHICLES=10)
+        env = simpy.Environment()
+        G = Graph.from_file(env, config, stations=True)
+        filename = StationMatrix.filename(graph_file)
+
+        # Without redistributions the matrix is never built
+        SimulationRunner(env, config, G)()
+        assert not os.path.exists(filename)
+
+        # It is built (and persisted) on first use
+        assert len(G.station_matrix.stations) == int(G.csr.is_station.sum())
+        assert os.path.exists(filename)
+    finally:
+        shutil.rmtree(directory)
+
+
+def _compute_in_worker (csr):
+    return StationMatrix.compute(csr, np.flatnonzero(csr.is_station), processes=2)
+
+
+def test_worker():
+    env, config, G = load_graph()
+    # NOTE: The threshold is lowered to force the worker processes, that a worker of a pool cannot start.
+    threshold, StationMatrix.PARALLEL_THRESHOLD = StationMatrix.PARALLEL_THRESHOLD, 0
+    try:
+        with multiprocessing.Pool(1) as pool:
+            distances = pool.apply(_compute_in_worker, (G.csr,))
+    finally:
+        StationMatrix.PARALLEL_THRESHOLD = threshold
+    assert np.array_equal(distances, G.station_matrix.distances)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_distances,
+        test_parallel,
+        test_rows,
+        test_persistence,
+        test_lazy,
+        test_worker,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
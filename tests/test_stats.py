@@ -0,0 +1,102 @@
+import json
+import random
+import statistics
+
+import simpy
+
+from simulation.stats import Welford, TimeWeighted, QuantileSketch, StationStats
+from simulation.stations import Station, StationType
+from simulation.batteries import BatteryType
+
+
+def test_welford():
+    rnd = random.Random(0)
+    sample = [rnd.expovariate(0.1) for _ in range(1000)]
+    a, b = Welford(), Welford()
+    for x in sample[:300]:
+        a.add(x)
+    for x in sample[300:]:
+        b.add(x)
+    a.merge(Welford.from_dict(json.loads(json.dumps(b.to_dict()))))
+    assert a.count == len(sample)
+    assert abs(a.mean - statistics.mean(sample)) < 1e-9
+    assert abs(a.variance - statistics.variance(sample)) < 1e-6
+
+
+def test_time_weighted():
+    queue = TimeWeighted()
+    queue.update(0, 2)
+    queue.update(10, 0)
+    queue.update(15, 4)
+    assert queue.mean(20) == (2 * 10 + 4 * 5) / 20
+    other = TimeWeighted().close(20)
+    queue.close(20).merge(other)
+    assert queue.mean() == 40 / 40
+
+
+def test_quantile_sketch():
+    rnd = random.Random(0)
+    sample = [0.0] * 200 + [rnd.lognormvariate(3, 1) for _ in range(5000)]
+    sketches = [QuantileSketch(alpha=0.01) for _ in range(4)]
+    for i, x in enumerate(sample):
+        sketches[i % 4].add(x)
+    sketch = sketches[0]
+    for other in sketches[1:]:
+        sketch.merge(QuantileSketch.from_dict(json.loads(json.dumps(other.to_dict()))))
+    assert sketch.count == len(sample)
+    ordered = sorted(sample)
+    for q in (0.01, 0.5, 0.95, 0.99):
+        exact = ordered[int(q * (len(sample) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1e-12, (q, exact)
+
+    # Collapsing the lowest buckets keeps the highest quantiles accurate
+    bounded = QuantileSketch(alpha=0.01, max_buckets=100)
+    for x in sample:
+        bounded.add(x)
+    assert len(bounded.buckets) <= 100
+    exact = ordered[int(0.99 * (len(sample) - 1))]
+    assert abs(bounded.quantile(0.99) - exact) <= 0.01 * exact
+
+
+def test_station_stats():
+    env = simpy.Environment()
+    btype = BatteryType(0, 10)
+    station = Station(env, StationType(0, 1, 10, [2]), [btype], swaptime=10)
+
+    def occupy (duration):
+        with station.request() as req:
+            _start = env.now
+            station.stats.update_queue(env.now, len(station.queue))
+            yield req
+            station.stats.add_waiting(env.now - _start)
+            station.stats.update_queue(env.now, len(station.queue))
+            yield env.timeout(duration)
+
+    for _ in range(3):
+        env.process(occupy(10))
+    env.run(40)
+
+    stats = station.stats.closed(env.now)
+    assert stats.waiting.count == 3
+    assert stats.waiting.mean == 10
+    assert abs(stats.waiting_sketch.quantile(0.5) - 10) <= 0.1
+    assert abs(stats.waiting_sketch.quantile(1.0) - 20) <= 0.2
+    # Queue of 2 for 10 s, of 1 for 10 s, then empty until 40
+    assert stats.queue.mean() == (2 * 10 + 1 * 10) / 40
+
+    merged = StationStats.from_dict(json.loads(json.dumps(stats.to_dict()))).merge(stats)
+    assert merged.waiting.count == 6 and merged.queue.mean() == stats.queue.mean()
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_welford,
+        test_time_weighted,
+        test_quantile_sketch,
+        test_station_stats,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,109 @@
+import simpy
+import random
+import collections
+import dataclasses
+
+from simulation.configuration import Config
+from simulation.graph import Graph
+from simulation.runner import SimulationRunner
+from simulation.streams import RandomStreams
+from simulation.main import run_paired, paired_difference
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def test_streams():
+    a, b = RandomStreams(42), RandomStreams(42)
+    assert a.generator("demand", 3).random(5).tolist() == b.generator("demand", 3).random(5).tolist()
+    assert a.random("batteries", 1).random() == b.random("batteries", 1).random()
+    # Streams of other subsystems, keys, or seeds are different
+    assert a.generator("demand", 3).random() != a.generator("demand", 4).random()
+    assert a.seed("placement") != a.seed("distributors")
+    assert a.seed("placement") != RandomStreams(43).seed("placement")
+    # Streams seeded from the OS entropy can be reproduced
+    streams = RandomStreams()
+    assert RandomStreams(streams.entropy).seed("demand", 0) == streams.seed("demand", 0)
+    try:
+        a.generator("weather")
+        assert False
+    except Exception as ex:
+        assert "Unknown" in str(ex)
+
+
+def _trips (config, G, seed):
+    """ The trips (and the battery levels) of each slot of a simulation """
+    env = simpy.Environment()
+    sim = SimulationRunner(env, config, G, streams=RandomStreams(seed))
+    trips, acquire = collections.defaultdict(list), sim.fleet.acquire
+
+    def recording (vtype, origin, destination, rng=None):
+        vehicle = acquire(vtype, origin, destination, rng=rng)
+        trips[id(rng)].append((vtype._id, origin, destination, round(vehicle.level, 9)))
+        return vehicle
+
+    sim.fleet.acquire = recording
+    sim()
+    return list(trips.values()), sim
+
+
+def test_common_random_numbers():
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, SIM_TIME=2000, N_VEHICLES=30, N_REDISTRIBUTORS=2)
+    G = Graph.from_file(simpy.Environment(), config, stations=True, seed=7)
+
+    # The same seed gives the same simulation, whatever the global random state
+    random.seed(1)
+    trips, sim = _trips(config, G, seed=0)
+    random.seed(2)
+    again, other = _trips(config, G, seed=0)
+    assert trips == again and sim.report(0)["station_stats"] == other.report(0)["station_stats"]
+
+    # With and without sharing, each slot starts the same trips (as long as it lasts)
+    unshared, _ = _trips(dataclasses.replace(config, SHARING=False), G, seed=0)
+    assert len(trips) == len(unshared) == config.N_VEHICLES
+    for a, b in zip(trips, unshared):
+        k = min(len(a), len(b))
+        assert k > 0 and a[:k] == b[:k]
+
+    different, _ = _trips(config, G, seed=1)
+    assert trips != different
+
+
+def test_constrained_planner():
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, SIM_TIME=2000, N_VEHICLES=30, N_REDISTRIBUTORS=2, PLANNER="constrained")
+
+    # Graphs loaded again (hence preprocessed again) give the same simulation
+    runs = []
+    for _ in range(3):
+        G = Graph.from_file(simpy.Environment(), config, stations=True, seed=3)
+        trips, sim = _trips(config, G, seed=1)
+        report = sim.report(0)
+        runs.append((G.landmarks.landmarks, trips, report["avg_waiting"], report["station_stats"]))
+    assert runs[0] == runs[1] == runs[2]
+
+
+def test_run_paired():
+    config = Config(GRAPH_FILE=GRAPH_FILE, PERCENTAGE_STATIONS=0.1, SIM_TIME=1000, N_VEHICLES=20, N_REDISTRIBUTORS=1)
+    G = Graph.from_file(simpy.Environment(), config, stations=True, seed=7)
+    variants = {"eager": {"LAZY_CHARGING": False}, "same": {"LAZY_CHARGING": False}, "lazy": {"LAZY_CHARGING": True}}
+    results = run_paired(config, variants, seeds=[0, 1], G=G)
+    assert [i["seed"] for i in results] == [0, 1]
+
+    # Identical variants are identical runs, hence their difference is exactly 0
+    difference = paired_difference(results, "avg_waiting", "eager", "same")
+    assert difference == {"mean": 0, "std": 0, "pairs": 2}
+    assert paired_difference(results, "relative_travel_time", "eager", "lazy")["pairs"] == 2
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_streams,
+        test_common_random_numbers,
+        test_constrained_planner,
+        test_run_paired,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()
@@ -0,0 +1,119 @@
+import os
+import json
+import shutil
+import tempfile
+
+from simulation.sweep import Sweep, expand_grid, run_job, job_config
+from simulation.main import run_replications
+
+
+GRAPH_FILE = "./graphs/Test.graphml"
+
+
+def _config_file (directory):
+    """ A configuration on the test graph (whose stations have three types) """
+    with open("./configs/config.json") as file:
+        d = json.load(file)
+    d["GRAPH_FILE"] = GRAPH_FILE
+    d["STATION_TYPES"].append(dict(d["STATION_TYPES"][-1], _id=2))
+    d.update(SIM_TIME=1000, N_VEHICLES=20, N_REDISTRIBUTORS=2)
+    filename = os.path.join(directory, "config.json")
+    with open(filename, "w") as file:
+        json.dump(d, file)
+    return filename
+
+
+def test_expand_grid():
+    jobs = expand_grid(["a.json", "b.json"], {"N_VEHICLES": [10, 20], "SHARING": [True, False]}, seeds=range(3))
+    assert len(jobs) == 2 * 4 * 3
+    assert len({job["id"] for job in jobs}) == len(jobs)
+    assert expand_grid(["a.json"], {"N_VEHICLES": [10]})[0]["id"] == expand_grid(["a.json"], {"N_VEHICLES": [10]})[0]["id"]
+    try:
+        expand_grid(["a.json"], {"NOT_A_FIELD": [1]})
+        assert False
+    except Exception as e:
+        assert "NOT_A_FIELD" in str(e)
+
+
+def test_sweep():
+    directory = tempfile.mkdtemp()
+    try:
+        config_file = _config_file(directory)
+        results_file = os.path.join(directory, "results.jsonl")
+        jobs = expand_grid([config_file], {"N_VEHICLES": [10, 40]}, seeds=[0, 1])
+
+        # A crash while a line was written, after the first job
+        first = run_job(jobs[0])
+        with open(results_file, "w") as file:
+            file.write(json.dumps(first) + "\n" + json.dumps(first)[:50])
+
+        sweep = Sweep(jobs, results_file, max_workers=2)
+        assert [job["id"] for job in sweep.pending()][-1] == jobs[1]["id"]     # The scenario of the first job is the shortest known
+        assert sweep.run() == 3 and not sweep.failed
+        results = sweep.results()
+        assert sorted(i["id"] for i in results) == sorted(i["id"] for i in jobs)
+
+        # Same job, same results, in this process and in workers
+        again = next(i for i in results if i["id"] == jobs[0]["id"])
+        assert again["relative_travel_time"] == first["relative_travel_time"]
+        rerun = next(i for i in results if i["id"] == jobs[1]["id"])
+        assert rerun["relative_travel_time"] == run_job(jobs[1])["relative_travel_time"]
+
+        # Nothing left to do
+        assert Sweep(jobs, results_file).run() == 0
+    finally:
+        shutil.rmtree(directory)
+
+def test_sweep_cache():
+    directory = tempfile.mkdtemp()
+    try:
+        config_file = _config_file(directory)
+        jobs = expand_grid([config_file], {"RESULT_CACHE": [os.path.join(directory, "memo")]}, seeds=[0, 1])
+        sweep = Sweep(jobs, os.path.join(directory, "first.jsonl"), max_workers=2)
+        assert sweep.run() == 2 and sweep.cached == 0
+
+        # Another sweep of the same scenarios is not executed
+        other = Sweep(jobs, os.path.join(directory, "second.jsonl"), max_workers=2)
+        assert other.run() == 2 and other.cached == 2
+        first, second = sweep.results(), other.results()
+        assert all(i.get("cached") for i in second)
+        assert sorted(i["relative_travel_time"] for i in first) == sorted(i["relative_travel_time"] for i in second)
+    finally:
+        shutil.rmtree(directory)
+
+
+
+def test_resume_cached():
+    directory = tempfile.mkdtemp()
+    try:
+        config_file = _config_file(directory)
+        results_file = os.path.join(directory, "results.jsonl")
+        jobs = expand_grid([config_file], {"RESULT_CACHE": [os.path.join(directory, "memo")]}, seeds=[0, 1, 2])
+
+        # A result memoized outside of sweeps (without wall time) is written as a cached line
+        run_replications(job_config(jobs[0]), seeds=[jobs[0]["seed"]])
+        sweep = Sweep(jobs[:1], results_file)
+        assert sweep.run() == 1 and sweep.cached == 1
+        assert "wall_time" not in sweep.results()[0]
+
+        # The sweep is resumed over the file with the cached line
+        sweep = Sweep(jobs, results_file, max_workers=2)
+        assert [job["id"] for job in sweep.pending()] == [job["id"] for job in jobs[1:]]
+        assert sweep.run() == 2 and sweep.cached == 0 and not sweep.failed
+        assert sorted(i["id"] for i in sweep.results()) == sorted(i["id"] for i in jobs)
+    finally:
+        shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+    tests = [
+        test_expand_grid,
+        test_sweep,
+        test_sweep_cache,
+        test_resume_cached,
+    ]
+
+    for test in tests:
+        print(test.__name__)
+        test()